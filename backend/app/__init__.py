@@ -50,6 +50,42 @@ def create_app():
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # --- 背景導入任務設定 ---
+    app.config['IMPORT_JOB_WORKERS'] = int(os.environ.get('IMPORT_JOB_WORKERS', 2))
+    app.config['IMPORT_JOB_DIR'] = os.environ.get('IMPORT_JOB_DIR')
+    app.config['IMPORT_JOB_HEARTBEAT_SECONDS'] = int(os.environ.get('IMPORT_JOB_HEARTBEAT_SECONDS', 30))
+    app.config['IMPORT_JOB_STALE_SECONDS'] = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', 300))
+    app.config['IMPORT_JOB_RESUME_INTERVAL'] = int(os.environ.get('IMPORT_JOB_RESUME_INTERVAL', 60))
+
+    # --- 上傳檔案快取設定 (秒 / 位元組) ---
+    app.config['UPLOAD_CACHE_DIR'] = os.environ.get('UPLOAD_CACHE_DIR')
+    app.config['UPLOAD_CACHE_TTL'] = int(os.environ.get('UPLOAD_CACHE_TTL', 3600))
+    app.config['UPLOAD_CACHE_MAX_BYTES'] = int(os.environ.get('UPLOAD_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    app.config['UPLOAD_CACHE_LEASE_TTL'] = int(os.environ.get('UPLOAD_CACHE_LEASE_TTL', 600))
+
+    # --- 查詢結果快取設定 (memory / filesystem，秒) ---
+    app.config['RESULT_CACHE_BACKEND'] = os.environ.get('RESULT_CACHE_BACKEND', 'memory')
+    app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR')
+    app.config['RESULT_CACHE_TTL'] = int(os.environ.get('RESULT_CACHE_TTL', 300))
+    app.config['RESULT_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 1024))
+
+    # --- AI 回應快取設定 (秒、項目數) ---
+    app.config['AGENT_CACHE_TTL'] = int(os.environ.get('AGENT_CACHE_TTL', 86400))
+    app.config['AGENT_CACHE_MAX_ENTRIES'] = int(os.environ.get('AGENT_CACHE_MAX_ENTRIES', 500))
+
+    # --- AI 模型呼叫並行上限 (每個程序的同時呼叫數，即專用執行緒池大小) ---
+    app.config['AGENT_MAX_CONCURRENCY'] = int(os.environ.get('AGENT_MAX_CONCURRENCY', 4))
+    app.config['AGENT_RETRY_AFTER'] = int(os.environ.get('AGENT_RETRY_AFTER', 5))
+
+    # --- 對外 HTTP 連線池設定 (每個 worker 的連線數、重試次數、秒) ---
+    app.config['GEMINI_API_BASE_URL'] = os.environ.get('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com')
+    app.config['HTTP_POOL_SIZE'] = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    app.config['HTTP_MAX_RETRIES'] = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+    app.config['HTTP_BACKOFF_FACTOR'] = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+    app.config['HTTP_BACKOFF_JITTER'] = float(os.environ.get('HTTP_BACKOFF_JITTER', 0.5))
+    app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+    app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get('HTTP_READ_TIMEOUT', 170))
+
     # --- 初始化擴展 ---
     db.init_app(app)
     migrate.init_app(app, db)
@@ -69,6 +105,12 @@ def create_app():
         app.register_blueprint(agent_bp.bp, url_prefix='/api/agent')
         app.register_blueprint(dashboard_bp.bp, url_prefix='/api/dashboard')
 
+        # --- 註冊 CLI 指令 ---
+        from .rollups import rebuild_rollups_command
+        from .import_jobs import resume_import_jobs_command
+        app.cli.add_command(rebuild_rollups_command)
+        app.cli.add_command(resume_import_jobs_command)
+
         # --- 【修改二：添加捕獲所有路由的規則】 ---
         # 這個規則確保，任何不匹配 API 的請求，都會返回前端的 index.html
         # 這是讓 Vue Router (History 模式) 正常工作的關鍵
@@ -0,0 +1,117 @@
+"""
+AI 模型呼叫的專用執行緒池
+模型回應可能需要數十秒到數分鐘。模型呼叫一律在每個程序一個、最多 AGENT_MAX_CONCURRENCY 個
+執行緒的專用執行緒池中進行，同時進行的呼叫 (含串流) 不超過這個數目；名額用完時立即拋出
+AgentBusy (端點返回 503)，不排隊等待，因此等待模型回應的伺服器執行緒最多 AGENT_MAX_CONCURRENCY 個，
+其餘執行緒保留給羊隻資料等一般端點。
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+
+_lock = threading.Lock()
+_END = object()
+
+
+class AgentBusy(RuntimeError):
+    """同時進行的模型呼叫已達上限"""
+
+
+def _limiter(app):
+    """返回 (執行緒池, 名額狀態)"""
+    with _lock:
+        limiter = app.extensions.get('agent_limiter')
+        if limiter is None:
+            max_calls = app.config.get('AGENT_MAX_CONCURRENCY', 4)
+            executor = ThreadPoolExecutor(max_workers=max_calls, thread_name_prefix='agent-call')
+            limiter = app.extensions['agent_limiter'] = (executor, {'max': max_calls, 'active': 0})
+        return limiter
+
+
+def _admit(app):
+    """取得一個名額 (不等待)，返回釋放名額的函數 (重複呼叫無作用)"""
+    executor, slots = _limiter(app)
+    with _lock:
+        if slots['active'] >= slots['max']:
+            raise AgentBusy('AI 助理目前忙碌中，請稍後再試')
+        slots['active'] += 1
+    released = threading.Event()
+
+    def release():
+        with _lock:
+            if not released.is_set():
+                released.set()
+                slots['active'] -= 1
+    return executor, release
+
+
+def _submit(app, target, *args):
+    """
+    取得名額並在執行緒池中執行 target (於應用程式上下文內)，返回 Future；執行結束時釋放名額。
+    送出前結束目前的資料庫交易以歸還連線，呼叫端需先自行提交變更。
+    """
+    session = db.session()
+    if session.new or session.dirty or session.deleted:
+        raise RuntimeError('呼叫模型前有尚未提交的資料庫變更')
+    executor, release = _admit(app)
+
+    def run():
+        with app.app_context():
+            return target(*args)
+    try:
+        # 此時交易中只有讀取；以回滾結束交易而不關閉 session，已載入的物件 (如 current_user) 仍可使用
+        session.rollback()
+        future = executor.submit(run)
+    except BaseException:
+        release()
+        raise
+    future.add_done_callback(lambda _: release())
+    return future
+
+
+def run_agent_call(func, *args, **kwargs):
+    """在專用執行緒池中執行模型呼叫並返回結果"""
+    app = current_app._get_current_object()
+    return _submit(app, lambda: func(*args, **kwargs)).result()
+
+
+class AgentStream:
+    """在專用執行緒池中讀取的串流模型回應；迭代取得各段回應，close() 通知停止讀取"""
+
+    def __init__(self, app, func, args, kwargs):
+        self._chunks = queue.Queue()
+        self._cancelled = threading.Event()
+        self._future = _submit(app, self._pump, func, args, kwargs)
+
+    def _pump(self, func, args, kwargs):
+        chunks = func(*args, **kwargs)
+        try:
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                self._chunks.put(chunk)
+        except Exception as e:
+            self._chunks.put(e)
+        finally:
+            chunks.close()
+            self._chunks.put(_END)
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is _END:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def close(self):
+        self._cancelled.set()
+
+
+def stream_agent_call(func, *args, **kwargs):
+    """立即取得名額並開始在執行緒池中讀取串流 (名額用完時拋出 AgentBusy)，返回 AgentStream"""
+    return AgentStream(current_app._get_current_object(), func, args, kwargs)
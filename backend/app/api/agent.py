@@ -1,14 +1,27 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_login import login_required, current_user
-from app.utils import call_gemini_api, get_sheep_info_for_context
+from app.utils import call_gemini_api, get_sheep_info_for_context, stream_gemini_api
+from app.agent_limiter import AgentBusy, run_agent_call, stream_agent_call
+from app.markdown_stream import IncrementalMarkdown, render_markdown
+from app.response_cache import cached_gemini_call, end_of_local_day, get_cache_stats
 from app.models import db, ChatHistory
 from app.schemas import AgentRecommendationModel, AgentChatModel, create_error_response
 from pydantic import ValidationError
 from datetime import datetime
+import json
 import markdown
 
 bp = Blueprint('agent', __name__)
 
+
+@bp.errorhandler(AgentBusy)
+def handle_agent_busy(e):
+    """模型呼叫名額用完時請客戶端稍後重試"""
+    response = jsonify(error=str(e))
+    response.headers['Retry-After'] = str(current_app.config.get('AGENT_RETRY_AFTER', 5))
+    return response, 503
+
+
 @bp.route('/tip', methods=['GET'])
 @login_required
 def get_agent_tip():
@@ -25,7 +38,8 @@ def get_agent_tip():
     
     prompt = f"作為『領頭羊博士』，請給我一條關於台灣當前季節（{season}）的實用山羊飼養小提示，簡短且易懂，請使用 Markdown 格式，例如將重點字詞用 `**` 包裹起來。"
 
-    result = call_gemini_api(prompt, api_key, generation_config_override={"temperature": 0.7})
+    # 同一季節的提示詞對所有用戶相同，第一次產生的提示當日內直接由快取返回
+    result = cached_gemini_call('tip', prompt, api_key, generation_config_override={"temperature": 0.7}, expires_at=end_of_local_day())
     if "error" in result:
         return jsonify(error=result["error"]), 500
     
@@ -113,7 +127,7 @@ def get_recommendation():
     full_prompt += esg_prompt_instruction
     full_prompt += "\n\n請開始提供您的綜合建議。"
 
-    result = call_gemini_api(full_prompt, api_key)
+    result = cached_gemini_call('recommendation', full_prompt, api_key)
     if "error" in result:
         return jsonify(error=result["error"]), 500
     
@@ -121,22 +135,15 @@ def get_recommendation():
     return jsonify(recommendation_html=recommendation_html)
 
 
-@bp.route('/chat', methods=['POST'])
+@bp.route('/cache_stats', methods=['GET'])
 @login_required
-def chat_with_agent():
-    """與 AI 聊天"""
-    try:
-        # 使用 Pydantic 驗證聊天資料
-        chat_data = AgentChatModel(**request.get_json())
-    except ValidationError as e:
-        return jsonify(create_error_response("聊天資料驗證失敗", e.errors())), 400
+def get_agent_cache_stats():
+    """AI 回應快取的命中統計"""
+    return jsonify(get_cache_stats())
 
-    # 從驗證後的資料中提取值
-    api_key = chat_data.api_key
-    user_message = chat_data.message
-    session_id = chat_data.session_id
-    ear_num_context = chat_data.ear_num_context
 
+def _build_chat_messages(user_message, session_id, ear_num_context):
+    """組合送給模型的對話內容 (系統設定、最近的對話記錄與附上羊隻背景資料的用戶訊息)"""
     history = ChatHistory.query.filter_by(
         user_id=current_user.id, 
         session_id=session_id
@@ -171,14 +178,11 @@ def chat_with_agent():
 
     current_user_message_with_context = user_message + sheep_context_text
     chat_messages_for_api.append({"role": "user", "parts": [{"text": current_user_message_with_context}]})
+    return chat_messages_for_api
 
-    gemini_response = call_gemini_api(chat_messages_for_api, api_key, generation_config_override={"temperature": 0.7})
-
-    if "error" in gemini_response:
-        return jsonify(error=gemini_response['error']), 500
 
-    model_reply_text = gemini_response.get("text", "抱歉，我暫時無法回答。")
-    
+def _save_chat_turn(session_id, user_message, model_reply_text, ear_num_context):
+    """儲存一輪對話 (用戶訊息與模型回覆)"""
     try:
         user_entry = ChatHistory(user_id=current_user.id, session_id=session_id, role='user', content=user_message, ear_num_context=ear_num_context)
         model_entry = ChatHistory(user_id=current_user.id, session_id=session_id, role='model', content=model_reply_text, ear_num_context=ear_num_context)
@@ -189,5 +193,80 @@ def chat_with_agent():
         db.session.rollback()
         current_app.logger.error(f"儲存聊天記錄失败: {e}")
 
-    reply_html = markdown.markdown(model_reply_text, extensions=['fenced_code', 'tables', 'nl2br'])
-    return jsonify(reply_html=reply_html)
\ No newline at end of file
+
+@bp.route('/chat', methods=['POST'])
+@login_required
+def chat_with_agent():
+    """與 AI 聊天"""
+    try:
+        # 使用 Pydantic 驗證聊天資料
+        chat_data = AgentChatModel(**request.get_json())
+    except ValidationError as e:
+        return jsonify(create_error_response("聊天資料驗證失敗", e.errors())), 400
+
+    chat_messages_for_api = _build_chat_messages(chat_data.message, chat_data.session_id, chat_data.ear_num_context)
+    gemini_response = run_agent_call(call_gemini_api, chat_messages_for_api, chat_data.api_key, generation_config_override={"temperature": 0.7})
+
+    if "error" in gemini_response:
+        return jsonify(error=gemini_response['error']), 500
+
+    model_reply_text = gemini_response.get("text", "抱歉，我暫時無法回答。")
+    _save_chat_turn(chat_data.session_id, chat_data.message, model_reply_text, chat_data.ear_num_context)
+
+    reply_html = render_markdown(model_reply_text)
+    return jsonify(reply_html=reply_html)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@bp.route('/chat/stream', methods=['POST'])
+@login_required
+def chat_with_agent_stream():
+    """
+    與 AI 聊天 (串流)。以 server-sent events 返回：
+    delta (text 為新產生的文字，html 為其間完成的 Markdown 區塊)、
+    done (html 為剩餘區塊，reply_html 為完整回覆) 或 error。
+    對話記錄在串流完成後才儲存。
+    """
+    try:
+        chat_data = AgentChatModel(**request.get_json())
+    except ValidationError as e:
+        return jsonify(create_error_response("聊天資料驗證失敗", e.errors())), 400
+
+    chat_messages_for_api = _build_chat_messages(chat_data.message, chat_data.session_id, chat_data.ear_num_context)
+    # 在開始串流前取得名額，名額用完時仍可返回 503
+    chunks = stream_agent_call(stream_gemini_api, chat_messages_for_api, chat_data.api_key, generation_config_override={"temperature": 0.7})
+
+    def generate():
+        # 先送出註解讓代理伺服器立即轉送回應標頭
+        yield ": stream-open\n\n"
+        renderer = IncrementalMarkdown()
+        try:
+            for chunk in chunks:
+                if "error" in chunk:
+                    yield _sse('error', {'error': chunk['error']})
+                    return
+                if chunk["text"]:
+                    delta = {'text': chunk['text'], 'html': renderer.feed(chunk['text'])}
+                    if delta['html']:
+                        # 客戶端以純文字顯示尚未完成的段落，區塊完成時告知剩餘的文字
+                        delta['pending'] = renderer.pending
+                    yield _sse('delta', delta)
+        finally:
+            chunks.close()
+
+        model_reply_text = renderer.text or "抱歉，我暫時無法回答。"
+        tail_html = renderer.finish() if renderer.text else render_markdown(model_reply_text)
+        _save_chat_turn(chat_data.session_id, chat_data.message, model_reply_text, chat_data.ear_num_context)
+        yield _sse('done', {'html': tail_html, 'reply_html': render_markdown(model_reply_text)})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 客戶端在串流開始前斷線時，產生器不會執行，於回應關閉時停止讀取模型回應
+    response.call_on_close(chunks.close)
+    return response
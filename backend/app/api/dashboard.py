@@ -1,139 +1,234 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
-from app.models import db, Sheep, SheepEvent, SheepHistoricalData, EventTypeOption, EventDescriptionOption
-from sqlalchemy import func, case
-from sqlalchemy.orm import aliased
+from app.models import (
+    db, Sheep, SheepEvent, HistoryDailyRollup, EventDailyRollup,
+    EventTypeOption, EventDescriptionOption
+)
+from app.reminders import REMINDER_FIELDS
+from app.cache import cached_for_user
+from sqlalchemy import String, func, literal, select, union_all
 from datetime import datetime, date, timedelta
 
 bp = Blueprint('dashboard', __name__)
 
 
+def _build_dashboard_data(user_id, today):
+    """計算儀表板所需的聚合數據"""
+    seven_days_later = today + timedelta(days=7)
+
+    # 1. 常規提醒事項 (各提醒欄位以 (user_id, 日期) 索引進行範圍查詢)
+    reminders = []
+    reminder_query = union_all(*(
+        select(Sheep.EarNum.label('ear_num'), literal(field).label('field'), getattr(Sheep, field).label('due_date'))
+        .where(Sheep.user_id == user_id, getattr(Sheep, field) <= seven_days_later)
+        for field in REMINDER_FIELDS
+    ))
+    reminder_rows = db.session.execute(reminder_query.order_by('due_date')).all()
+
+    for row in reminder_rows:
+        status = "已過期" if row.due_date < today.isoformat() else "即將到期"
+        reminders.append({
+            "ear_num": row.ear_num,
+            "type": REMINDER_FIELDS[row.field],
+            "due_date": row.due_date,
+            "status": status
+        })
+
+    # 2. 停藥期提醒 (只讀取停藥期尚未結束的事件)
+    medication_events = db.session.query(
+        Sheep.EarNum, SheepEvent.medication, SheepEvent.withdrawal_end_date
+    ).join(Sheep, Sheep.id == SheepEvent.sheep_id)\
+     .filter(SheepEvent.user_id == user_id, SheepEvent.withdrawal_end_date >= today).all()
+
+    for event in medication_events:
+        reminders.append({
+            "ear_num": event.EarNum,
+            "type": f"停藥期 ({event.medication or '未指定藥品'})",
+            "due_date": event.withdrawal_end_date,
+            "status": "停藥中"
+        })
+
+    # 3. 羊群狀態摘要
+    flock_status_summary = db.session.query(
+        Sheep.status, func.count(Sheep.id)
+    ).filter(Sheep.user_id == user_id, Sheep.status != None, Sheep.status != '').group_by(Sheep.status).all()
+    flock_summary_list = [{"status": status, "count": count} for status, count in flock_status_summary]
+
+    # 4. 健康與福利警示
+    health_alerts = []
+    # (此處的健康警示邏輯與原專案保持一致，未來可進一步優化)
+    
+    # 5. ESG 指標模擬
+    fcr_value = 4.5 # 簡化模擬值
+
+    return {
+        "reminders": sorted(reminders, key=lambda x: (x.get("due_date", "9999-99-99"))),
+        "health_alerts": health_alerts,
+        "flock_status_summary": flock_summary_list,
+        "esg_metrics": {"fcr": fcr_value}
+    }
+
+
 @bp.route('/data', methods=['GET'])
 @login_required
 def get_dashboard_data():
-    """獲取儀表板所需的聚合數據"""
+    """獲取儀表板所需的聚合數據 (依數據版本與日期快取，羊隻資料寫入後自動失效)"""
     try:
-        user_id = current_user.id
-        today = date.today()
-        seven_days_later = today + timedelta(days=7)
-        
-        # 1. 常規提醒事項
-        reminders = []
-        reminder_fields = {
-            "next_vaccination_due_date": "疫苗接種",
-            "next_deworming_due_date": "驅蟲",
-            "expected_lambing_date": "預產期"
-        }
-        
-        # 查詢所有有設定提醒日期的羊隻
-        reminder_sheep = db.session.query(
-            Sheep.EarNum,
-            Sheep.next_vaccination_due_date,
-            Sheep.next_deworming_due_date,
-            Sheep.expected_lambing_date
-        ).filter(
-            Sheep.user_id == user_id,
-            (Sheep.next_vaccination_due_date != None) |
-            (Sheep.next_deworming_due_date != None) |
-            (Sheep.expected_lambing_date != None)
-        ).all()
-
-        for s in reminder_sheep:
-            for field, type_name in reminder_fields.items():
-                due_date_str = getattr(s, field)
-                if due_date_str:
-                    due_date_obj = datetime.strptime(due_date_str, '%Y-%m-%d').date()
-                    if due_date_obj <= seven_days_later:
-                        status = "即將到期"
-                        if due_date_obj < today: status = "已過期"
-                        reminders.append({"ear_num": s.EarNum, "type": type_name, "due_date": due_date_str, "status": status})
-
-        # 2. 停藥期提醒
-        medication_events = db.session.query(
-            Sheep.EarNum, SheepEvent.event_date, SheepEvent.medication, SheepEvent.withdrawal_days
-        ).join(Sheep, Sheep.id == SheepEvent.sheep_id)\
-         .filter(Sheep.user_id == user_id, SheepEvent.withdrawal_days != None, SheepEvent.withdrawal_days > 0).all()
-
-        for event in medication_events:
-            event_date_obj = datetime.strptime(event.event_date, '%Y-%m-%d').date()
-            end_date = event_date_obj + timedelta(days=event.withdrawal_days)
-            if end_date >= today:
-                reminders.append({
-                    "ear_num": event.EarNum,
-                    "type": f"停藥期 ({event.medication or '未指定藥品'})",
-                    "due_date": end_date.strftime('%Y-%m-%d'),
-                    "status": "停藥中"
-                })
-
-        # 3. 羊群狀態摘要
-        flock_status_summary = db.session.query(
-            Sheep.status, func.count(Sheep.id)
-        ).filter(Sheep.user_id == user_id, Sheep.status != None, Sheep.status != '').group_by(Sheep.status).all()
-        flock_summary_list = [{"status": status, "count": count} for status, count in flock_status_summary]
-
-        # 4. 健康與福利警示
-        health_alerts = []
-        # (此處的健康警示邏輯與原專案保持一致，未來可進一步優化)
-        
-        # 5. ESG 指標模擬
-        fcr_value = 4.5 # 簡化模擬值
-
-        return jsonify({
-            "reminders": sorted(reminders, key=lambda x: (x.get("due_date", "9999-99-99"))),
-            "health_alerts": health_alerts,
-            "flock_status_summary": flock_summary_list,
-            "esg_metrics": {"fcr": fcr_value}
-        })
-        
+        user_id, today = current_user.id, date.today()
+        return jsonify(cached_for_user('dashboard', user_id, lambda: _build_dashboard_data(user_id, today), extra_key=today.isoformat()))
     except Exception as e:
         current_app.logger.error(f"獲取儀表板數據時發生錯誤: {e}", exc_info=True)
         return jsonify(error=f"伺服器內部錯誤，無法生成儀表板數據: {str(e)}"), 500
 
+
+# 牧場報告可選擇的區塊
+FARM_REPORT_SECTIONS = ('flock_composition', 'production_summary', 'health_summary')
+
+
+def _query_sheep_aggregates(user_id):
+    """
+    以單次查詢依 (品種, 性別) 分組，同時取得數量與出生體重、產仔數的總和及筆數；
+    品種、性別分佈、總數與平均值都由分組結果推算。
+    """
+    rows = db.session.query(
+        Sheep.Breed, Sheep.Sex, func.count(Sheep.id),
+        func.sum(Sheep.BirWei), func.count(Sheep.BirWei),
+        func.sum(Sheep.LittleSize), func.count(Sheep.LittleSize)
+    ).filter(Sheep.user_id == user_id).group_by(Sheep.Breed, Sheep.Sex).all()
+
+    by_breed, by_sex = {}, {}
+    totals = {'count': 0, 'birth_weight': [0.0, 0], 'litter_size': [0, 0]}
+    for breed, sex, count, weight_sum, weight_count, litter_sum, litter_count in rows:
+        if breed is not None: by_breed[breed] = by_breed.get(breed, 0) + count
+        if sex is not None: by_sex[sex] = by_sex.get(sex, 0) + count
+        totals['count'] += count
+        totals['birth_weight'][0] += weight_sum or 0
+        totals['birth_weight'][1] += weight_count
+        totals['litter_size'][0] += litter_sum or 0
+        totals['litter_size'][1] += litter_count
+
+    def average(key):
+        value_sum, value_count = totals[key]
+        return value_sum / value_count if value_count else None
+
+    return {
+        'by_breed': sorted(by_breed.items()), 'by_sex': sorted(by_sex.items()), 'total': totals['count'],
+        'avg_birth_weight': average('birth_weight'), 'avg_litter_size': average('litter_size')
+    }
+
+
+def _query_record_aggregates(user_id, include_milk=True, include_diseases=True):
+    """以單次 UNION ALL 查詢取得平均產奶量 (讀取每日彙總) 與前五名疾病"""
+    parts = []
+    if include_milk:
+        # 平均值由每日彙總的總和與筆數計算，不掃描原始記錄
+        parts.append(db.session.query(
+            literal('milk_yield').label('section'), literal(None, type_=String).label('name'),
+            (func.sum(HistoryDailyRollup.sum) / func.sum(HistoryDailyRollup.count)).label('value')
+        ).filter(HistoryDailyRollup.user_id == user_id, HistoryDailyRollup.record_type == 'milk_yield_kg_day'))
+    if include_diseases:
+        top_diseases = db.session.query(
+            SheepEvent.description.label('name'), func.count(SheepEvent.id).label('value')
+        ).filter(SheepEvent.user_id == user_id, SheepEvent.event_type == '疾病治療', SheepEvent.description != None)\
+         .group_by(SheepEvent.description).order_by(func.count(SheepEvent.id).desc(), SheepEvent.description).limit(5).subquery()
+        parts.append(db.session.query(literal('disease').label('section'), top_diseases.c.name, top_diseases.c.value))
+    if not parts:
+        return {'avg_milk_yield': None, 'top_diseases': []}
+
+    query = parts[0].union_all(*parts[1:]) if len(parts) > 1 else parts[0]
+    result = {'avg_milk_yield': None, 'top_diseases': []}
+    for section, name, value in query.all():
+        if section == 'milk_yield': result['avg_milk_yield'] = value
+        else: result['top_diseases'].append((name, value))
+    result['top_diseases'].sort(key=lambda item: (-item[1], item[0]))
+    return result
+
+
+def _build_farm_report(user_id, sections=FARM_REPORT_SECTIONS):
+    """
+    計算牧場報告的指定區塊。羊隻相關統計共用一次分組查詢，
+    產奶量與疾病統計共用一次 UNION 查詢，完整報告只需兩次查詢。
+    """
+    report = {}
+    if 'flock_composition' in sections or 'production_summary' in sections:
+        sheep = _query_sheep_aggregates(user_id)
+    if 'production_summary' in sections or 'health_summary' in sections:
+        records = _query_record_aggregates(
+            user_id, include_milk='production_summary' in sections, include_diseases='health_summary' in sections
+        )
+
+    if 'flock_composition' in sections:
+        report["flock_composition"] = {
+            "by_breed": [{"name": name or "未分類", "count": count} for name, count in sheep['by_breed']],
+            "by_sex": [{"name": name or "未分類", "count": count} for name, count in sheep['by_sex']],
+            "total": sheep['total']
+        }
+    if 'production_summary' in sections:
+        report["production_summary"] = {
+            "avg_birth_weight": round(p, 2) if (p := sheep['avg_birth_weight']) else None,
+            "avg_litter_size": round(p, 1) if (p := sheep['avg_litter_size']) else None,
+            "avg_milk_yield": round(p, 2) if (p := records['avg_milk_yield']) else None,
+        }
+    if 'health_summary' in sections:
+        report["health_summary"] = {
+            "top_diseases": [{"name": name or "未指定描述", "count": count} for name, count in records['top_diseases']]
+        }
+    return report
+
+
 @bp.route('/farm_report', methods=['GET'])
 @login_required
 def get_farm_report():
-    """生成牧場報告"""
+    """
+    生成牧場報告 (依數據版本快取，羊隻資料寫入後自動失效)。
+    sections 以逗號分隔選擇區塊 (flock_composition / production_summary / health_summary)，預設全部。
+    """
+    sections = [name.strip() for name in request.args.get('sections', '').split(',') if name.strip()]
+    invalid = [name for name in sections if name not in FARM_REPORT_SECTIONS]
+    if invalid:
+        return jsonify(error=f"不支援的報告區塊: {', '.join(invalid)}"), 400
+    sections = tuple(name for name in FARM_REPORT_SECTIONS if name in sections) or FARM_REPORT_SECTIONS
+
     try:
         user_id = current_user.id
-        
-        flock_composition = {
-            'by_breed': db.session.query(Sheep.Breed, func.count(Sheep.id)).filter(Sheep.user_id == user_id, Sheep.Breed != None).group_by(Sheep.Breed).all(),
-            'by_sex': db.session.query(Sheep.Sex, func.count(Sheep.id)).filter(Sheep.user_id == user_id, Sheep.Sex != None).group_by(Sheep.Sex).all()
-        }
-        
-        production_summary = {
-            'avg_birth_weight': db.session.query(func.avg(Sheep.BirWei)).filter(Sheep.user_id == user_id, Sheep.BirWei != None).scalar(),
-            'avg_litter_size': db.session.query(func.avg(Sheep.LittleSize)).filter(Sheep.user_id == user_id, Sheep.LittleSize != None).scalar(),
-            'avg_milk_yield': db.session.query(func.avg(SheepHistoricalData.value)).filter(SheepHistoricalData.user_id == user_id, SheepHistoricalData.record_type == 'milk_yield_kg_day').scalar()
-        }
-        
-        disease_stats = db.session.query(
-            SheepEvent.description, func.count(SheepEvent.id)
-        ).filter(SheepEvent.user_id == user_id, SheepEvent.event_type == '疾病治療', SheepEvent.description != None)\
-         .group_by(SheepEvent.description).order_by(func.count(SheepEvent.id).desc()).limit(5).all()
-
-        report = {
-            "flock_composition": {
-                "by_breed": [{"name": item[0] or "未分類", "count": item[1]} for item in flock_composition['by_breed']],
-                "by_sex": [{"name": item[0] or "未分類", "count": item[1]} for item in flock_composition['by_sex']],
-                "total": db.session.query(func.count(Sheep.id)).filter(Sheep.user_id == user_id).scalar() or 0
-            },
-            "production_summary": {
-                "avg_birth_weight": round(p, 2) if (p := production_summary['avg_birth_weight']) else None,
-                "avg_litter_size": round(p, 1) if (p := production_summary['avg_litter_size']) else None,
-                "avg_milk_yield": round(p, 2) if (p := production_summary['avg_milk_yield']) else None,
-            },
-            "health_summary": {
-                "top_diseases": [{"name": item[0] or "未指定描述", "count": item[1]} for item in disease_stats]
-            }
-        }
-        
-        return jsonify(report)
-
+        return jsonify(cached_for_user(
+            'farm_report', user_id, lambda: _build_farm_report(user_id, sections), extra_key=','.join(sections)
+        ))
     except Exception as e:
         current_app.logger.error(f"生成牧場報告時發生錯誤: {e}", exc_info=True)
         return jsonify(error=f"伺服器內部錯誤，無法生成報告: {str(e)}"), 500
 
+@bp.route('/trends', methods=['GET'])
+@login_required
+def get_trends():
+    """
+    取得每日趨勢 (讀取每日彙總表)。
+    可用參數：record_type / event_type 篩選類型 (可重複指定)、from 與 to 限定日期範圍 (YYYY-MM-DD)。
+    """
+    start, end = request.args.get('from'), request.args.get('to')
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify(error="日期格式必須為 YYYY-MM-DD"), 400
+
+    def daily(model, date_column, type_column, types):
+        query = model.query.filter(model.user_id == current_user.id)
+        if types: query = query.filter(type_column.in_(types))
+        if start: query = query.filter(date_column >= start)
+        if end: query = query.filter(date_column <= end)
+        return [row.to_dict() for row in query.order_by(type_column, date_column)]
+
+    try:
+        return jsonify(
+            history=daily(HistoryDailyRollup, HistoryDailyRollup.record_date, HistoryDailyRollup.record_type, request.args.getlist('record_type')),
+            events=daily(EventDailyRollup, EventDailyRollup.event_date, EventDailyRollup.event_type, request.args.getlist('event_type'))
+        )
+    except Exception as e:
+        current_app.logger.error(f"獲取趨勢數據時發生錯誤: {e}", exc_info=True)
+        return jsonify(error=f"伺服器內部錯誤，無法獲取趨勢數據: {str(e)}"), 500
+
 # --- 事件選項自訂 API ---
 
 @bp.route('/event_options', methods=['GET'])
@@ -2,67 +2,44 @@ import pandas as pd
 import json
 from io import BytesIO
 from datetime import datetime
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, stream_with_context, url_for
 from flask_login import login_required, current_user
 from app import db
-from app.models import Sheep, SheepEvent, SheepHistoricalData, ChatHistory
+from app.models import ImportJob
+from app.import_engine import ANALYZE_PREVIEW_ROWS, DEFAULT_IMPORT_CONFIG, analyze_workbook
+from app.exporters import (
+    EMPTY_EXPORT_MESSAGE, EMPTY_EXPORT_SHEET, create_export_tempfile, file_download_response,
+    iter_csv_zip, iter_ndjson, read_export_frames, remove_file, write_parquet_zip, write_streaming_xlsx
+)
+from app.import_jobs import enqueue_import_job, remove_upload, save_upload
+from app.upload_cache import cache_upload, has_cached_upload
 
 bp = Blueprint('data_management', __name__)
 
 @bp.route('/export_excel', methods=['GET'])
 @login_required
 def export_excel():
-    """將用戶所有數據匯出為 Excel 檔案"""
-    try:
-        user_id = current_user.id
-        db_engine = db.engine 
-
-        # 準備查詢
-        sheep_query = Sheep.query.filter_by(user_id=user_id).order_by(Sheep.EarNum)
-        events_query = SheepEvent.query.join(Sheep).filter(Sheep.user_id==user_id).order_by(Sheep.EarNum, SheepEvent.event_date.desc())
-        history_query = SheepHistoricalData.query.join(Sheep).filter(Sheep.user_id==user_id).order_by(Sheep.EarNum, SheepHistoricalData.record_date)
-        chat_query = ChatHistory.query.filter_by(user_id=user_id).order_by(ChatHistory.timestamp)
+    """將用戶所有數據匯出為 Excel 檔案 (mode=stream 時以串流模式寫出)"""
+    if request.args.get('mode') == 'stream':
+        return export_excel_streaming()
 
-        # 讀取到 Pandas DataFrame
-        df_sheep = pd.read_sql(sheep_query.statement, db_engine) if sheep_query.first() else pd.DataFrame()
-        df_events = pd.read_sql(events_query.statement, db_engine) if events_query.first() else pd.DataFrame()
-        df_history = pd.read_sql(history_query.statement, db_engine) if history_query.first() else pd.DataFrame()
-        df_chat = pd.read_sql(chat_query.statement, db_engine) if chat_query.first() else pd.DataFrame()
+    try:
+        frames = read_export_frames(current_user.id)
 
         output = BytesIO()
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             # 確保至少有一個工作表
             has_data = False
             
-            if not df_sheep.empty:
-                df_sheep.to_excel(writer, sheet_name='Sheep_Basic_Info', index=False)
-                has_data = True
-            
-            if not df_events.empty:
-                # 建立羊隻 ID 到耳號的映射
-                sheep_map = {s.id: s.EarNum for s in sheep_query.all()}
-                df_events['EarNum'] = df_events['sheep_id'].map(sheep_map)
-                # 重新排列欄位，將 EarNum 放在最前面
-                cols = ['EarNum'] + [col for col in df_events.columns if col not in ['EarNum', 'sheep_id']]
-                df_events[cols].to_excel(writer, sheet_name='Sheep_Events_Log', index=False)
-                has_data = True
-
-            if not df_history.empty:
-                if 'sheep_map' not in locals():
-                    sheep_map = {s.id: s.EarNum for s in sheep_query.all()}
-                df_history['EarNum'] = df_history['sheep_id'].map(sheep_map)
-                cols = ['EarNum'] + [col for col in df_history.columns if col not in ['EarNum', 'sheep_id']]
-                df_history[cols].to_excel(writer, sheet_name='Sheep_Historical_Data', index=False)
-                has_data = True
-            
-            if not df_chat.empty:
-                df_chat.to_excel(writer, sheet_name='Chat_History', index=False)
-                has_data = True
+            for sheet_name, df in frames:
+                if not df.empty:
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+                    has_data = True
             
             # 如果沒有任何數據，創建一個空的工作表
             if not has_data:
-                empty_df = pd.DataFrame({'說明': ['目前沒有數據可匯出']})
-                empty_df.to_excel(writer, sheet_name='Empty_Export', index=False)
+                empty_df = pd.DataFrame({'說明': [EMPTY_EXPORT_MESSAGE]})
+                empty_df.to_excel(writer, sheet_name=EMPTY_EXPORT_SHEET, index=False)
 
         output.seek(0)
         
@@ -80,10 +57,64 @@ def export_excel():
         current_app.logger.error(f"匯出 Excel 失敗: {e}", exc_info=True)
         return jsonify(error=f"匯出 Excel 失敗: {str(e)}"), 500
 
+def export_excel_streaming():
+    """分頁讀取資料庫並以唯寫工作簿寫入暫存檔，記憶體用量不隨資料量增長"""
+    path = create_export_tempfile('.xlsx')
+    try:
+        write_streaming_xlsx(current_user.id, path)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return file_download_response(
+            path,
+            f"goat_data_export_{timestamp}.xlsx",
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+    except Exception as e:
+        remove_file(path)
+        current_app.logger.error(f"串流匯出 Excel 失敗: {e}", exc_info=True)
+        return jsonify(error=f"匯出 Excel 失敗: {str(e)}"), 500
+
+EXPORT_FORMATS = ('xlsx', 'csv.zip', 'parquet', 'ndjson')
+
+@bp.route('/export', methods=['GET'])
+@login_required
+def export_data():
+    """以機器可讀格式匯出用戶所有數據 (format=xlsx|csv.zip|parquet|ndjson)"""
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify(error=f"不支援的匯出格式: {export_format}，可用格式: {', '.join(EXPORT_FORMATS)}"), 400
+
+    if export_format == 'xlsx':
+        return export_excel_streaming()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    user_id = current_user.id
+
+    if export_format == 'parquet':
+        path = create_export_tempfile('.zip')
+        try:
+            write_parquet_zip(user_id, path)
+            return file_download_response(path, f"goat_data_export_{timestamp}.parquet.zip", 'application/zip')
+        except Exception as e:
+            remove_file(path)
+            current_app.logger.error(f"匯出 Parquet 失敗: {e}", exc_info=True)
+            return jsonify(error=f"匯出數據失敗: {str(e)}"), 500
+
+    # CSV 與 NDJSON 逐批讀取並逐列輸出，不在記憶體中組裝完整檔案
+    if export_format == 'csv.zip':
+        body, filename, mimetype = iter_csv_zip(user_id), f"goat_data_export_{timestamp}.csv.zip", 'application/zip'
+    else:
+        body, filename, mimetype = iter_ndjson(user_id), f"goat_data_export_{timestamp}.ndjson", 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/analyze_excel', methods=['POST'])
 @login_required
 def analyze_excel():
-    """分析上傳的 Excel 檔案結構"""
+    """分析上傳的 Excel 檔案結構 (預設為快速模式，mode=full 時完整解析)"""
     if 'file' not in request.files:
         return jsonify(error="沒有檔案被上傳"), 400
     file = request.files['file']
@@ -93,18 +124,28 @@ def analyze_excel():
         return jsonify(error="不支援的檔案格式，請上傳 .xlsx 或 .xls 檔案"), 400
         
     try:
+        # 暫存上傳檔案，導入時可以憑證取代再次上傳
+        upload_token = cache_upload(file, current_user.id)
         xls = pd.ExcelFile(file)
-        sheets_data = {}
-        for sheet_name in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
-            df = df.where(pd.notna(df), None) # 將 NaN 轉換為 None
-            preview_data = df.head(3).to_dict(orient='records')
-            sheets_data[sheet_name] = {
-                "columns": list(df.columns),
-                "rows": len(df),
-                "preview": preview_data
-            }
-        return jsonify(success=True, sheets=sheets_data)
+        try:
+            if request.args.get('mode') == 'full':
+                # 完整解析每個工作表，取得精確列數
+                sheets_data = {}
+                for sheet_name in xls.sheet_names:
+                    df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
+                    df = df.where(pd.notna(df), None) # 將 NaN 轉換為 None
+                    preview_data = df.head(ANALYZE_PREVIEW_ROWS).to_dict(orient='records')
+                    sheets_data[sheet_name] = {
+                        "columns": list(df.columns),
+                        "rows": len(df),
+                        "preview": preview_data
+                    }
+            else:
+                # 只讀取標題列與預覽列，列數取自工作表尺寸資訊
+                sheets_data = analyze_workbook(xls, ANALYZE_PREVIEW_ROWS)
+        finally:
+            xls.close()
+        return jsonify(success=True, sheets=sheets_data, upload_token=upload_token)
 
     except Exception as e:
         current_app.logger.error(f"分析 Excel 檔案失敗: {e}", exc_info=True)
@@ -113,27 +154,15 @@ def analyze_excel():
 @bp.route('/process_import', methods=['POST'])
 @login_required
 def process_import():
-    """處理數據導入"""
-    if 'file' not in request.files:
+    """處理數據導入 (可上傳檔案，或提供 analyze_excel 返回的 upload_token)"""
+    upload_token = request.form.get('upload_token')
+    if 'file' not in request.files and not upload_token:
         return jsonify(error="請求缺少檔案參數"), 400
     
-    file = request.files['file']
     is_default_mode = request.form.get('is_default_mode', 'false').lower() == 'true'
 
     if is_default_mode:
-        # 內建的標準範本映射設定
-        config = {
-            "sheets": {
-                "0009-0013A1_Basic": {"purpose": "basic_info", "columns": {"EarNum": "EarNum", "Breed": "Breed", "Sex": "Sex", "BirthDate": "BirthDate", "Sire": "Sire", "Dam": "Dam", "BirWei": "BirWei", "SireBre": "SireBre", "DamBre": "DamBre", "MoveCau": "MoveCau", "MoveDate": "MoveDate", "Class": "Class", "LittleSize": "LittleSize", "Lactation": "Lactation", "ManaClas": "ManaClas", "FarmNum": "FarmNum", "RUni": "RUni"}},
-                "0009-0013A4_Kidding": {"purpose": "kidding_record", "columns": {"EarNum": "EarNum", "YeanDate": "YeanDate", "KidNum": "KidNum", "KidSex": "KidSex"}},
-                "0009-0013A2_PubMat": {"purpose": "mating_record", "columns": {"EarNum": "EarNum", "Mat_date": "Mat_date", "Mat_grouM_Sire": "Mat_grouM_Sire"}},
-                "0009-0013A3_Yean": {"purpose": "yean_record", "columns": {"EarNum": "EarNum", "YeanDate": "YeanDate", "DryOffDate": "DryOffDate", "Lactation": "Lactation"}},
-                "0009-0013A9_Milk": {"purpose": "milk_yield_record", "columns": {"EarNum": "EarNum", "MeaDate": "MeaDate", "Milk": "Milk"}},
-                "0009-0013A11_MilkAnalysis": {"purpose": "milk_analysis_record", "columns": {"EarNum": "EarNum", "MeaDate": "MeaDate", "AMFat": "AMFat"}},
-                "S2_Breed": {"purpose": "breed_mapping", "columns": {"Code": "Symbol", "Name": "Breed"}},
-                "S7_Sex": {"purpose": "sex_mapping", "columns": {"Code": "Num", "Name": "Sex"}},
-            }
-        }
+        config = DEFAULT_IMPORT_CONFIG
     else:
         if 'mapping_config' not in request.form:
             return jsonify(error="手動模式請求缺少映射設定參數"), 400
@@ -142,143 +171,54 @@ def process_import():
         except json.JSONDecodeError:
             return jsonify(error="映射設定格式錯誤"), 400
 
-    try:
-        xls = pd.ExcelFile(file)
-        report_details = []
-        
-        def format_date(d):
-            if pd.isna(d) or d is None: return None
-            try:
-                # 處理 '1900-01-01' 或 '1900/1/1' 這類代表空值的日期
-                if '1900' in str(d): return None
-                dt = pd.to_datetime(d)
-                # 處理 excel 日期原點問題
-                if dt.year < 1901: return None
-                return dt.strftime('%Y-%m-%d')
-            except (ValueError, TypeError):
-                return None
-
-        # --- 第一階段：讀取映射表並建立羊隻基礎資料 ---
-        breed_map, sex_map = {}, {}
-        sheets_to_process = config.get('sheets', {})
-
-        # 優先處理映射表
-        for sheet_name, sheet_config in sheets_to_process.items():
-            if sheet_name not in xls.sheet_names: continue
-            purpose = sheet_config.get('purpose')
-            cols = sheet_config.get('columns', {})
-            df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str).where(pd.notna, None)
-            
-            if purpose == 'breed_mapping' and cols.get('Code') and cols.get('Name'):
-                for _, row in df.iterrows():
-                    if row.get(cols['Code']): breed_map[str(row[cols['Code']])] = row[cols['Name']]
-            elif purpose == 'sex_mapping' and cols.get('Code') and cols.get('Name'):
-                for _, row in df.iterrows():
-                    if row.get(cols['Code']): sex_map[str(row[cols['Code']])] = row[cols['Name']]
-
-        # 處理基礎資料
-        for sheet_name, sheet_config in sheets_to_process.items():
-            if sheet_name not in xls.sheet_names or sheet_config.get('purpose') != 'basic_info': continue
-            
-            cols = sheet_config.get('columns', {})
-            if 'EarNum' not in cols: continue
-            
-            df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str).where(pd.notna, None)
-            created, updated = 0, 0
-            for _, row in df.iterrows():
-                ear_num = row.get(cols['EarNum'])
-                if not ear_num: continue
-
-                sheep = Sheep.query.filter_by(user_id=current_user.id, EarNum=ear_num).first()
-                if not sheep:
-                    sheep = Sheep(user_id=current_user.id, EarNum=ear_num)
-                    db.session.add(sheep)
-                    created += 1
-                else:
-                    updated += 1
-                
-                for db_field, xls_col in cols.items():
-                    if hasattr(sheep, db_field) and xls_col in row and row[xls_col] is not None:
-                        value = row[xls_col]
-                        if db_field == 'Breed': value = breed_map.get(str(value), value)
-                        elif db_field == 'Sex': value = sex_map.get(str(value), value)
-                        elif 'Date' in db_field: value = format_date(value)
-                        setattr(sheep, db_field, value)
-            
-            db.session.commit() # 提交基礎資料變更
-            report_details.append({"sheet": sheet_name, "message": f"處理完成。新增 {created} 筆，更新 {updated} 筆基礎資料。"})
+    # 去除重複模式：略過先前已導入過的事件與歷史數據
+    if request.form.get('dedupe', 'false').lower() == 'true':
+        config = {**config, 'dedupe': True}
 
-        # --- 第二階段：處理事件和歷史數據 ---
-        sheep_id_cache = {s.EarNum: s.id for s in Sheep.query.filter_by(user_id=current_user.id).all()}
-        
-        for sheet_name, sheet_config in sheets_to_process.items():
-            if sheet_name not in xls.sheet_names or sheet_config.get('purpose') in ['ignore', 'basic_info', 'breed_mapping', 'sex_mapping']: continue
-
-            cols = sheet_config.get('columns', {})
-            df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str).where(pd.notna, None)
-            count = 0
-            
-            for _, row in df.iterrows():
-                ear_num = row.get(cols.get('EarNum'))
-                sheep_id = sheep_id_cache.get(ear_num)
-                if not sheep_id: continue
-                
-                # 初始化事件和歷史數據變數
-                event_type, event_desc, event_date_val = None, None, None
-                hist_type, hist_value, hist_date_val = None, None, None
-
-                purpose = sheet_config.get('purpose')
-                
-                # 根據用途設定事件或歷史數據
-                if purpose == 'kidding_record':
-                    event_type, event_date_val = '產仔', row.get(cols.get('YeanDate'))
-                    event_desc = f"產下仔羊: {row.get(cols.get('KidNum'))}" if cols.get('KidNum') in row else None
-                
-                elif purpose == 'mating_record':
-                    event_type, event_date_val = '配種', row.get(cols.get('Mat_date'))
-                    event_desc = f"配種公羊: {row.get(cols.get('Mat_grouM_Sire'))}" if cols.get('Mat_grouM_Sire') in row else None
-                
-                elif purpose == 'yean_record':
-                    yean_date = format_date(row.get(cols.get('YeanDate')))
-                    dry_off_date = format_date(row.get(cols.get('DryOffDate')))
-                    lactation = row.get(cols.get('Lactation'))
-                    if yean_date:
-                        db.session.add(SheepEvent(user_id=current_user.id, sheep_id=sheep_id, event_date=yean_date, event_type='泌乳開始', description=f"第 {lactation} 胎次"))
-                        count += 1
-                    if dry_off_date:
-                        db.session.add(SheepEvent(user_id=current_user.id, sheep_id=sheep_id, event_date=dry_off_date, event_type='乾乳', description=f"第 {lactation} 胎次結束"))
-                        count += 1
-                    continue
-                
-                elif purpose in ['weight_record', 'milk_yield_record', 'milk_analysis_record']:
-                    if purpose == 'weight_record':
-                        hist_type, hist_date_val, hist_value = 'Body_Weight_kg', row.get(cols.get('MeaDate')), row.get(cols.get('Weight'))
-                    elif purpose == 'milk_yield_record':
-                        hist_type, hist_date_val, hist_value = 'milk_yield_kg_day', row.get(cols.get('MeaDate')), row.get(cols.get('Milk'))
-                    elif purpose == 'milk_analysis_record':
-                        hist_type, hist_date_val, hist_value = 'milk_fat_percentage', row.get(cols.get('MeaDate')), row.get(cols.get('AMFat'))
-                
-                # 統一處理日期和數據寫入
-                formatted_date = format_date(event_date_val or hist_date_val)
-                if not formatted_date: continue
-
-                if event_type:
-                    db.session.add(SheepEvent(user_id=current_user.id, sheep_id=sheep_id, event_date=formatted_date, event_type=event_type, description=event_desc))
-                    count += 1
-                elif hist_type and hist_value is not None:
-                    try:
-                        db.session.add(SheepHistoricalData(user_id=current_user.id, sheep_id=sheep_id, record_date=formatted_date, record_type=hist_type, value=float(hist_value)))
-                        count += 1
-                    except (ValueError, TypeError):
-                        continue
+    if 'file' not in request.files:
+        if not has_cached_upload(current_user.id, upload_token):
+            return jsonify(error="上傳檔案快取已過期，請重新上傳檔案"), 410
+        try:
+            job = enqueue_import_job(None, config, current_user.id, upload_token=upload_token)
+            return _import_job_response(job)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"導入 Excel 數據失敗: {e}", exc_info=True)
+            return jsonify(error=f"導入數據過程中發生錯誤: {str(e)}"), 500
 
-            if count > 0:
-                report_details.append({"sheet": sheet_name, "message": f"成功導入 {count} 筆記錄。"})
+    try:
+        file_path = save_upload(request.files['file'])
+    except Exception as e:
+        current_app.logger.error(f"暫存導入檔案失敗: {e}", exc_info=True)
+        return jsonify(error=f"導入數據過程中發生錯誤: {str(e)}"), 500
 
-        db.session.commit()
-        return jsonify(success=True, message="數據導入已成功完成！", details=report_details)
+    try:
+        # 先確認檔案可被解析，格式錯誤時立即回報
+        with pd.ExcelFile(file_path):
+            pass
+        job = enqueue_import_job(file_path, config, current_user.id)
+        return _import_job_response(job)
 
     except Exception as e:
         db.session.rollback()
+        remove_upload(file_path)
         current_app.logger.error(f"導入 Excel 數據失敗: {e}", exc_info=True)
-        return jsonify(error=f"導入數據過程中發生錯誤: {str(e)}"), 500
\ No newline at end of file
+        return jsonify(error=f"導入數據過程中發生錯誤: {str(e)}"), 500
+
+def _import_job_response(job):
+    return jsonify(
+        success=True,
+        message="數據導入任務已建立，請查詢任務進度。",
+        job_id=job.id,
+        status=job.status,
+        status_url=url_for('data_management.get_import_job', job_id=job.id)
+    ), 202
+
+@bp.route('/jobs/<string:job_id>', methods=['GET'])
+@login_required
+def get_import_job(job_id):
+    """查詢導入任務的進度與結果"""
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify(error="找不到該導入任務或您沒有權限"), 404
+    return jsonify(job.to_dict())
@@ -1,23 +1,168 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import db, Sheep, SheepEvent, SheepHistoricalData
+from app.models import db, Sheep, SheepEvent, SheepHistoricalData, SyncTombstone, parse_date_value
+from app.data_version import conditional_on_data_version, get_data_version
+from app.timeseries import BUCKET_PERIODS, bucket_history, lttb_indices
 from app.schemas import (
     SheepCreateModel, SheepUpdateModel, SheepEventCreateModel, 
     HistoricalDataCreateModel, create_error_response
 )
 from pydantic import ValidationError
 from datetime import datetime, date
+import base64
+from sqlalchemy import select
 
 bp = Blueprint('sheep', __name__)
 
 # --- Sheep (羊隻) API Endpoints ---
 
+# 列表可篩選的欄位
+SHEEP_LIST_FILTERS = ('status', 'Breed', 'Sex', 'FarmNum', 'breed_category')
+SHEEP_LIST_DEFAULT_LIMIT = 100
+SHEEP_LIST_MAX_LIMIT = 1000
+
+
+def _encode_cursor(ear_num):
+    return base64.urlsafe_b64encode(ear_num.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (ValueError, UnicodeError):
+        raise ValueError("cursor 參數格式錯誤")
+
+
+def _parse_limit(value):
+    limit = value if value is not None else str(SHEEP_LIST_DEFAULT_LIMIT)
+    if not limit.isdigit() or not 1 <= int(limit) <= SHEEP_LIST_MAX_LIMIT:
+        raise ValueError(f"limit 必須介於 1 到 {SHEEP_LIST_MAX_LIMIT} 之間")
+    return int(limit)
+
+
+def _parse_sheep_fields(fields_param):
+    """解析 fields 參數，返回要查詢的欄位 (耳號一定包含，用於分頁游標)"""
+    columns = Sheep.__table__.columns
+    names = [name.strip() for name in fields_param.split(',') if name.strip()]
+    invalid = [name for name in names if name not in columns]
+    if invalid:
+        raise ValueError(f"不支援的欄位: {', '.join(invalid)}")
+    if 'EarNum' not in names:
+        names.insert(0, 'EarNum')
+    return [columns[name] for name in names]
+
+
 @bp.route('/', methods=['GET'])
 @login_required
+@conditional_on_data_version
 def get_all_sheep():
-    """取得該用戶的所有羊隻列表"""
-    sheep_list = Sheep.query.filter_by(user_id=current_user.id).order_by(Sheep.EarNum).all()
-    return jsonify([s.to_dict() for s in sheep_list])
+    """
+    取得該用戶的羊隻列表。
+    可用參數：status / Breed / Sex / FarmNum / breed_category 篩選 (可重複指定多個值)、
+    fields 以逗號分隔選擇欄位、limit 與 cursor 以耳號分頁。
+    提供 limit 或 cursor 時返回 {items, next_cursor}，否則維持返回陣列。
+    """
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        columns = _parse_sheep_fields(request.args['fields']) if 'fields' in request.args else list(Sheep.__table__.columns)
+        limit = _parse_limit(request.args.get('limit'))
+        after = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    query = select(*columns).where(Sheep.user_id == current_user.id)
+    for name in SHEEP_LIST_FILTERS:
+        values = request.args.getlist(name)
+        if values:
+            query = query.where(Sheep.__table__.columns[name].in_(values))
+    if after is not None:
+        query = query.where(Sheep.EarNum > after)
+    query = query.order_by(Sheep.EarNum)
+    if paginate:
+        query = query.limit(limit + 1)
+
+    items = [dict(row) for row in db.session.execute(query).mappings()]
+    if not paginate:
+        return jsonify(items)
+
+    next_cursor = _encode_cursor(items[limit - 1]['EarNum']) if len(items) > limit else None
+    return jsonify(items=items[:limit], next_cursor=next_cursor, limit=limit)
+
+# 增量同步依序返回的記錄種類
+SYNC_STAGES = (('sheep', Sheep), ('events', SheepEvent), ('history', SheepHistoricalData), ('deleted', SyncTombstone))
+
+
+def _decode_sync_cursor(cursor):
+    """同步游標包含固定的版本上限、目前的記錄種類與最後一筆的 id"""
+    try:
+        version, stage, last_id = _decode_cursor(cursor).split(':')
+        names = [name for name, _ in SYNC_STAGES]
+        return int(version), names.index(stage), int(last_id)
+    except ValueError:
+        raise ValueError("cursor 參數格式錯誤")
+
+
+@bp.route('/sync/changes', methods=['GET'])
+@login_required
+@conditional_on_data_version
+def get_changes():
+    """
+    增量同步：返回 since 版本之後新增、修改或刪除的羊隻、事件與歷史數據。
+    since 省略或為 0 時返回全部資料。每頁最多 limit 筆記錄，依羊隻、事件、歷史數據、刪除記錄的順序
+    以 id 分頁；next_cursor 不為 null 時帶入 cursor 取得下一頁，全部取完後於下次請求帶入回應中的 next
+    即可只取得差異。刪除羊隻時其事件與歷史數據一併刪除，客戶端應同時移除本地副本。
+    """
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        return jsonify(error="since 參數格式錯誤"), 400
+    since = int(since)
+    try:
+        limit = _parse_limit(request.args.get('limit'))
+        cursor = _decode_sync_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    # 第一頁讀取目前版本，之後各頁沿用同一個版本上限；期間提交的變更留待下次同步
+    version, start_stage, after_id = cursor or (get_data_version(current_user.id), 0, 0)
+    if since > version:
+        return jsonify(error="since 版本無效，請重新進行完整同步"), 400
+
+    def changed(model):
+        query = model.query.filter(model.user_id == current_user.id, model.sync_version <= version)
+        # 完整同步時包含尚未標記版本的既有記錄 (sync_version 為 0)
+        if since:
+            query = query.filter(model.sync_version > since)
+        return query.order_by(model.id)
+
+    records = {'sheep': [], 'events': [], 'history': []}
+    tombstones = {'sheep': [], 'event': [], 'history': []}
+    # 完整同步不需要刪除記錄
+    stages = SYNC_STAGES if since else SYNC_STAGES[:-1]
+    remaining, next_cursor = limit, None
+    for index in range(start_stage, len(stages)):
+        name, model = stages[index]
+        last_id = after_id if index == start_stage else 0
+        rows = changed(model).filter(model.id > last_id).limit(remaining + 1).all()
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            next_cursor = _encode_cursor(f"{version}:{name}:{rows[-1].id if rows else last_id}")
+        for row in rows:
+            if name == 'deleted':
+                tombstones[row.entity].append(row.to_dict())
+            else:
+                records[name].append(row.to_dict())
+        remaining -= len(rows)
+        if next_cursor:
+            break
+
+    return jsonify(
+        since=str(since),
+        next=str(version),
+        next_cursor=next_cursor,
+        limit=limit,
+        deleted=tombstones,
+        **records
+    )
 
 @bp.route('/', methods=['POST'])
 @login_required
@@ -54,6 +199,7 @@ def add_sheep():
 
 @bp.route('/<string:ear_num>', methods=['GET'])
 @login_required
+@conditional_on_data_version
 def get_sheep_details(ear_num):
     """取得單一羊隻的詳細資料 (包含事件)"""
     sheep = Sheep.query.filter_by(user_id=current_user.id, EarNum=ear_num).first()
@@ -146,8 +292,12 @@ def delete_sheep(ear_num):
 
 # --- SheepEvent (事件) API Endpoints ---
 
+# 由伺服器維護、不接受客戶端修改的事件欄位
+READ_ONLY_EVENT_FIELDS = ('id', 'user_id', 'sheep_id', 'fingerprint', 'sync_version', 'withdrawal_end_date')
+
 @bp.route('/<string:ear_num>/events', methods=['GET'])
 @login_required
+@conditional_on_data_version
 def get_sheep_events(ear_num):
     sheep = Sheep.query.filter_by(user_id=current_user.id, EarNum=ear_num).first_or_404()
     events = SheepEvent.query.filter_by(sheep_id=sheep.id).order_by(SheepEvent.event_date.desc(), SheepEvent.id.desc()).all()
@@ -191,7 +341,13 @@ def update_event(event_id):
         return jsonify(error="事件日期和類型為必填"), 400
         
     try:
-        allowed_keys = SheepEvent.__table__.columns.keys()
+        # 統一為 YYYY-MM-DD，寫入前計算的停藥期結束日才能使用相同的日期
+        data['event_date'] = parse_date_value(data['event_date']).isoformat()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    try:
+        allowed_keys = set(SheepEvent.__table__.columns.keys()) - set(READ_ONLY_EVENT_FIELDS)
         for key, value in data.items():
             if key in allowed_keys:
                 setattr(event, key, value)
@@ -222,11 +378,78 @@ def delete_event(event_id):
 
 @bp.route('/<string:ear_num>/history', methods=['GET'])
 @login_required
+@conditional_on_data_version
 def get_sheep_history(ear_num):
+    """
+    取得羊隻的歷史數據。
+    可用參數：from 與 to 限定日期範圍 (YYYY-MM-DD)、record_type 篩選類型 (可重複指定)；
+    bucket=day|week|month 返回每個分桶的平均、最小與最大值，
+    或 max_points 以 LTTB 演算法將每種類型降採樣至指定點數。
+    """
+    try:
+        start, end = (_parse_history_date(request.args.get(name)) for name in ('from', 'to'))
+        bucket = request.args.get('bucket')
+        if bucket is not None and bucket not in BUCKET_PERIODS:
+            raise ValueError(f"bucket 必須為 {' / '.join(BUCKET_PERIODS)}")
+        max_points = request.args.get('max_points')
+        if max_points is not None:
+            if not max_points.isdigit() or int(max_points) < 3:
+                raise ValueError("max_points 必須是大於等於 3 的整數")
+            max_points = int(max_points)
+        if bucket and max_points:
+            raise ValueError("bucket 與 max_points 不能同時使用")
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
     sheep = Sheep.query.filter_by(user_id=current_user.id, EarNum=ear_num).first_or_404()
-    history_data = SheepHistoricalData.query.filter_by(sheep_id=sheep.id).order_by(SheepHistoricalData.record_date.asc(), SheepHistoricalData.id.asc()).all()
+    query = SheepHistoricalData.query.filter_by(sheep_id=sheep.id, user_id=current_user.id)
+    record_types = request.args.getlist('record_type')
+    if record_types:
+        query = query.filter(SheepHistoricalData.record_type.in_(record_types))
+    if start:
+        query = query.filter(SheepHistoricalData.record_date >= start)
+    if end:
+        query = query.filter(SheepHistoricalData.record_date <= end)
+    query = query.order_by(SheepHistoricalData.record_date.asc(), SheepHistoricalData.id.asc())
+
+    if bucket:
+        rows = query.with_entities(SheepHistoricalData.record_type, SheepHistoricalData.record_date, SheepHistoricalData.value).all()
+        return jsonify(bucket_history(rows, bucket))
+
+    history_data = query.all()
+    if max_points:
+        history_data = _downsample_history(history_data, max_points)
     return jsonify([h.to_dict() for h in history_data])
 
+
+def _parse_history_date(value):
+    """驗證 YYYY-MM-DD 日期參數"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError("日期格式必須為 YYYY-MM-DD")
+
+
+def _downsample_history(records, max_points):
+    """依記錄類型分別以 LTTB 降採樣，保留原本的日期排序；日期無法解析的記錄保留"""
+    by_type = {}
+    for record in records:
+        by_type.setdefault(record.record_type, []).append(record)
+
+    kept = []
+    for items in by_type.values():
+        dated = []
+        for record in items:
+            try:
+                dated.append((datetime.strptime(record.record_date, '%Y-%m-%d').timestamp(), record))
+            except (TypeError, ValueError):
+                kept.append(record)
+        indices = lttb_indices([x for x, _ in dated], [r.value for _, r in dated], max_points)
+        kept.extend(dated[i][1] for i in indices)
+    return sorted(kept, key=lambda r: (r.record_date, r.id))
+
 @bp.route('/history/<int:record_id>', methods=['DELETE'])
 @login_required
 def delete_sheep_history(record_id):
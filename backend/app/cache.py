@@ -0,0 +1,135 @@
+"""
+每用戶的查詢結果快取
+以 (名稱, 用戶, 數據版本) 為鍵保存計算結果。羊隻、事件或歷史數據的任何寫入
+(包含批次導入) 都會讓用戶的數據版本加一，舊的項目不再被讀取，並依 TTL 或容量淘汰。
+預設保存在程序記憶體中；多個 gunicorn worker 可改用同一台主機上的檔案存放區共用。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app
+from app.data_version import get_data_version
+
+_MISSING = object()
+
+
+class MemoryCacheStore:
+    """程序內的 LRU 快取，項目逾時或超過容量時淘汰"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCacheStore:
+    """以 JSON 檔保存於本地目錄的快取，供同一主機上的多個 worker 共用"""
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        if entry['key'] != key or entry['expires'] < time.time():
+            return _MISSING
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        temp_path = os.path.join(self.path, f".{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'expires': time.time() + ttl, 'value': value}, f, ensure_ascii=False)
+        os.replace(temp_path, self._file(key))
+        self._prune()
+
+    def _prune(self):
+        """超過容量時刪除逾時或最舊的項目"""
+        names = [name for name in os.listdir(self.path) if name.endswith('.json')]
+        if len(names) <= self.max_entries:
+            return
+        files = []
+        for name in names:
+            path = os.path.join(self.path, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        for _, path in sorted(files)[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+
+def get_cache_store(app=None):
+    """依設定建立並返回應用程式的快取存放區 (RESULT_CACHE_BACKEND 為 memory 或 filesystem)"""
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('result_cache')
+    if store is None:
+        max_entries = app.config.get('RESULT_CACHE_MAX_ENTRIES', 1024)
+        if app.config.get('RESULT_CACHE_BACKEND') == 'filesystem':
+            path = app.config.get('RESULT_CACHE_DIR') or os.path.join(app.instance_path, 'result_cache')
+            store = FileCacheStore(path, max_entries)
+        else:
+            store = MemoryCacheStore(max_entries)
+        app.extensions['result_cache'] = store
+    return store
+
+
+def cached_for_user(name, user_id, compute, extra_key=None, ttl=None):
+    """
+    返回用戶目前數據版本下的快取結果；未命中時呼叫 compute() 計算並保存。
+    extra_key 用於結果還依賴其他條件 (例如當日日期) 的情況。結果必須可序列化為 JSON。
+    """
+    key = f"{name}:{user_id}:{get_data_version(user_id)}"
+    if extra_key is not None:
+        key = f"{key}:{extra_key}"
+    store = get_cache_store()
+    value = store.get(key)
+    if value is _MISSING:
+        value = compute()
+        store.set(key, value, ttl or current_app.config.get('RESULT_CACHE_TTL', 300))
+    return value
@@ -0,0 +1,89 @@
+"""
+用戶數據版本
+每個用戶有一個遞增的 data_version，羊隻、事件或歷史數據有任何變更時加一。
+讀取端點以此版本產生 ETag，資料未變更時直接回應 304。
+每筆變更的記錄同時標記當時的版本 (sync_version)，刪除時寫入墓碑，供增量同步查詢。
+"""
+
+from functools import wraps
+from flask import make_response, request
+from flask_login import current_user
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models import User, Sheep, SheepEvent, SheepHistoricalData, SyncTombstone
+
+# 變更時需要更新版本的模型
+VERSIONED_MODELS = (Sheep, SheepEvent, SheepHistoricalData)
+# 墓碑中的記錄類型名稱
+TOMBSTONE_ENTITIES = {Sheep: 'sheep', SheepEvent: 'event', SheepHistoricalData: 'history'}
+
+
+def bump_data_version(user_ids, connection=None):
+    """將指定用戶的數據版本加一 (批次 SQL 寫入不會觸發 ORM 事件，需自行呼叫)"""
+    if isinstance(user_ids, int): user_ids = [user_ids]
+    user_ids = sorted(set(user_ids))
+    if not user_ids: return
+    stmt = update(User.__table__).where(User.__table__.c.id.in_(user_ids)).values(data_version=User.__table__.c.data_version + 1)
+    (connection or db.session.connection()).execute(stmt)
+
+
+def next_data_version(user_id, connection=None):
+    """將用戶的數據版本加一並返回新版本 (在同一交易中讀取，並行寫入時依提交順序遞增)"""
+    connection = connection or db.session.connection()
+    bump_data_version(user_id, connection)
+    return connection.scalar(select(User.__table__.c.data_version).where(User.__table__.c.id == user_id))
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_on_flush(session, flush_context, instances):
+    """
+    ORM 新增、修改或刪除羊隻相關資料時，更新所屬用戶的數據版本，
+    並將新版本標記在變更的記錄上；刪除的記錄改寫入墓碑。
+    """
+    changed, deleted = {}, {}
+    for obj in session.new:
+        if isinstance(obj, VERSIONED_MODELS): changed.setdefault(obj.user_id, []).append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, VERSIONED_MODELS) and session.is_modified(obj, include_collections=False):
+            changed.setdefault(obj.user_id, []).append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, VERSIONED_MODELS): deleted.setdefault(obj.user_id, []).append(obj)
+    changed.pop(None, None)
+    deleted.pop(None, None)
+
+    connection = session.connection()
+    for user_id in sorted(set(changed) | set(deleted)):
+        version = next_data_version(user_id, connection)
+        for obj in changed.get(user_id, []):
+            obj.sync_version = version
+        for obj in deleted.get(user_id, []):
+            session.add(SyncTombstone(
+                user_id=user_id, entity=TOMBSTONE_ENTITIES[type(obj)], entity_id=obj.id,
+                ear_num=obj.EarNum if isinstance(obj, Sheep) else None, sync_version=version
+            ))
+
+
+def get_data_version(user_id):
+    """以單一查詢讀取用戶目前的數據版本"""
+    return db.session.scalar(select(User.data_version).where(User.id == user_id)) or 0
+
+
+def conditional_on_data_version(view):
+    """
+    依目前用戶的數據版本產生強 ETag；If-None-Match 相符時直接回應 304，
+    不載入資料也不進行 JSON 編碼。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f"u{current_user.id}-v{get_data_version(current_user.id)}"
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,208 @@
+"""
+數據匯出工具
+以伺服器端游標分頁讀取資料，並以串流方式寫出檔案，記憶體用量不隨資料量增長
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, datetime
+import pandas as pd
+from flask import Response
+from openpyxl import Workbook
+from sqlalchemy import select
+from app import db
+from app.models import Sheep, SheepEvent, SheepHistoricalData, ChatHistory
+
+# 每次從資料庫游標取出的列數
+EXPORT_BATCH_SIZE = 1000
+
+EMPTY_EXPORT_SHEET = 'Empty_Export'
+EMPTY_EXPORT_MESSAGE = '目前沒有數據可匯出'
+
+# 伺服器內部維護的欄位 (同步版本、導入指紋、停藥期結束日)，不列入匯出
+INTERNAL_EXPORT_COLUMNS = ('data_version', 'sync_version', 'fingerprint', 'withdrawal_end_date')
+
+
+def _export_columns(model, exclude=()):
+    return [c for c in model.__table__.columns if c.name not in INTERNAL_EXPORT_COLUMNS and c.name not in exclude]
+
+
+def export_statements(user_id):
+    """
+    返回 [(工作表名稱, select 語句)]。
+    事件與歷史數據直接在 SQL 中 JOIN 羊隻以取得耳號，並將耳號放在第一欄。
+    """
+    event_columns = _export_columns(SheepEvent, exclude=('sheep_id',))
+    history_columns = _export_columns(SheepHistoricalData, exclude=('sheep_id',))
+    return [
+        ('Sheep_Basic_Info',
+         select(*_export_columns(Sheep))
+         .where(Sheep.user_id == user_id)
+         .order_by(Sheep.EarNum)),
+        ('Sheep_Events_Log',
+         select(Sheep.EarNum, *event_columns)
+         .join(Sheep, Sheep.id == SheepEvent.sheep_id)
+         .where(Sheep.user_id == user_id)
+         .order_by(Sheep.EarNum, SheepEvent.event_date.desc())),
+        ('Sheep_Historical_Data',
+         select(Sheep.EarNum, *history_columns)
+         .join(Sheep, Sheep.id == SheepHistoricalData.sheep_id)
+         .where(Sheep.user_id == user_id)
+         .order_by(Sheep.EarNum, SheepHistoricalData.record_date)),
+        ('Chat_History',
+         select(*ChatHistory.__table__.columns)
+         .where(ChatHistory.user_id == user_id)
+         .order_by(ChatHistory.timestamp)),
+    ]
+
+
+def read_export_frames(user_id):
+    """每個工作表只執行一次查詢，讀入 DataFrame；返回 [(工作表名稱, DataFrame)]"""
+    connection = db.session.connection()
+    return [(sheet_name, pd.read_sql(stmt, connection)) for sheet_name, stmt in export_statements(user_id)]
+
+
+def iter_result_batches(stmt, batch_size=EXPORT_BATCH_SIZE):
+    """
+    以伺服器端游標 (PostgreSQL) 或 fetchmany (SQLite) 分批讀取查詢結果。
+    產生 (欄位名稱, 該批資料列) 。
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    columns = list(result.keys())
+    for partition in result.partitions():
+        yield columns, partition
+
+
+def write_streaming_xlsx(user_id, path, batch_size=EXPORT_BATCH_SIZE):
+    """以 openpyxl 唯寫模式將用戶所有數據逐列寫入 xlsx 檔案"""
+    workbook = Workbook(write_only=True)
+    has_data = False
+
+    for sheet_name, stmt in export_statements(user_id):
+        sheet = None
+        for columns, rows in iter_result_batches(stmt, batch_size):
+            if sheet is None:
+                # 僅在有資料時建立工作表，與一般匯出模式一致
+                sheet = workbook.create_sheet(sheet_name)
+                sheet.append(columns)
+                has_data = True
+            for row in rows:
+                sheet.append(list(row))
+
+    if not has_data:
+        sheet = workbook.create_sheet(EMPTY_EXPORT_SHEET)
+        sheet.append(['說明'])
+        sheet.append([EMPTY_EXPORT_MESSAGE])
+
+    workbook.save(path)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """不可回溯的寫入緩衝區，讓 zipfile 可以邊寫邊輸出"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_csv_zip(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """逐列產生包含每個資料表 CSV 檔的 zip 串流"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet_name, stmt in export_statements(user_id):
+            with archive.open(f'{sheet_name}.csv', mode='w', force_zip64=True) as entry:
+                header_written = False
+                for columns, rows in iter_result_batches(stmt, batch_size):
+                    text = io.StringIO()
+                    writer = csv.writer(text)
+                    if not header_written:
+                        writer.writerow(columns)
+                        header_written = True
+                    writer.writerows(rows)
+                    entry.write(text.getvalue().encode('utf-8'))
+                    yield buffer.drain()
+                if not header_written:
+                    # 沒有資料時仍輸出欄位名稱，讓下游有一致的檔案結構
+                    text = io.StringIO()
+                    csv.writer(text).writerow([c.name for c in stmt.selected_columns])
+                    entry.write(text.getvalue().encode('utf-8'))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'無法序列化的型別: {type(value).__name__}')
+
+
+def iter_ndjson(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """逐列產生 NDJSON，每列以 table 欄位標示來源資料表"""
+    for sheet_name, stmt in export_statements(user_id):
+        for columns, rows in iter_result_batches(stmt, batch_size):
+            lines = [
+                json.dumps({'table': sheet_name, **dict(zip(columns, row))}, ensure_ascii=False, default=_json_default)
+                for row in rows
+            ]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def write_parquet_zip(user_id, path):
+    """將每個資料表以 Parquet (欄式儲存) 寫出，並打包為 zip 檔"""
+    with zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for sheet_name, df in read_export_frames(user_id):
+            data = io.BytesIO()
+            df.to_parquet(data, index=False)
+            archive.writestr(f'{sheet_name}.parquet', data.getvalue())
+
+
+def create_export_tempfile(suffix):
+    """建立匯出用的暫存檔案並返回路徑 (由呼叫端負責刪除)"""
+    fd, path = tempfile.mkstemp(prefix='goat_export_', suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def iter_file_and_remove(path, chunk_size=64 * 1024):
+    """逐塊讀出檔案內容，讀取結束或連線中斷後刪除檔案"""
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        remove_file(path)
+
+
+def file_download_response(path, filename, mimetype):
+    """以分塊串流方式回傳暫存檔，傳送完畢後自動刪除"""
+    return Response(
+        iter_file_and_remove(path),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Content-Length': str(os.path.getsize(path))
+        }
+    )
+
+
+def remove_file(path):
+    """刪除暫存檔案，忽略已不存在的情況"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
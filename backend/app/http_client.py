@@ -0,0 +1,77 @@
+"""
+對外 HTTP 連線池
+每個 worker 程序共用一個 requests.Session，保持連線 (keep-alive)，
+避免每次呼叫 Gemini API 都重新進行 DNS 查詢、TCP 與 TLS 連線建立。
+429 與 5xx 回應以帶隨機抖動的指數退避重試，連線與讀取分別設定逾時。
+"""
+
+import threading
+import requests
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 未在應用程式中設定時的預設值
+DEFAULT_HTTP_CONFIG = {
+    'HTTP_POOL_SIZE': 10,
+    'HTTP_MAX_RETRIES': 3,
+    'HTTP_BACKOFF_FACTOR': 0.5,
+    'HTTP_BACKOFF_JITTER': 0.5,
+    'HTTP_CONNECT_TIMEOUT': 10,
+    'HTTP_READ_TIMEOUT': 170,
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_default_session = None
+_lock = threading.Lock()
+
+
+def _setting(config, key):
+    value = config.get(key)
+    return DEFAULT_HTTP_CONFIG[key] if value is None else value
+
+
+def create_http_session(config=None):
+    """依設定建立帶連線池與重試的 Session"""
+    config = config or {}
+    retry = Retry(
+        total=_setting(config, 'HTTP_MAX_RETRIES'),
+        connect=_setting(config, 'HTTP_MAX_RETRIES'),
+        read=0,  # 讀取逾時表示模型仍在生成，重試只會加倍等待
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # generateContent 不改變伺服器狀態，POST 也可重試
+        backoff_factor=_setting(config, 'HTTP_BACKOFF_FACTOR'),
+        backoff_jitter=_setting(config, 'HTTP_BACKOFF_JITTER'),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # 重試用盡時返回最後的回應，由呼叫端的 raise_for_status 處理
+    )
+    pool_size = _setting(config, 'HTTP_POOL_SIZE')
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session(app=None):
+    """返回應用程式共用的 Session；不在應用程式上下文中時使用預設設定的 Session"""
+    global _default_session
+    if app is None and has_app_context():
+        app = current_app._get_current_object()
+    with _lock:
+        if app is None:
+            if _default_session is None:
+                _default_session = create_http_session()
+            return _default_session
+        session = app.extensions.get('http_session')
+        if session is None:
+            session = app.extensions['http_session'] = create_http_session(app.config)
+        return session
+
+
+def get_timeout(app=None):
+    """返回 (連線逾時, 讀取逾時) 秒數"""
+    if app is None and has_app_context():
+        app = current_app._get_current_object()
+    config = app.config if app is not None else {}
+    return (_setting(config, 'HTTP_CONNECT_TIMEOUT'), _setting(config, 'HTTP_READ_TIMEOUT'))
@@ -0,0 +1,622 @@
+"""
+Excel 數據導入引擎
+以分塊方式串流讀取工作表，並以批次 SQL 語句寫入資料庫
+"""
+
+import hashlib
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+from app import db
+from app.models import ISODate, Sheep, SheepEvent, SheepHistoricalData, parse_date_value
+from app.data_version import next_data_version
+from app.rollups import add_to_rollups
+
+# 每個分塊讀取與提交的列數
+IMPORT_CHUNK_SIZE = 1000
+
+# 分析工作表時返回的預覽列數
+ANALYZE_PREVIEW_ROWS = 3
+
+# 內建的標準範本映射設定
+DEFAULT_IMPORT_CONFIG = {
+    "sheets": {
+        "0009-0013A1_Basic": {"purpose": "basic_info", "columns": {"EarNum": "EarNum", "Breed": "Breed", "Sex": "Sex", "BirthDate": "BirthDate", "Sire": "Sire", "Dam": "Dam", "BirWei": "BirWei", "SireBre": "SireBre", "DamBre": "DamBre", "MoveCau": "MoveCau", "MoveDate": "MoveDate", "Class": "Class", "LittleSize": "LittleSize", "Lactation": "Lactation", "ManaClas": "ManaClas", "FarmNum": "FarmNum", "RUni": "RUni"}},
+        "0009-0013A4_Kidding": {"purpose": "kidding_record", "columns": {"EarNum": "EarNum", "YeanDate": "YeanDate", "KidNum": "KidNum", "KidSex": "KidSex"}},
+        "0009-0013A2_PubMat": {"purpose": "mating_record", "columns": {"EarNum": "EarNum", "Mat_date": "Mat_date", "Mat_grouM_Sire": "Mat_grouM_Sire"}},
+        "0009-0013A3_Yean": {"purpose": "yean_record", "columns": {"EarNum": "EarNum", "YeanDate": "YeanDate", "DryOffDate": "DryOffDate", "Lactation": "Lactation"}},
+        "0009-0013A9_Milk": {"purpose": "milk_yield_record", "columns": {"EarNum": "EarNum", "MeaDate": "MeaDate", "Milk": "Milk"}},
+        "0009-0013A11_MilkAnalysis": {"purpose": "milk_analysis_record", "columns": {"EarNum": "EarNum", "MeaDate": "MeaDate", "AMFat": "AMFat"}},
+        "S2_Breed": {"purpose": "breed_mapping", "columns": {"Code": "Symbol", "Name": "Breed"}},
+        "S7_Sex": {"purpose": "sex_mapping", "columns": {"Code": "Num", "Name": "Sex"}},
+    }
+}
+
+MAPPING_PURPOSES = ('breed_mapping', 'sex_mapping')
+NON_RECORD_PURPOSES = ('ignore', 'basic_info') + MAPPING_PURPOSES
+
+# 不允許由匯入映射覆寫的欄位
+PROTECTED_SHEEP_FIELDS = ('id', 'user_id')
+
+
+def format_date(d):
+    """將 Excel 中的日期值統一格式化為 YYYY-MM-DD，無效或代表空值的日期返回 None"""
+    if pd.isna(d) or d is None: return None
+    try:
+        # 處理 '1900-01-01' 或 '1900/1/1' 這類代表空值的日期
+        if '1900' in str(d): return None
+        dt = pd.to_datetime(d)
+        # 處理 excel 日期原點問題
+        if dt.year < 1901: return None
+        return dt.strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return None
+
+
+# pandas 讀取檔案時預設視為空值的字串
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+
+def _cell_value(cell):
+    """儲存格的原始值；錯誤值與空字串返回 None，整數值的浮點數轉為整數 (不顯示小數點)"""
+    from openpyxl.cell.cell import TYPE_ERROR
+
+    value = cell.value
+    if value == '' or cell.data_type == TYPE_ERROR:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def format_cell(cell):
+    """將 openpyxl 儲存格轉為字串 (與 pd.read_excel(dtype=str) 相同)；空白、錯誤值與空值字串返回 None"""
+    value = _cell_value(cell)
+    if value is None:
+        return None
+    text = str(value)
+    return None if text in NA_STRINGS else text
+
+
+def _header_names(header, width):
+    """
+    標題列轉為欄位名稱，規則與 pandas 讀取檔案時相同：空白的欄位命名為 Unnamed: i，
+    重複的名稱依序加上 .1、.2 (略過已存在的名稱，有名稱的欄位優先編號)。
+    """
+    raw = [header[index] if index < len(header) else None for index in range(width)]
+    names = [f"Unnamed: {index}" if name is None else name for index, name in enumerate(raw)]
+    unnamed = [index for index, name in enumerate(raw) if name is None]
+    counts = {}
+    for index in [i for i in range(width) if raw[i] is not None] + unnamed:
+        name = original = names[index]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[index] = name
+        counts[name] = count + 1
+    return names
+
+
+def _rows_to_frame(header, rows):
+    """將標題列與已轉換的列資料組成 DataFrame (欄位皆為字串，空值為 None)"""
+    width = max([len(header)] + [len(r) for r in rows])
+    if not width:
+        return pd.DataFrame()
+    data = [list(r) + [None] * (width - len(r)) for r in rows]
+    return pd.DataFrame(data, columns=_header_names(header, width), dtype=str)
+
+
+class ExcelWorkbookSource:
+    """包裝 pd.ExcelFile，提供逐塊讀取工作表的介面"""
+
+    def __init__(self, xls):
+        self.xls = xls
+
+    @property
+    def sheet_names(self):
+        return self.xls.sheet_names
+
+    def iter_chunks(self, sheet_name, chunk_size=IMPORT_CHUNK_SIZE):
+        """逐塊產生工作表內容 (DataFrame，欄位皆為字串，空值為 None)"""
+        if getattr(self.xls, 'engine', None) != 'openpyxl':
+            # 非 xlsx 檔案 (如 .xls) 無法串流讀取，整張讀入後再分塊
+            df = pd.read_excel(self.xls, sheet_name=sheet_name, dtype=str)
+            df = df.where(pd.notna(df), None)
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+            return
+
+        header, rows = None, []
+        for converted in self._iter_sheet_rows(sheet_name):
+            if header is None:
+                header = converted
+                continue
+            rows.append(converted)
+            if len(rows) >= chunk_size:
+                yield _rows_to_frame(header, rows)
+                rows = []
+        if rows:
+            yield _rows_to_frame(header, rows)
+
+    def analyze(self, sheet_name, preview_rows=ANALYZE_PREVIEW_ROWS):
+        """
+        快速分析工作表：只讀取標題列與前幾列預覽，列數取自工作表的尺寸資訊。
+        返回與完整解析相同格式的 {"columns", "rows", "preview"}。
+        """
+        if getattr(self.xls, 'engine', None) != 'openpyxl':
+            df = pd.read_excel(self.xls, sheet_name=sheet_name, dtype=str)
+            df = df.where(pd.notna(df), None)
+            return {"columns": list(df.columns), "rows": len(df), "preview": df.head(preview_rows).to_dict(orient='records')}
+
+        # 須在 _iter_sheet_rows 重設尺寸前讀取
+        max_row = self.xls.book[sheet_name].max_row
+        header, rows, exhausted = None, [], True
+        for converted in self._iter_sheet_rows(sheet_name):
+            if header is None:
+                header = converted
+                continue
+            if len(rows) >= preview_rows:
+                exhausted = False
+                break
+            rows.append(converted)
+
+        if header is None:
+            return {"columns": [], "rows": 0, "preview": []}
+        df = _rows_to_frame(header, rows)
+        if exhausted:
+            row_count = len(rows)
+        elif max_row and max_row > len(rows):
+            row_count = max_row - 1
+        else:
+            # 檔案未記錄可信的尺寸資訊時，逐列計數 (仍為串流讀取)
+            row_count = sum(1 for _ in self._iter_sheet_rows(sheet_name)) - 1
+        return {"columns": list(df.columns), "rows": row_count, "preview": df.head(preview_rows).to_dict(orient='records')}
+
+    def _iter_sheet_rows(self, sheet_name):
+        """以唯讀模式逐列產生轉換後的儲存格值 (第一列為標題列)，並去除結尾空白列與每列結尾的空白儲存格"""
+        sheet = self.xls.book[sheet_name]
+        sheet.reset_dimensions()
+        is_header, blank_run = True, []
+        for row in sheet.rows:
+            # 去除結尾的空白儲存格 (錯誤值仍佔一欄)
+            cells = list(row)
+            while cells and cells[-1].value in (None, ''):
+                cells.pop()
+            # 標題列保留原始值作為欄位名稱
+            converted = [_cell_value(cell) if is_header else format_cell(cell) for cell in cells]
+            if not converted and not is_header:
+                # 暫存空白列，僅在後面仍有資料時才保留 (與 pandas 去除結尾空白列一致)
+                blank_run.append(converted)
+                continue
+            yield from blank_run
+            blank_run = []
+            is_header = False
+            yield converted
+
+
+def analyze_workbook(xls, preview_rows=ANALYZE_PREVIEW_ROWS):
+    """快速分析活頁簿中每個工作表的欄位、列數與預覽資料"""
+    source = ExcelWorkbookSource(xls)
+    return {sheet_name: source.analyze(sheet_name, preview_rows) for sheet_name in source.sheet_names}
+
+
+def _column(chunk, name):
+    """取得工作表欄位 (object 型別，空值為 None)；欄位不存在時返回全為 None 的欄位"""
+    if name is not None and name in chunk.columns:
+        column = chunk[name].astype(object)
+        return column.where(column.notna(), None)
+    return pd.Series([None] * len(chunk), index=chunk.index, dtype=object)
+
+
+def format_date_column(values):
+    """以欄為單位格式化日期，結果與逐值呼叫 format_date 相同；每個相異值只解析一次"""
+    values = pd.Series(values, dtype=object)
+    result = pd.Series([None] * len(values), index=values.index, dtype=object)
+    present = values.notna()
+    if not present.any():
+        return result
+
+    text = values[present].astype(str)
+    uniques = pd.Series(pd.unique(text), dtype=object)
+    # 處理 '1900-01-01' 或 '1900/1/1' 這類代表空值的日期
+    sentinel = uniques.str.contains('1900', regex=False)
+    try:
+        with warnings.catch_warnings():
+            # 混合時區的警告：此情況會改走逐值處理
+            warnings.simplefilter('ignore', FutureWarning)
+            parsed = pd.to_datetime(uniques.where(~sentinel), errors='coerce', format='mixed')
+    except (ValueError, TypeError):
+        parsed = None
+
+    if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed):
+        # 混合時區等無法向量化的情況，改為逐值處理
+        formatted = uniques.map(format_date)
+    else:
+        formatted = parsed.dt.strftime('%Y-%m-%d').astype(object)
+        # 處理 excel 日期原點問題
+        formatted = formatted.where(parsed.notna() & (parsed.dt.year >= 1901), None)
+        # 向量化解析失敗的少數值以逐值規則重試，確保與 format_date 一致
+        retry = formatted.isna() & ~sentinel
+        if retry.any():
+            formatted[retry] = uniques[retry].map(format_date)
+    formatted[sentinel] = None
+
+    result[present] = text.map(dict(zip(uniques, formatted)))
+    return result
+
+
+def map_code_column(values, mapping):
+    """將代碼欄位依映射表轉換，找不到對應的代碼保持原值"""
+    values = pd.Series(values, dtype=object)
+    if not mapping:
+        return values
+    keys = values.astype(str)
+    hit = values.notna() & keys.isin(mapping.keys())
+    result = values.copy()
+    result[hit] = keys[hit].map(mapping)
+    return result.where(result.notna(), None)
+
+
+def _try_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def float_column(values):
+    """
+    將數值欄位轉為浮點數，返回 (數值, 是否有效)。
+    與逐值呼叫 float() 的結果一致：空值及無法轉換的值標記為無效。
+    """
+    values = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(values, errors='coerce').astype(float)
+    valid = values.notna() & numbers.notna()
+    retry = values.notna() & numbers.isna()
+    if retry.any():
+        # to_numeric 無法處理但 float() 可接受的寫法 (如 '1_000'、'NAN')
+        converted = values[retry].map(_try_float)
+        ok = converted.notna()
+        numbers[converted[ok].index] = converted[ok].astype(float)
+        valid[converted[ok].index] = True
+    return numbers, valid
+
+
+def _read_mappings(source, sheets_to_process, chunk_size):
+    """讀取品種與性別代碼映射表"""
+    breed_map, sex_map = {}, {}
+    for sheet_name, sheet_config in sheets_to_process.items():
+        if sheet_name not in source.sheet_names: continue
+        purpose = sheet_config.get('purpose')
+        cols = sheet_config.get('columns', {})
+        if purpose not in MAPPING_PURPOSES or not (cols.get('Code') and cols.get('Name')): continue
+
+        target = breed_map if purpose == 'breed_mapping' else sex_map
+        for chunk in source.iter_chunks(sheet_name, chunk_size):
+            codes, names = _column(chunk, cols['Code']), _column(chunk, cols['Name'])
+            has_code = codes.notna() & (codes.astype(str) != '')
+            target.update(zip(codes[has_code].astype(str), names[has_code]))
+    return breed_map, sex_map
+
+
+# 逐列處理時用來標示「此欄為空，不覆寫既有值」
+_SKIP = object()
+
+
+def _transform_basic_chunk(chunk, cols, breed_map, sex_map):
+    """以欄為單位轉換基礎資料欄位 (品種/性別代碼映射、日期格式化)"""
+    sheep_columns = set(Sheep.__table__.columns.keys()) - set(PROTECTED_SHEEP_FIELDS)
+    transformed = {}
+    for db_field, xls_col in cols.items():
+        if db_field not in sheep_columns or xls_col not in chunk.columns: continue
+        raw = _column(chunk, xls_col)
+        if db_field == 'Breed': column = map_code_column(raw, breed_map)
+        elif db_field == 'Sex': column = map_code_column(raw, sex_map)
+        elif isinstance(Sheep.__table__.c[db_field].type, ISODate): column = format_date_column(raw)
+        else: column = raw
+        transformed[db_field] = column.where(raw.notna(), _SKIP)
+    return pd.DataFrame(transformed, index=chunk.index)
+
+
+def _import_basic_chunk(chunk, cols, user_id, breed_map, sex_map, sync_version=0):
+    """以單次 IN 查詢比對既有羊隻，並以批次 INSERT/UPDATE 寫入基礎資料 (標記為 sync_version)"""
+    ear_column = _column(chunk, cols['EarNum'])
+    ear_nums = set(ear_column.dropna()) - {''}
+    existing = dict(
+        db.session.query(Sheep.EarNum, Sheep.id)
+        .filter(Sheep.user_id == user_id, Sheep.EarNum.in_(ear_nums))
+        .all()
+    ) if ear_nums else {}
+
+    transformed = _transform_basic_chunk(chunk, cols, breed_map, sex_map)
+    to_create, to_update = {}, {}
+    created, updated = 0, 0
+    for ear_num, fields in zip(ear_column, transformed.to_dict(orient='records') if len(transformed.columns) else [{}] * len(chunk)):
+        if not ear_num: continue
+
+        if ear_num in existing:
+            values = to_update.setdefault(ear_num, {'id': existing[ear_num]})
+            updated += 1
+        elif ear_num in to_create:
+            values = to_create[ear_num]
+            updated += 1
+        else:
+            values = to_create[ear_num] = {'user_id': user_id, 'EarNum': ear_num}
+            created += 1
+
+        values.update((field, value) for field, value in fields.items() if value is not _SKIP)
+
+    stamp = {'last_updated': datetime.utcnow(), 'sync_version': sync_version}
+    if to_create:
+        db.session.execute(insert(Sheep), [dict(v, **stamp) for v in to_create.values()])
+    if to_update:
+        db.session.execute(update(Sheep), [dict(v, **stamp) for v in to_update.values()])
+    return created, updated
+
+
+# 各類事件工作表：(事件類型, 日期欄位, 說明欄位, 說明前綴, 說明後綴)
+EVENT_PURPOSES = {
+    'kidding_record': ('產仔', 'YeanDate', 'KidNum', "產下仔羊: ", ""),
+    'mating_record': ('配種', 'Mat_date', 'Mat_grouM_Sire', "配種公羊: ", ""),
+}
+
+# 各類歷史數據工作表：(記錄類型, 數值欄位)，日期欄位皆為 MeaDate
+HISTORY_PURPOSES = {
+    'weight_record': ('Body_Weight_kg', 'Weight'),
+    'milk_yield_record': ('milk_yield_kg_day', 'Milk'),
+    'milk_analysis_record': ('milk_fat_percentage', 'AMFat'),
+}
+
+
+def _text_column(prefix, values, suffix=''):
+    """與 f-string 相同的字串組合 (空值顯示為 None)"""
+    return prefix + values.map(str) + suffix
+
+
+def _build_record_rows(chunk, purpose, cols, user_id, sheep_ids):
+    """以欄為單位將事件/歷史數據工作表轉換為可直接批次寫入的事件與歷史數據"""
+    sheep_id = _column(chunk, cols.get('EarNum')).map(sheep_ids)
+    has_sheep = sheep_id.notna()
+
+    def records(frame, mask):
+        frame = frame[mask]
+        if frame.empty:
+            return []
+        frame = frame.assign(user_id=user_id, sheep_id=frame['sheep_id'].astype('int64'))
+        return frame.to_dict(orient='records')
+
+    if purpose == 'yean_record':
+        yean_date = format_date_column(_column(chunk, cols.get('YeanDate')))
+        dry_off_date = format_date_column(_column(chunk, cols.get('DryOffDate')))
+        lactation = _column(chunk, cols.get('Lactation'))
+        position = np.arange(len(chunk))
+        starts = pd.DataFrame({
+            'sheep_id': sheep_id, 'event_date': yean_date, 'event_type': '泌乳開始',
+            'description': _text_column('第 ', lactation, ' 胎次'), '_pos': position, '_order': 0
+        })[has_sheep & yean_date.notna()]
+        ends = pd.DataFrame({
+            'sheep_id': sheep_id, 'event_date': dry_off_date, 'event_type': '乾乳',
+            'description': _text_column('第 ', lactation, ' 胎次結束'), '_pos': position, '_order': 1
+        })[has_sheep & dry_off_date.notna()]
+        # 保持與逐列處理相同的寫入順序：每列先泌乳開始、後乾乳
+        events = pd.concat([starts, ends]).sort_values(['_pos', '_order'], kind='stable').drop(columns=['_pos', '_order'])
+        return records(events, pd.Series(True, index=events.index)), []
+
+    if purpose in EVENT_PURPOSES:
+        event_type, date_col, desc_col, desc_prefix, desc_suffix = EVENT_PURPOSES[purpose]
+        event_date = format_date_column(_column(chunk, cols.get(date_col)))
+        if cols.get(desc_col) in chunk.columns:
+            description = _text_column(desc_prefix, _column(chunk, cols.get(desc_col)), desc_suffix)
+        else:
+            description = pd.Series([None] * len(chunk), index=chunk.index, dtype=object)
+        events = pd.DataFrame({'sheep_id': sheep_id, 'event_date': event_date, 'event_type': event_type, 'description': description})
+        return records(events, has_sheep & event_date.notna()), []
+
+    if purpose in HISTORY_PURPOSES:
+        record_type, value_col = HISTORY_PURPOSES[purpose]
+        record_date = format_date_column(_column(chunk, cols.get('MeaDate')))
+        value, valid = float_column(_column(chunk, cols.get(value_col)))
+        histories = pd.DataFrame({'sheep_id': sheep_id, 'record_date': record_date, 'record_type': record_type, 'value': value})
+        return [], records(histories, has_sheep & record_date.notna() & valid)
+
+    return [], []
+
+
+def record_fingerprint(sheep_id, record_date, record_type, detail):
+    """以 (羊隻, 日期, 類型, 數值/說明) 計算事件或歷史數據的指紋，用於去除重複導入"""
+    if detail is None: detail = ''
+    elif isinstance(detail, float): detail = repr(detail)
+    key = '\x1f'.join([str(sheep_id), record_date or '', record_type or '', str(detail)])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+# 各模型計算指紋的欄位：(日期, 類型, 數值/說明)
+FINGERPRINT_FIELDS = {
+    SheepEvent: ('event_date', 'event_type', 'description'),
+    SheepHistoricalData: ('record_date', 'record_type', 'value'),
+}
+
+
+def _fingerprint_of(obj):
+    date_field, type_field, detail_field = FINGERPRINT_FIELDS[type(obj)]
+    try:
+        record_date = parse_date_value(getattr(obj, date_field))
+    except (TypeError, ValueError):
+        record_date = None
+    detail = getattr(obj, detail_field)
+    if isinstance(obj, SheepHistoricalData) and detail is not None:
+        detail = float(detail)
+    return record_fingerprint(obj.sheep_id, record_date.isoformat() if record_date else None, getattr(obj, type_field), detail)
+
+
+@event.listens_for(Session, 'before_flush')
+def _refresh_fingerprints(session, flush_context, instances):
+    """
+    修改已有指紋的事件或歷史數據時重新計算指紋，使重複導入的判斷依據修改後的內容；
+    新指紋已屬於其他記錄時清除指紋 (與既有記錄重複時只有最早的一筆保留指紋)。
+    """
+    claimed = set()
+    for obj in session.dirty:
+        fields = FINGERPRINT_FIELDS.get(type(obj))
+        if not fields or obj.fingerprint is None:
+            continue
+        if not any(attributes.get_history(obj, field).has_changes() for field in ('sheep_id',) + fields):
+            continue
+        model = type(obj)
+        fingerprint = _fingerprint_of(obj)
+        if fingerprint == obj.fingerprint:
+            continue
+        with session.no_autoflush:
+            taken = fingerprint in claimed or session.query(model.id).filter(
+                model.fingerprint == fingerprint, model.id != obj.id
+            ).first() is not None
+        obj.fingerprint = None if taken else fingerprint
+        claimed.add(fingerprint)
+
+
+def _insert_skipping_duplicates(model):
+    """
+    指紋唯一索引衝突時略過該列的 INSERT 語句 (防止並行導入時重複寫入)，
+    並返回實際寫入的指紋。
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=['fingerprint']).returning(model.fingerprint)
+    if dialect == 'sqlite':
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=['fingerprint']).returning(model.fingerprint)
+    return insert(model)
+
+
+def _insert_new_rows(model, rows, date_field, type_field, detail_field):
+    """
+    計算每列指紋，以單次 IN 查詢排除已存在的記錄後批次寫入。
+    返回 (實際寫入的列, 略過筆數)。
+    """
+    unique = {}
+    for row in rows:
+        row['fingerprint'] = record_fingerprint(row['sheep_id'], row[date_field], row[type_field], row[detail_field])
+        unique.setdefault(row['fingerprint'], row)
+    existing = {
+        fingerprint for (fingerprint,) in
+        db.session.query(model.fingerprint).filter(model.fingerprint.in_(unique.keys()))
+    } if unique else set()
+
+    new_rows = [row for fingerprint, row in unique.items() if fingerprint not in existing]
+    if new_rows:
+        stmt = _insert_skipping_duplicates(model)
+        result = db.session.execute(stmt, new_rows)
+        if isinstance(stmt, (postgresql.Insert, sqlite.Insert)):
+            inserted = set(result.scalars())
+            new_rows = [row for row in new_rows if row['fingerprint'] in inserted]
+    return new_rows, len(rows) - len(new_rows)
+
+
+def _import_record_chunk(chunk, purpose, cols, user_id, dedupe=False, sync_version=0):
+    """
+    以單次 IN 查詢解析耳號，並批次寫入事件與歷史數據 (標記為 sync_version)。
+    dedupe 時略過已導入過的相同記錄。返回 (寫入筆數, 略過筆數)。
+    """
+    ear_nums = set(_column(chunk, cols.get('EarNum')).dropna()) - {''}
+    sheep_ids = dict(
+        db.session.query(Sheep.EarNum, Sheep.id)
+        .filter(Sheep.user_id == user_id, Sheep.EarNum.in_(ear_nums))
+        .all()
+    ) if ear_nums else {}
+
+    events, histories = _build_record_rows(chunk, purpose, cols, user_id, sheep_ids)
+    for row in events + histories:
+        row['sync_version'] = sync_version
+    if dedupe:
+        events, event_skipped = _insert_new_rows(SheepEvent, events, 'event_date', 'event_type', 'description')
+        histories, history_skipped = _insert_new_rows(SheepHistoricalData, histories, 'record_date', 'record_type', 'value')
+        skipped = event_skipped + history_skipped
+    else:
+        if events:
+            db.session.execute(insert(SheepEvent), events)
+        if histories:
+            db.session.execute(insert(SheepHistoricalData), histories)
+        skipped = 0
+
+    add_to_rollups(SheepEvent, events)
+    add_to_rollups(SheepHistoricalData, histories)
+    return len(events) + len(histories), skipped
+
+
+def _iter_pending_chunks(source, sheet_name, chunk_size, rows_done):
+    """逐塊讀取工作表，並略過先前已提交的列 (用於中斷後續跑)"""
+    offset = 0
+    for chunk in source.iter_chunks(sheet_name, chunk_size):
+        start, offset = offset, offset + len(chunk)
+        if offset <= rows_done: continue
+        yield chunk.iloc[max(rows_done - start, 0):], offset
+
+
+def run_import(source, config, user_id, chunk_size=IMPORT_CHUNK_SIZE, progress_callback=None, resume_from=None):
+    """
+    執行數據導入，每個分塊各自提交。
+    progress_callback(sheet_name, rows_done) 會在每個分塊提交前、於同一交易中呼叫；
+    resume_from 為 {工作表名稱: 已提交列數}，用於從中斷處續跑。
+    config 中 dedupe 為 true 時，事件與歷史數據以指紋略過先前已導入的記錄。
+    返回每個工作表的處理報告 (含分塊明細)。
+    """
+    report_details = []
+    sheets_to_process = config.get('sheets', {})
+    dedupe = bool(config.get('dedupe'))
+    resume_from = resume_from or {}
+
+    # --- 第一階段：讀取映射表並建立羊隻基礎資料 ---
+    breed_map, sex_map = _read_mappings(source, sheets_to_process, chunk_size)
+
+    for sheet_name, sheet_config in sheets_to_process.items():
+        if sheet_name not in source.sheet_names or sheet_config.get('purpose') != 'basic_info': continue
+
+        cols = sheet_config.get('columns', {})
+        if 'EarNum' not in cols: continue
+
+        created, updated, chunks = 0, 0, []
+        pending = _iter_pending_chunks(source, sheet_name, chunk_size, resume_from.get(sheet_name, 0))
+        for index, (chunk, rows_done) in enumerate(pending, start=1):
+            version = next_data_version(user_id)
+            chunk_created, chunk_updated = _import_basic_chunk(chunk, cols, user_id, breed_map, sex_map, version)
+            if progress_callback: progress_callback(sheet_name, rows_done)
+            db.session.commit()
+            created += chunk_created
+            updated += chunk_updated
+            chunks.append({"chunk": index, "rows": len(chunk), "created": chunk_created, "updated": chunk_updated})
+
+        report_details.append({"sheet": sheet_name, "message": f"處理完成。新增 {created} 筆，更新 {updated} 筆基礎資料。", "chunks": chunks})
+
+    # --- 第二階段：處理事件和歷史數據 ---
+    for sheet_name, sheet_config in sheets_to_process.items():
+        purpose = sheet_config.get('purpose')
+        if sheet_name not in source.sheet_names or purpose in NON_RECORD_PURPOSES: continue
+
+        cols = sheet_config.get('columns', {})
+        count, skipped, chunks = 0, 0, []
+        pending = _iter_pending_chunks(source, sheet_name, chunk_size, resume_from.get(sheet_name, 0))
+        for index, (chunk, rows_done) in enumerate(pending, start=1):
+            version = next_data_version(user_id)
+            imported, chunk_skipped = _import_record_chunk(chunk, purpose, cols, user_id, dedupe, version)
+            if progress_callback: progress_callback(sheet_name, rows_done)
+            db.session.commit()
+            count += imported
+            skipped += chunk_skipped
+            chunk_report = {"chunk": index, "rows": len(chunk), "imported": imported}
+            if dedupe: chunk_report["skipped"] = chunk_skipped
+            chunks.append(chunk_report)
+
+        if count > 0 or skipped > 0:
+            message = f"成功導入 {count} 筆記錄。"
+            if skipped: message += f"略過 {skipped} 筆已存在的記錄。"
+            report_details.append({"sheet": sheet_name, "message": message, "chunks": chunks})
+
+    return report_details
@@ -0,0 +1,262 @@
+"""
+Excel 導入背景任務
+以本地執行緒池執行導入，任務狀態與進度保存在資料庫中，工作程序重啟後可續跑。
+執行中的任務定期更新心跳 (updated_at)，每次執行領取任務時取得一個執行憑證 (run_token)，
+分塊與最終狀態只在憑證仍相符時提交；心跳逾時的任務被重新排隊後，舊的執行不會再寫入。
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, update
+from app import db
+from app.models import ImportJob
+from app.import_engine import IMPORT_CHUNK_SIZE, ExcelWorkbookSource, run_import
+from app.upload_cache import UploadCacheMiss, open_cached_upload
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+_executor = None
+_executor_lock = threading.Lock()
+_futures = {}
+_supervisor = None
+
+
+class JobPreempted(RuntimeError):
+    """任務已被重新排隊並由其他執行接手"""
+
+
+def _get_executor(app):
+    """取得 (必要時建立) 本程序的導入執行緒池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('IMPORT_JOB_WORKERS', 2),
+                thread_name_prefix='import-job'
+            )
+        return _executor
+
+
+def _job_dir(app):
+    path = app.config.get('IMPORT_JOB_DIR') or os.path.join(app.instance_path, 'import_jobs')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _submit(app, job_id):
+    for finished_id in [k for k, f in _futures.items() if f.done()]:
+        _futures.pop(finished_id, None)
+    _futures[job_id] = _get_executor(app).submit(_run_job, app, job_id)
+
+
+def enqueue_import_job(file_path, config, user_id, upload_token=None):
+    """建立導入任務並交由背景執行緒池執行，返回任務物件 (upload_token 表示從上傳快取導入)"""
+    app = current_app._get_current_object()
+    job = ImportJob(
+        id=str(uuid.uuid4()), user_id=user_id, status=JOB_QUEUED, file_path=file_path,
+        upload_token=upload_token, config=config, rows_processed={}
+    )
+    db.session.add(job)
+    db.session.commit()
+    _submit(app, job.id)
+    return job
+
+
+def save_upload(file):
+    """將上傳的檔案暫存到任務目錄，返回檔案路徑"""
+    extension = os.path.splitext(file.filename or '')[1] or '.xlsx'
+    path = os.path.join(_job_dir(current_app), f"{uuid.uuid4().hex}{extension}")
+    file.save(path)
+    return path
+
+
+def _claim_job(job_id):
+    """原子地將排隊中的任務標記為執行中，避免多個工作程序重複執行；返回本次執行的憑證 (未領取到時為 None)"""
+    run_token = uuid.uuid4().hex
+    result = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == JOB_QUEUED)
+        .values(status=JOB_RUNNING, run_token=run_token, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return run_token if result.rowcount == 1 else None
+
+
+def _update_owned_job(job_id, run_token, **values):
+    """只在任務仍屬於本次執行時更新，返回是否更新成功"""
+    result = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.run_token == run_token)
+        .values(updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _heartbeat(app, job_id, run_token, stop):
+    """執行期間定期更新任務的 updated_at (開啟檔案或處理大分塊時也不會被判定為中斷)"""
+    interval = app.config.get('IMPORT_JOB_HEARTBEAT_SECONDS', 30)
+    table = ImportJob.__table__
+    with app.app_context():
+        while not stop.wait(interval):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(
+                        update(table)
+                        .where(table.c.id == job_id, table.c.run_token == run_token, table.c.status == JOB_RUNNING)
+                        .values(updated_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                app.logger.warning(f"更新導入任務 {job_id} 心跳失敗: {e}")
+
+
+def remove_upload(path):
+    """刪除暫存的上傳檔案"""
+    try:
+        if path: os.remove(path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def _open_job_source(app, job):
+    """開啟任務的資料來源：上傳快取或暫存的上傳檔案"""
+    if job.upload_token:
+        try:
+            with open_cached_upload(app, job.user_id, job.upload_token) as source:
+                yield source
+        except UploadCacheMiss:
+            raise RuntimeError("上傳檔案快取已過期，請重新上傳檔案")
+    else:
+        with pd.ExcelFile(job.file_path) as xls:
+            yield ExcelWorkbookSource(xls)
+
+
+def _run_job(app, job_id):
+    """在背景執行緒中執行導入任務"""
+    with app.app_context():
+        run_token = _claim_job(job_id)
+        if run_token is None:
+            return
+        job = db.session.get(ImportJob, job_id)
+        file_path = job.file_path
+        rows_processed = dict(job.rows_processed or {})
+
+        def on_progress(sheet_name, rows_done):
+            # 與分塊資料在同一交易中提交，續跑時可精確略過已導入的列；任務已被接手時放棄這個分塊
+            rows_processed[sheet_name] = rows_done
+            if not _update_owned_job(job_id, run_token, rows_processed=dict(rows_processed)):
+                raise JobPreempted(f"導入任務 {job_id} 已由其他執行接手")
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(app, job_id, run_token, stop), daemon=True, name='import-job-heartbeat')
+        heartbeat.start()
+        try:
+            with _open_job_source(app, job) as source:
+                report_details = run_import(
+                    source, job.config, job.user_id,
+                    chunk_size=app.config.get('IMPORT_CHUNK_SIZE', IMPORT_CHUNK_SIZE),
+                    progress_callback=on_progress,
+                    resume_from=rows_processed
+                )
+            result = {'status': JOB_COMPLETED, 'report_details': report_details}
+        except JobPreempted as e:
+            db.session.rollback()
+            app.logger.warning(f"{e}，停止本次執行")
+            return
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"導入任務 {job_id} 失敗: {e}", exc_info=True)
+            result = {'status': JOB_FAILED, 'error': f"導入數據過程中發生錯誤: {str(e)}"}
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        owned = _update_owned_job(job_id, run_token, finished_at=datetime.utcnow(), **result)
+        db.session.commit()
+        if owned:
+            remove_upload(file_path)
+
+
+def resume_pending_jobs(app):
+    """重新排入尚未完成的任務：排隊中的任務，以及心跳逾時 (工作程序已中斷) 的執行中任務"""
+    if not inspect(db.engine).has_table(ImportJob.__tablename__):
+        return
+
+    stale_before = datetime.utcnow() - timedelta(seconds=app.config.get('IMPORT_JOB_STALE_SECONDS', 300))
+    # 直接讀取欄位，避免使用工作階段中已載入的舊心跳時間
+    stale_jobs = db.session.query(ImportJob.id, ImportJob.updated_at).filter(
+        ImportJob.status == JOB_RUNNING, ImportJob.updated_at < stale_before
+    ).all()
+    for job_id, updated_at in stale_jobs:
+        db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == JOB_RUNNING, ImportJob.updated_at == updated_at)
+            .values(status=JOB_QUEUED)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    queued_ids = [job_id for (job_id,) in db.session.query(ImportJob.id).filter(ImportJob.status == JOB_QUEUED)]
+    for job_id in queued_ids:
+        future = _futures.get(job_id)
+        if future is None or future.done():
+            app.logger.info(f"續跑導入任務 {job_id}")
+            _submit(app, job_id)
+    return queued_ids
+
+
+def _supervise(app):
+    interval = app.config.get('IMPORT_JOB_RESUME_INTERVAL', 60)
+    while True:
+        with app.app_context():
+            try:
+                resume_pending_jobs(app)
+            except Exception as e:
+                app.logger.error(f"續跑導入任務失敗: {e}", exc_info=True)
+            finally:
+                db.session.remove()
+        time.sleep(interval)
+
+
+def start_job_supervisor(app):
+    """
+    啟動本程序的任務監督執行緒：立即並每 IMPORT_JOB_RESUME_INTERVAL 秒續跑中斷的任務。
+    由伺服器進入點 (wsgi.py / run.py) 呼叫，CLI 指令不會啟動。
+    """
+    global _supervisor
+    with _executor_lock:
+        if _supervisor is None:
+            _supervisor = threading.Thread(target=_supervise, args=(app,), daemon=True, name='import-job-supervisor')
+            _supervisor.start()
+
+
+@click.command('resume-import-jobs')
+@with_appcontext
+def resume_import_jobs_command():
+    """續跑中斷的導入任務並等待完成"""
+    app = current_app._get_current_object()
+    job_ids = resume_pending_jobs(app) or []
+    for job_id in job_ids:
+        wait_for_job(job_id)
+    click.echo(f"已續跑 {len(job_ids)} 個導入任務。")
+
+
+def wait_for_job(job_id, timeout=None):
+    """等待本程序中提交的任務執行完成"""
+    future = _futures.get(job_id)
+    if future is not None:
+        future.result(timeout=timeout)
@@ -0,0 +1,97 @@
+"""
+串流回覆的逐段 Markdown 轉換
+模型逐段產生文字時，只將已完成的區塊 (以空行分隔、不在程式碼區塊內且不會併入後續清單或引言) 轉為 HTML，
+未完成的部分保留到下一段文字或串流結束時再轉換。
+"""
+
+import re
+import markdown
+
+CHAT_MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br']
+
+_FENCE = re.compile(r'^\s{0,3}(```|~~~)')
+_LIST_ITEM = re.compile(r'^\s{0,3}([*+-]|\d+\.)(\s|$)')
+_BLOCKQUOTE = re.compile(r'^\s{0,3}>')
+
+
+def render_markdown(text, extensions=CHAT_MARKDOWN_EXTENSIONS):
+    return markdown.markdown(text, extensions=extensions)
+
+
+class IncrementalMarkdown:
+    """累積串流文字，返回新完成區塊的 HTML"""
+
+    def __init__(self, extensions=CHAT_MARKDOWN_EXTENSIONS):
+        self.extensions = extensions
+        self.text = ''
+        self._pending = ''
+
+    def feed(self, chunk):
+        """加入一段文字，返回其間完成的區塊 HTML (沒有完成的區塊時為空字串)"""
+        self.text += chunk
+        self._pending += chunk
+        cut = self._last_boundary(self._pending)
+        if not cut:
+            return ''
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return render_markdown(ready, self.extensions)
+
+    @property
+    def pending(self):
+        """尚未轉換的文字"""
+        return self._pending
+
+    def finish(self):
+        """串流結束，返回剩餘文字的 HTML"""
+        ready, self._pending = self._pending, ''
+        return render_markdown(ready, self.extensions) if ready.strip() else ''
+
+    @staticmethod
+    def _last_boundary(text):
+        """
+        最後一個可切分的位置：程式碼區塊外的空行，且下一行已開始並且沒有縮排
+        (縮排的行可能是上一個清單項目的延續)。
+        含有清單或引言的區塊之後若又是清單項目或引言，轉換時會併入同一個元素，因此不切分；
+        這種區塊之後未完成的行也要等到整行收到後才能判斷。
+        """
+        boundary, in_fence, after_blank, offset = 0, False, False, 0
+        # 目前區塊 (上一個空行之後) 中出現過的容器類型
+        containers = set()
+        lines = text.split('\n')
+        # 最後一段尚未換行，還不是完整的行
+        for line in lines[:-1]:
+            start = offset
+            offset += len(line) + 1
+            if _FENCE.match(line):
+                if not in_fence and after_blank:
+                    boundary = start
+                    containers = set()
+                in_fence = not in_fence
+                after_blank = False
+                continue
+            if in_fence:
+                continue
+            if not line.strip():
+                after_blank = True
+                continue
+            kind = _container_kind(line)
+            if after_blank and not line[0].isspace():
+                if kind not in containers:
+                    boundary = start
+                containers = set()
+            if kind:
+                containers.add(kind)
+            after_blank = False
+        tail = lines[-1]
+        if after_blank and not in_fence and tail and not tail[0].isspace() and not containers:
+            boundary = offset
+        return boundary
+
+
+def _container_kind(line):
+    """以清單項目或引言開始的行返回其類型，否則返回 None"""
+    if _LIST_ITEM.match(line):
+        return 'list'
+    if _BLOCKQUOTE.match(line):
+        return 'quote'
+    return None
@@ -1,12 +1,55 @@
 from . import db, login_manager
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import date, datetime
+
+# 寫入日期欄位時接受的字串格式 (依序嘗試)
+DATE_INPUT_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S')
+
+
+def parse_date_value(value):
+    """將 date、datetime 或常見格式的日期字串轉為 date；空值返回 None，無法解析時拋出 ValueError"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"無法解析的日期: {value}")
+
+
+class ISODate(db.TypeDecorator):
+    """
+    資料庫中為原生 DATE 欄位 (可直接以日期比較、排序與建立索引)，
+    Python 端維持 YYYY-MM-DD 字串；寫入時接受 date 或常見格式的日期字串。
+    """
+    impl = db.Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return parse_date_value(value)
+
+    def process_result_value(self, value, dialect):
+        return value.isoformat() if value is not None else None
+
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 羊隻相關數據的變更版本 (ETag 用)
     
     sheep = db.relationship('Sheep', backref='owner', lazy='dynamic', cascade="all, delete-orphan")
     events = db.relationship('SheepEvent', backref='owner', lazy='dynamic', cascade="all, delete-orphan")
@@ -65,7 +108,7 @@ class Sheep(db.Model):
     
     # --- 核心基础识别资料 (Core Identification) ---
     EarNum = db.Column(db.String(100), nullable=False) # 耳号
-    BirthDate = db.Column(db.String(50)) # 出生日期
+    BirthDate = db.Column(ISODate) # 出生日期
     Sex = db.Column(db.String(20)) # 性别
     Breed = db.Column(db.String(100)) # 品种
     
@@ -78,7 +121,7 @@ class Sheep(db.Model):
     SireBre = db.Column(db.String(100)) # 父系品种 (Sire's Breed)
     DamBre = db.Column(db.String(100)) # 母系品种 (Dam's Breed)
     MoveCau = db.Column(db.String(100)) # 异动原因 (Move Cause)
-    MoveDate = db.Column(db.String(50)) # 异动日期 (Move Date)
+    MoveDate = db.Column(ISODate) # 异动日期 (Move Date)
     Class = db.Column(db.String(100)) # 等级/分类
     LittleSize = db.Column(db.Integer) # 产仔数/窝数 (Litter Size)
     Lactation = db.Column(db.Integer) # 泌乳胎次
@@ -102,9 +145,9 @@ class Sheep(db.Model):
     # --- 备注与提醒 (Notes & Reminders) ---
     other_remarks = db.Column(db.Text) # 使用者备注
     agent_notes = db.Column(db.Text) # AI代理人备注
-    next_vaccination_due_date = db.Column(db.String(50)) # 下次疫苗日期
-    next_deworming_due_date = db.Column(db.String(50)) # 下次驱虫日期
-    expected_lambing_date = db.Column(db.String(50)) # 预计产仔日期
+    next_vaccination_due_date = db.Column(ISODate) # 下次疫苗日期
+    next_deworming_due_date = db.Column(ISODate) # 下次驱虫日期
+    expected_lambing_date = db.Column(ISODate) # 预计产仔日期
     
     # --- ESG 相關欄位 ---
     manure_management = db.Column(db.String(100)) # 糞肥管理方式 (例如：堆肥、厭氧發酵)
@@ -112,8 +155,16 @@ class Sheep(db.Model):
     welfare_score = db.Column(db.Integer) # 動物福利評分 (1-5分)
 
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 最後變更時的用戶數據版本 (增量同步用)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'EarNum', name='_user_ear_num_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'EarNum', name='_user_ear_num_uc'),
+        db.Index('ix_sheep_user_sync_version', 'user_id', 'sync_version'),
+        # 儀表板提醒以日期範圍查詢到期的羊隻
+        db.Index('ix_sheep_user_next_vaccination_due_date', 'user_id', 'next_vaccination_due_date'),
+        db.Index('ix_sheep_user_next_deworming_due_date', 'user_id', 'next_deworming_due_date'),
+        db.Index('ix_sheep_user_expected_lambing_date', 'user_id', 'expected_lambing_date'),
+    )
     
     historical_data = db.relationship('SheepHistoricalData', backref='sheep', lazy='dynamic', cascade="all, delete-orphan")
 
@@ -128,7 +179,7 @@ class SheepEvent(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     sheep_id = db.Column(db.Integer, db.ForeignKey('sheep.id', ondelete='CASCADE'), nullable=False)
 
-    event_date = db.Column(db.String(50), nullable=False)
+    event_date = db.Column(ISODate, nullable=False)
     event_type = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     notes = db.Column(db.Text)
@@ -136,8 +187,18 @@ class SheepEvent(db.Model):
     # --- ESG - 食品安全相關欄位 ---
     medication = db.Column(db.String(150)) # 用藥名稱
     withdrawal_days = db.Column(db.Integer) # 停藥天數
+    withdrawal_end_date = db.Column(ISODate) # 停藥期結束日 (event_date + withdrawal_days，寫入時計算)
 
     recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    fingerprint = db.Column(db.String(64), unique=True, index=True) # 導入記錄指紋 (去除重複導入用)
+    sync_version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 最後變更時的用戶數據版本 (增量同步用)
+
+    __table_args__ = (
+        db.Index('ix_sheep_event_user_sync_version', 'user_id', 'sync_version'),
+        db.Index('ix_sheep_event_user_withdrawal_end_date', 'user_id', 'withdrawal_end_date'),
+        db.Index('ix_sheep_event_sheep_event_date', 'sheep_id', 'event_date', 'id'), # 單隻羊的事件列表 (依日期倒序)
+        db.Index('ix_sheep_event_user_event_type_date', 'user_id', 'event_type', 'event_date'), # 依類型統計事件、重算每日彙總格
+    )
     
     sheep = db.relationship('Sheep', backref=db.backref('events', lazy=True, cascade="all, delete-orphan"))
 
@@ -152,11 +213,19 @@ class SheepHistoricalData(db.Model):
     sheep_id = db.Column(db.Integer, db.ForeignKey('sheep.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
-    record_date = db.Column(db.String(50), nullable=False)
+    record_date = db.Column(ISODate, nullable=False)
     record_type = db.Column(db.String(100), nullable=False)
     value = db.Column(db.Float, nullable=False)
     notes = db.Column(db.Text)
     recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    fingerprint = db.Column(db.String(64), unique=True, index=True) # 導入記錄指紋 (去除重複導入用)
+    sync_version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # 最後變更時的用戶數據版本 (增量同步用)
+
+    __table_args__ = (
+        db.Index('ix_sheep_historical_data_user_sync_version', 'user_id', 'sync_version'),
+        db.Index('ix_sheep_historical_data_sheep_user_record_date', 'sheep_id', 'user_id', 'record_date', 'id'), # 單隻羊的歷史數據 (依日期排序)
+        db.Index('ix_sheep_historical_data_user_type_date', 'user_id', 'record_type', 'record_date'), # 重算每日彙總格
+    )
     
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -164,6 +233,56 @@ class SheepHistoricalData(db.Model):
     def __repr__(self):
         return f'<HistoricalData {self.record_type}:{self.value} for SheepID:{self.sheep_id}>'
 
+class SyncTombstone(db.Model):
+    """已刪除記錄的墓碑，供增量同步通知客戶端刪除本地副本"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entity = db.Column(db.String(20), nullable=False) # sheep / event / history
+    entity_id = db.Column(db.Integer, nullable=False)
+    ear_num = db.Column(db.String(100)) # 被刪除羊隻的耳號
+    sync_version = db.Column(db.Integer, nullable=False) # 刪除時的用戶數據版本
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_sync_tombstone_user_sync_version', 'user_id', 'sync_version'),)
+
+    def to_dict(self):
+        return {'id': self.entity_id, 'EarNum': self.ear_num, 'deleted_at': self.deleted_at}
+
+    def __repr__(self):
+        return f'<SyncTombstone {self.entity}:{self.entity_id} v{self.sync_version}>'
+
+class HistoryDailyRollup(db.Model):
+    """每用戶、每日、每種記錄類型的歷史數據彙總 (由寫入時維護，供報告與趨勢圖使用)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    record_date = db.Column(ISODate, nullable=False)
+    record_type = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'record_type', 'record_date', name='_history_rollup_uc'),)
+
+    def to_dict(self):
+        return {
+            'record_date': self.record_date, 'record_type': self.record_type, 'count': self.count,
+            'sum': self.sum, 'min': self.min, 'max': self.max, 'avg': self.sum / self.count if self.count else None
+        }
+
+class EventDailyRollup(db.Model):
+    """每用戶、每日、每種事件類型的事件數量 (由寫入時維護)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    event_date = db.Column(ISODate, nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'event_type', 'event_date', name='_event_rollup_uc'),)
+
+    def to_dict(self):
+        return {'event_date': self.event_date, 'event_type': self.event_type, 'count': self.count}
+
 class ChatHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -172,6 +291,64 @@ class ChatHistory(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     ear_num_context = db.Column(db.String(100))
+
+    __table_args__ = (db.Index('ix_chat_history_user_session_timestamp', 'user_id', 'session_id', 'timestamp'),)
     
     def __repr__(self):
-        return f'<Chat {self.session_id} - {self.role}>'
\ No newline at end of file
+        return f'<Chat {self.session_id} - {self.role}>'
+
+class AgentResponseCache(db.Model):
+    """固定提示詞的模型回應快取 (以提示詞、生成設定與模型名稱的雜湊為鍵)"""
+    id = db.Column(db.Integer, primary_key=True)
+    prompt_hash = db.Column(db.String(64), unique=True, nullable=False)
+    endpoint = db.Column(db.String(50), nullable=False) # tip / recommendation
+    response_text = db.Column(db.Text, nullable=False)
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # LRU 淘汰依據
+
+    __table_args__ = (db.Index('ix_agent_response_cache_last_used_at', 'last_used_at'),)
+
+    def __repr__(self):
+        return f'<AgentResponseCache {self.endpoint}:{self.prompt_hash[:8]}>'
+
+class AgentCacheStat(db.Model):
+    """各端點的回應快取命中與未命中次數"""
+    endpoint = db.Column(db.String(50), primary_key=True)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    misses = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hits / total, 4) if total else 0.0}
+
+class ImportJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True) # 任務 UUID
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued / running / completed / failed
+    file_path = db.Column(db.String(500)) # 暫存的上傳檔案路徑
+    upload_token = db.Column(db.String(64)) # 上傳快取憑證 (以快取的解析結果導入時使用)
+    run_token = db.Column(db.String(32)) # 目前執行的憑證 (每次領取任務時更新，只有持有者可提交進度)
+    config = db.Column(db.JSON, nullable=False) # 映射設定
+    rows_processed = db.Column(db.JSON) # 各工作表已提交的列數
+    report_details = db.Column(db.JSON) # 最終導入報告
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'rows_processed': self.rows_processed or {},
+            'report_details': self.report_details or [],
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'finished_at': self.finished_at
+        }
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
@@ -0,0 +1,42 @@
+"""
+羊隻提醒
+羊隻的疫苗、驅蟲與預產期日期以 DATE 欄位保存並各有 (user_id, 日期) 索引，
+事件的停藥期結束日在寫入時計算並存入 withdrawal_end_date 欄位，
+儀表板以索引進行日期範圍查詢，不需掃描整個羊群或全部用藥歷史。
+"""
+
+from datetime import timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import SheepEvent, parse_date_value
+
+# 提醒欄位與顯示名稱
+REMINDER_FIELDS = {
+    "next_vaccination_due_date": "疫苗接種",
+    "next_deworming_due_date": "驅蟲",
+    "expected_lambing_date": "預產期"
+}
+
+
+def parse_due_date(value):
+    """以 parse_date_value 的規則解析日期 (date 或常見格式的字串)，無法解析時返回 None"""
+    try:
+        return parse_date_value(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_withdrawal_end_date(event_date, withdrawal_days):
+    """計算停藥期結束日 (YYYY-MM-DD)；沒有停藥天數或日期無法解析時返回 None"""
+    start = parse_due_date(event_date)
+    if start is None or not withdrawal_days or withdrawal_days <= 0:
+        return None
+    return (start + timedelta(days=withdrawal_days)).isoformat()
+
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_withdrawal_end_date(session, flush_context, instances):
+    """新增或修改事件時重新計算停藥期結束日"""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, SheepEvent):
+            obj.withdrawal_end_date = compute_withdrawal_end_date(obj.event_date, obj.withdrawal_days)
@@ -0,0 +1,111 @@
+"""
+AI 回應快取
+每日提示與飼養建議常常送出完全相同的提示詞，以提示詞、完整生成設定與模型名稱的雜湊為鍵，
+將成功的模型回應保存在資料表中 (重新啟動後仍有效)，到期或超過容量時依最近使用時間淘汰。
+各端點的命中與未命中次數記錄於 agent_cache_stat。
+"""
+
+from datetime import datetime, time, timedelta, timezone
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db, utils
+from app.agent_limiter import run_agent_call
+from app.models import AgentResponseCache, AgentCacheStat
+
+# 只快取完整生成的回應 (被截斷或阻擋的回應下次重新請求)
+_CACHEABLE_FINISH_REASONS = (None, 'STOP')
+
+
+def end_of_local_day(now=None):
+    """本地時間下一個午夜對應的 UTC 時間"""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+    return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _count(endpoint, hit):
+    """端點的命中或未命中次數加一"""
+    table = AgentCacheStat.__table__
+    column = table.c.hits if hit else table.c.misses
+    result = db.session.execute(update(table).where(table.c.endpoint == endpoint).values({column: column + 1}))
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(AgentCacheStat(endpoint=endpoint, hits=int(hit), misses=int(not hit)))
+    except IntegrityError:
+        # 其他請求同時建立了這個端點的記錄
+        db.session.execute(update(table).where(table.c.endpoint == endpoint).values({column: column + 1}))
+
+
+def _evict(now):
+    """刪除已到期的項目，超過 AGENT_CACHE_MAX_ENTRIES 時刪除最久未使用的項目"""
+    table = AgentResponseCache.__table__
+    db.session.execute(delete(table).where(table.c.expires_at <= now))
+    max_entries = current_app.config.get('AGENT_CACHE_MAX_ENTRIES', 500)
+    stale_ids = db.session.scalars(
+        select(table.c.id).order_by(table.c.last_used_at.desc(), table.c.id.desc()).offset(max_entries)
+    ).all()
+    if stale_ids:
+        db.session.execute(delete(table).where(table.c.id.in_(stale_ids)))
+
+
+def _store(endpoint, prompt_hash, text, expires_at):
+    now = datetime.utcnow()
+    try:
+        entry = db.session.execute(select(AgentResponseCache).filter_by(prompt_hash=prompt_hash)).scalar_one_or_none()
+        if entry is None:
+            entry = AgentResponseCache(prompt_hash=prompt_hash)
+            db.session.add(entry)
+        entry.endpoint = endpoint
+        entry.response_text = text
+        entry.hit_count = 0
+        entry.created_at = entry.last_used_at = now
+        entry.expires_at = expires_at
+        db.session.flush()
+        _evict(now)
+        db.session.commit()
+    except IntegrityError:
+        # 其他請求同時寫入了相同提示詞的回應
+        db.session.rollback()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"寫入 AI 回應快取失敗: {e}", exc_info=True)
+
+
+def cached_gemini_call(endpoint, prompt_text, api_key, generation_config_override=None, expires_at=None):
+    """
+    返回與 call_gemini_api 相同格式的結果；相同請求的成功回應在到期前直接由快取返回。
+    expires_at (UTC) 未指定時於 AGENT_CACHE_TTL 秒後到期，錯誤結果不會被快取。
+    """
+    prompt_hash = utils.gemini_prompt_hash(prompt_text, generation_config_override)
+    now = datetime.utcnow()
+    table = AgentResponseCache.__table__
+    text = db.session.execute(
+        select(table.c.response_text).where(table.c.prompt_hash == prompt_hash, table.c.expires_at > now)
+    ).scalar_one_or_none()
+    if text is not None:
+        db.session.execute(update(table).where(table.c.prompt_hash == prompt_hash).values(
+            hit_count=table.c.hit_count + 1, last_used_at=now
+        ))
+    _count(endpoint, hit=text is not None)
+    # 呼叫 API 可能需要數十秒，先提交以免長時間佔用資料庫寫入鎖
+    db.session.commit()
+    if text is not None:
+        return {"text": text, "finish_reason": "STOP"}
+
+    result = run_agent_call(utils.call_gemini_api, prompt_text, api_key, generation_config_override=generation_config_override)
+    if "error" not in result and result.get("text") and result.get("finish_reason") in _CACHEABLE_FINISH_REASONS:
+        if expires_at is None:
+            expires_at = now + timedelta(seconds=current_app.config.get('AGENT_CACHE_TTL', 86400))
+        _store(endpoint, prompt_hash, result["text"], expires_at)
+    return result
+
+
+def get_cache_stats():
+    """各端點的命中統計與目前快取的項目數"""
+    return {
+        'endpoints': {stat.endpoint: stat.to_dict() for stat in AgentCacheStat.query.order_by(AgentCacheStat.endpoint)},
+        'entries': db.session.scalar(select(func.count()).select_from(AgentResponseCache)),
+    }
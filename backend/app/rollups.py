@@ -0,0 +1,221 @@
+"""
+每日彙總表
+依 (用戶, 日期, 類型) 維護歷史數據的筆數、總和、最小與最大值，以及事件數量。
+新增記錄時以增量 (筆數、總和、最小/最大值) 更新彙總格；只有刪除歷史數據，或修改數值使該格的
+最小/最大值可能改變時，才以原始資料重算單一彙總格 (以 (用戶, 類型, 日期) 索引查詢)。
+報告與趨勢圖讀取彙總列即可，不需掃描全部原始記錄。可用 `flask rebuild-rollups` 完整重建。
+"""
+
+from types import SimpleNamespace
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, delete, event, func, insert, select, true, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from app.models import EventDailyRollup, HistoryDailyRollup, SheepEvent, SheepHistoricalData, parse_date_value
+
+# 各彙總表的來源欄位：(原始表, 彙總表, 日期欄位, 類型欄位)
+_ROLLUPS = {
+    SheepHistoricalData: (HistoryDailyRollup, 'record_date', 'record_type'),
+    SheepEvent: (EventDailyRollup, 'event_date', 'event_type'),
+}
+
+
+def _aggregate_select(model, where):
+    """依 (用戶, 日期, 類型) 分組計算彙總值的 SELECT"""
+    rollup, date_field, type_field = _ROLLUPS[model]
+    source = model.__table__
+    columns = [source.c.user_id, source.c[date_field], source.c[type_field], func.count(source.c.id)]
+    if model is SheepHistoricalData:
+        columns += [func.sum(source.c.value), func.min(source.c.value), func.max(source.c.value)]
+    target = [c.name for c in rollup.__table__.columns if c.name != 'id']
+    return target, select(*columns).where(where).group_by(source.c.user_id, source.c[date_field], source.c[type_field])
+
+
+def refresh_rollups(model, keys, connection=None):
+    """
+    以原始資料重新計算指定的彙總格。keys 為 {(user_id, 日期, 類型)}。
+    批次 SQL 寫入不會觸發 ORM 事件，需自行呼叫。
+    """
+    keys = sorted(set(keys))
+    if not keys: return
+    connection = connection or db.session.connection()
+    rollup, date_field, type_field = _ROLLUPS[model]
+    source, table = model.__table__, rollup.__table__
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        connection.execute(delete(table).where(
+            tuple_(table.c.user_id, table.c[date_field], table.c[type_field]).in_(batch)
+        ))
+        target, aggregate = _aggregate_select(model, tuple_(source.c.user_id, source.c[date_field], source.c[type_field]).in_(batch))
+        connection.execute(insert(table).from_select(target, aggregate))
+
+
+def _cell(model, get):
+    """返回記錄所屬的彙總格 (user_id, YYYY-MM-DD, 類型) 與數值 (事件為 None)"""
+    _, date_field, type_field = _ROLLUPS[model]
+    day = parse_date_value(get(date_field))
+    value = get('value') if model is SheepHistoricalData else None
+    return (get('user_id'), day.isoformat() if day else None, get(type_field)), value
+
+
+def _add_delta(deltas, key, value, sign=1):
+    """累加一筆記錄的增量：[筆數, 總和, 最小值, 最大值]；sign=-1 為減去 (只減筆數與總和)"""
+    delta = deltas.setdefault(key, [0, 0.0, None, None])
+    delta[0] += sign
+    if value is None: return
+    delta[1] += sign * value
+    if sign > 0:
+        delta[2] = value if delta[2] is None else min(delta[2], value)
+        delta[3] = value if delta[3] is None else max(delta[3], value)
+
+
+def _merged_values(table, new):
+    """彙總格與增量合併後的欄位值；new 為增量欄位 (INSERT ... excluded 或綁定參數)"""
+    values = {'count': table.c.count + new.count}
+    if 'sum' in table.c:
+        values.update(
+            sum=table.c.sum + new.sum,
+            min=case((new.min < table.c.min, new.min), else_=table.c.min),
+            max=case((new.max > table.c.max, new.max), else_=table.c.max),
+        )
+    return values
+
+
+def _apply_deltas(model, deltas, connection):
+    """將增量寫入彙總格 (不存在時新增)，並刪除筆數歸零的彙總格"""
+    deltas = {key: delta for key, delta in deltas.items() if None not in key}
+    if not deltas: return
+    rollup, date_field, type_field = _ROLLUPS[model]
+    table = rollup.__table__
+    rows = []
+    for (user_id, day, kind), (count, total, low, high) in deltas.items():
+        row = {'user_id': user_id, date_field: day, type_field: kind, 'count': count}
+        if 'sum' in table.c:
+            row.update(sum=total, min=low, max=high)
+        rows.append(row)
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c[type_field], table.c[date_field]],
+            set_=_merged_values(table, stmt.excluded),
+        )
+        connection.execute(stmt, rows)
+    else:
+        for row in rows:
+            key = and_(table.c.user_id == row['user_id'], table.c[date_field] == row[date_field], table.c[type_field] == row[type_field])
+            new = SimpleNamespace(**{name: row[name] for name in ('count', 'sum', 'min', 'max') if name in row})
+            if not connection.execute(update(table).where(key).values(_merged_values(table, new))).rowcount:
+                connection.execute(insert(table), row)
+
+    if any(delta[0] < 0 for delta in deltas.values()):
+        connection.execute(delete(table).where(
+            tuple_(table.c.user_id, table.c[date_field], table.c[type_field]).in_(list(deltas)), table.c.count <= 0
+        ))
+
+
+def add_to_rollups(model, rows, connection=None):
+    """
+    將新寫入的記錄 (dict) 以增量累加到彙總格。
+    批次 SQL 寫入不會觸發 ORM 事件，需自行呼叫。
+    """
+    deltas = {}
+    for row in rows:
+        key, value = _cell(model, row.get)
+        _add_delta(deltas, key, value)
+    _apply_deltas(model, deltas, connection or db.session.connection())
+
+
+def rebuild_rollups(user_id=None, connection=None):
+    """清空並以原始資料重建彙總表；指定 user_id 時只重建該用戶"""
+    connection = connection or db.session.connection()
+    for model, (rollup, _, _) in _ROLLUPS.items():
+        table, source = rollup.__table__, model.__table__
+        connection.execute(delete(table).where(table.c.user_id == user_id) if user_id else delete(table))
+        target, aggregate = _aggregate_select(model, source.c.user_id == user_id if user_id else true())
+        connection.execute(insert(table).from_select(target, aggregate))
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_previous_cells(session, flush_context, instances):
+    """
+    修改前的日期、類型或數值可能未載入，在寫入前由資料庫讀取修改中與刪除中記錄目前所屬的彙總格與數值。
+    """
+    previous = session.info.setdefault('rollup_previous', {model: {} for model in _ROLLUPS})
+    for model, (_, date_field, type_field) in _ROLLUPS.items():
+        ids = [obj.id for obj in list(session.dirty) + list(session.deleted) if type(obj) is model and obj.id is not None]
+        ids = [record_id for record_id in ids if record_id not in previous[model]]
+        if not ids: continue
+        source = model.__table__
+        columns = [source.c.id, source.c.user_id, source.c[date_field], source.c[type_field]]
+        if model is SheepHistoricalData:
+            columns.append(source.c.value)
+        for row in session.connection().execute(select(*columns).where(source.c.id.in_(ids))):
+            previous[model][row.id] = _cell(model, row._mapping.get)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_on_flush(session, flush_context):
+    """ORM 新增、修改或刪除歷史數據與事件時，以增量或重算單一彙總格的方式更新受影響的彙總格"""
+    previous = session.info.pop('rollup_previous', None) or {model: {} for model in _ROLLUPS}
+    connection = session.connection()
+    for model, (rollup, date_field, type_field) in _ROLLUPS.items():
+        deltas, recompute, value_changes = {}, set(), []
+
+        def remove(key, value):
+            # 刪除事件只需減少筆數；刪除歷史數據後最小/最大值無法遞減，重算該格
+            if model is SheepHistoricalData:
+                recompute.add(key)
+            else:
+                _add_delta(deltas, key, None, -1)
+
+        for obj in session.new:
+            if type(obj) is model:
+                key, value = _cell(model, lambda name: getattr(obj, name))
+                _add_delta(deltas, key, value)
+        for obj in session.deleted:
+            if type(obj) is model:
+                remove(*previous[model].get(obj.id) or _cell(model, lambda name: getattr(obj, name)))
+        for obj in session.dirty:
+            if type(obj) is not model or obj.id not in previous[model]: continue
+            old_key, old_value = previous[model][obj.id]
+            key, value = _cell(model, lambda name: getattr(obj, name))
+            if key != old_key:
+                remove(old_key, old_value)
+                _add_delta(deltas, key, value)
+            elif value != old_value:
+                value_changes.append((key, old_value, value))
+
+        if value_changes:
+            # 舊數值是該格的最小或最大值時，新的最小/最大值需由原始資料重算
+            table = rollup.__table__
+            bounds = {
+                (row.user_id, row[1], row[2]): (row.min, row.max)
+                for row in connection.execute(
+                    select(table.c.user_id, table.c[date_field], table.c[type_field], table.c.min, table.c.max)
+                    .where(tuple_(table.c.user_id, table.c[date_field], table.c[type_field]).in_([key for key, _, _ in value_changes]))
+                )
+            }
+            for key, old_value, value in value_changes:
+                low, high = bounds.get(key, (None, None))
+                if low is None or old_value <= low or old_value >= high:
+                    recompute.add(key)
+                else:
+                    _add_delta(deltas, key, value)
+                    _add_delta(deltas, key, old_value, -1)
+
+        _apply_deltas(model, {key: delta for key, delta in deltas.items() if key not in recompute}, connection)
+        refresh_rollups(model, {key for key in recompute if None not in key}, connection)
+
+
+@click.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='只重建指定用戶的彙總')
+@with_appcontext
+def rebuild_rollups_command(user_id):
+    """以原始資料重建每日彙總表"""
+    rebuild_rollups(user_id)
+    db.session.commit()
+    click.echo(f"已重建每日彙總表{f' (用戶 {user_id})' if user_id else ''}。")
@@ -6,6 +6,17 @@ Pydantic 資料驗證模型
 from pydantic import BaseModel, field_validator, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from app.models import parse_date_value
+
+
+def _normalize_date(v):
+    """將日期字串統一為 YYYY-MM-DD；空字串保留 (由呼叫端視為清除)，無法解析時拋出 ValueError"""
+    if v is None or v == '':
+        return v
+    try:
+        return parse_date_value(v).isoformat()
+    except ValueError:
+        raise ValueError('日期格式無效，請使用 YYYY-MM-DD')
 
 
 # === 認證相關模型 ===
@@ -42,6 +53,11 @@ class SheepCreateModel(BaseModel):
             raise ValueError('耳號不能為空')
         return v.strip()
 
+    @field_validator('BirthDate')
+    @classmethod
+    def validate_birth_date(cls, v):
+        return _normalize_date(v)
+
 
 class SheepUpdateModel(BaseModel):
     """更新羊隻的資料模型"""
@@ -71,6 +87,11 @@ class SheepUpdateModel(BaseModel):
     welfare_score: Optional[int] = Field(None, ge=1, le=5, description="動物福利評分(1-5)")
     FarmNum: Optional[str] = Field(None, max_length=100, description="牧場編號")
 
+    @field_validator('BirthDate', 'next_vaccination_due_date', 'next_deworming_due_date', 'expected_lambing_date')
+    @classmethod
+    def validate_dates(cls, v):
+        return _normalize_date(v)
+
 
 # === 事件相關模型 ===
 class SheepEventCreateModel(BaseModel):
@@ -82,6 +103,13 @@ class SheepEventCreateModel(BaseModel):
     medication: Optional[str] = Field(None, max_length=150, description="用藥名稱")
     withdrawal_days: Optional[int] = Field(None, ge=0, description="停藥天數")
 
+    @field_validator('event_date')
+    @classmethod
+    def validate_event_date(cls, v):
+        if not v:
+            raise ValueError('事件日期不能為空')
+        return _normalize_date(v)
+
 
 # === 歷史數據相關模型 ===
 class HistoricalDataCreateModel(BaseModel):
@@ -91,6 +119,13 @@ class HistoricalDataCreateModel(BaseModel):
     value: float = Field(..., description="數值")
     notes: Optional[str] = Field(None, description="備註")
 
+    @field_validator('record_date')
+    @classmethod
+    def validate_record_date(cls, v):
+        if not v:
+            raise ValueError('記錄日期不能為空')
+        return _normalize_date(v)
+
 
 # === AI 代理人相關模型 ===
 class AgentRecommendationModel(BaseModel):
@@ -179,7 +214,8 @@ def create_error_response(error_message: str, validation_errors: List[Dict] = No
                 field_errors[field] = f'{get_field_display_name(field)}: {msg}'
         
         error_response['field_errors'] = field_errors
-        error_response['details'] = validation_errors
+        # ctx 可能包含例外物件 (自訂驗證器拋出的 ValueError)，無法序列化為 JSON
+        error_response['details'] = [{k: v for k, v in error.items() if k != 'ctx'} for error in validation_errors]
     
     return error_response
 
@@ -0,0 +1,59 @@
+"""
+歷史數據時間序列處理
+依日、週、月分桶計算平均、最小與最大值，或以 LTTB (Largest-Triangle-Three-Buckets)
+演算法挑選保留曲線形狀的代表點，減少圖表需要傳輸與繪製的點數。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 分桶單位對應的 pandas 週期
+BUCKET_PERIODS = {'day': 'D', 'week': 'W-SUN', 'month': 'M'}
+
+
+def bucket_history(rows, bucket):
+    """
+    將 (record_type, record_date, value) 列依類型與分桶單位彙總，
+    返回 [{record_type, bucket_start, count, avg, min, max}]；無法解析的日期略過。
+    """
+    df = pd.DataFrame(rows, columns=['record_type', 'record_date', 'value'])
+    df['date'] = pd.to_datetime(df['record_date'], format='%Y-%m-%d', errors='coerce')
+    df = df.dropna(subset=['date', 'value'])
+    if df.empty:
+        return []
+
+    df['bucket_start'] = df['date'].dt.to_period(BUCKET_PERIODS[bucket]).dt.start_time.dt.strftime('%Y-%m-%d')
+    grouped = df.groupby(['record_type', 'bucket_start'], sort=True)['value'].agg(['count', 'mean', 'min', 'max']).reset_index()
+    return [
+        {'record_type': row.record_type, 'bucket_start': row.bucket_start, 'count': int(row.count),
+         'avg': float(row.mean), 'min': float(row.min), 'max': float(row.max)}
+        for row in grouped.itertuples(index=False)
+    ]
+
+
+def lttb_indices(x, y, threshold):
+    """
+    以 LTTB 演算法從依 x 排序的點中挑選 threshold (至少 3) 個代表點，返回被選取點的索引。
+    點數不超過 threshold 時返回全部索引。
+    """
+    n = len(x)
+    if threshold >= n:
+        return list(range(n))
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    selected = [0]
+    # 第一點與最後一點固定保留，其餘點平均分為 threshold - 2 個桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # 選擇與前一選取點及下一桶平均點構成最大三角形面積的點
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
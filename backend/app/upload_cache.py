@@ -0,0 +1,310 @@
+"""
+上傳檔案快取
+以檔案內容雜湊為鍵，將分析時上傳的活頁簿保存於本地磁碟，導入時只需提供上傳憑證 (upload_token)，
+無需再次上傳。第一次導入時才將活頁簿解析為 Parquet 欄式檔案，續跑或重新導入時直接讀取。
+
+快取目錄可能由多個工作程序共用：使用中的項目在 leases/ 下有租約檔，持有者定期更新其修改時間，
+超過 UPLOAD_CACHE_LEASE_TTL 未更新的租約視為已中止。建立租約與清理項目都在快取目錄的鎖檔內進行，
+清理時略過仍有有效租約的項目。
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+import pyarrow as pa
+from flask import current_app
+from app.import_engine import IMPORT_CHUNK_SIZE, ExcelWorkbookSource
+
+MANIFEST_FILE = 'manifest.json'
+SOURCE_FILE = 'source'
+LEASE_DIR = 'leases'
+LOCK_FILE = '.lock'
+TRASH_PREFIX = '.trash-'
+
+# 鎖只在極短的檔案操作期間持有，超過此秒數仍存在表示持有者已中止
+_LOCK_STALE_SECONDS = 30
+
+_TOKEN_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadCacheMiss(LookupError):
+    """上傳憑證無效或快取已過期"""
+
+
+def _cache_root(app):
+    path = app.config.get('UPLOAD_CACHE_DIR') or os.path.join(app.instance_path, 'upload_cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _entry_dir(app, user_id, token):
+    if not token or not _TOKEN_PATTERN.fullmatch(token):
+        raise UploadCacheMiss(token)
+    return os.path.join(_cache_root(app), f"{user_id}_{token}")
+
+
+def _source_path(entry):
+    for name in os.listdir(entry):
+        if name.startswith(SOURCE_FILE):
+            return os.path.join(entry, name)
+    return None
+
+
+def _is_expired(app, entry):
+    return time.time() - os.path.getmtime(entry) > app.config.get('UPLOAD_CACHE_TTL', 3600)
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+@contextmanager
+def _cache_lock(root):
+    """跨程序的快取目錄鎖 (以獨占方式建立鎖檔)"""
+    path = os.path.join(root, LOCK_FILE)
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > _LOCK_STALE_SECONDS:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.remove(path)
+
+
+def _touch(lease):
+    """更新租約時間；租約已被當作過期清除時重新建立"""
+    try:
+        os.utime(lease)
+    except FileNotFoundError:
+        open(lease, 'w').close()
+
+
+def _live_leases(app, entry, exclude=None):
+    """返回項目中仍有效的租約數，並刪除已過期的租約 (須持有快取目錄鎖)"""
+    lease_dir = os.path.join(entry, LEASE_DIR)
+    if not os.path.isdir(lease_dir):
+        return 0
+    ttl = app.config.get('UPLOAD_CACHE_LEASE_TTL', 600)
+    live = 0
+    for name in os.listdir(lease_dir):
+        path = os.path.join(lease_dir, name)
+        if path == exclude:
+            continue
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                os.remove(path)
+            else:
+                live += 1
+        except FileNotFoundError:
+            continue
+    return live
+
+
+def _acquire_lease(app, entry, token):
+    """為快取項目建立租約並更新其存取時間，返回租約檔路徑"""
+    with _cache_lock(_cache_root(app)):
+        if not os.path.isdir(entry):
+            raise UploadCacheMiss(token)
+        lease_dir = os.path.join(entry, LEASE_DIR)
+        os.makedirs(lease_dir, exist_ok=True)
+        lease = os.path.join(lease_dir, f"{uuid.uuid4().hex}.lease")
+        open(lease, 'w').close()
+        os.utime(entry)
+    return lease
+
+
+def _release_lease(lease):
+    try:
+        os.remove(lease)
+    except FileNotFoundError:
+        pass
+
+
+def cache_upload(file, user_id):
+    """
+    將上傳檔案以內容雜湊存入快取，返回上傳憑證 (此時不解析檔案)。
+    相同內容重複上傳時只更新存取時間。呼叫後檔案串流會回到開頭，可繼續讀取。
+    """
+    app = current_app._get_current_object()
+    root = _cache_root(app)
+    extension = os.path.splitext(file.filename or '')[1] or '.xlsx'
+    temp_path = os.path.join(root, f".upload-{uuid.uuid4().hex}{extension}")
+
+    digest = hashlib.sha256()
+    with open(temp_path, 'wb') as f:
+        while block := file.stream.read(1024 * 1024):
+            digest.update(block)
+            f.write(block)
+    file.stream.seek(0)
+
+    token = digest.hexdigest()
+    entry = _entry_dir(app, user_id, token)
+    with _cache_lock(root):
+        # 內容相同，已存在的項目 (即使已逾時但尚未清理) 可以直接沿用
+        if os.path.isdir(entry) and (_source_path(entry) or os.path.exists(os.path.join(entry, MANIFEST_FILE))):
+            os.remove(temp_path)
+            os.utime(entry)
+        else:
+            os.makedirs(entry, exist_ok=True)
+            os.replace(temp_path, os.path.join(entry, f"{SOURCE_FILE}{extension}"))
+    evict_expired_entries(app, keep=entry)
+    return token
+
+
+def _materialize(app, entry, lease):
+    """
+    確保項目已解析為 Parquet 並返回清單。各工作表逐塊寫入暫存子目錄，完成後在鎖內發佈清單；
+    其他程序已先完成時捨棄自己的結果。沒有其他租約時刪除原始檔。
+    """
+    manifest_path = os.path.join(entry, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        source_path = _source_path(entry)
+        if source_path is None:
+            raise UploadCacheMiss(entry)
+        staging = f"parquet-{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(entry, staging))
+        try:
+            manifest = {'sheet_names': [], 'sheets': {}}
+            with pd.ExcelFile(source_path) as xls:
+                source = ExcelWorkbookSource(xls)
+                for index, sheet_name in enumerate(source.sheet_names):
+                    files = []
+                    for number, chunk in enumerate(source.iter_chunks(sheet_name, IMPORT_CHUNK_SIZE)):
+                        name = f"{staging}/{index}_{number}.parquet"
+                        schema = pa.schema([(str(c), pa.string()) for c in chunk.columns])
+                        chunk.to_parquet(os.path.join(entry, name), index=False, schema=schema)
+                        files.append(name)
+                        _touch(lease)
+                    manifest['sheet_names'].append(sheet_name)
+                    manifest['sheets'][sheet_name] = files
+
+            with _cache_lock(_cache_root(app)):
+                if not os.path.exists(manifest_path):
+                    temp_manifest = f"{manifest_path}.tmp"
+                    with open(temp_manifest, 'w', encoding='utf-8') as f:
+                        json.dump(manifest, f, ensure_ascii=False)
+                    os.replace(temp_manifest, manifest_path)
+                    staging = None
+                    if not _live_leases(app, entry, exclude=lease):
+                        os.remove(source_path)
+        finally:
+            if staging:
+                shutil.rmtree(os.path.join(entry, staging), ignore_errors=True)
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ParquetWorkbookSource:
+    """讀取快取中的 Parquet 工作表，介面與 ExcelWorkbookSource 相同"""
+
+    def __init__(self, entry, manifest, lease=None):
+        self.entry = entry
+        self.manifest = manifest
+        self.lease = lease
+
+    @property
+    def sheet_names(self):
+        return self.manifest['sheet_names']
+
+    def iter_chunks(self, sheet_name, chunk_size=IMPORT_CHUNK_SIZE):
+        """依指定的分塊大小重新切分快取的 Parquet 檔；每讀取一個檔案更新一次租約"""
+        buffered = []
+        for name in self.manifest['sheets'].get(sheet_name, []):
+            if self.lease:
+                _touch(self.lease)
+            buffered.append(pd.read_parquet(os.path.join(self.entry, name)))
+            while sum(len(df) for df in buffered) >= chunk_size:
+                df = _concat(buffered)
+                yield df.iloc[:chunk_size].reset_index(drop=True)
+                buffered = [df.iloc[chunk_size:]]
+        df = _concat(buffered) if buffered else None
+        if df is not None and len(df):
+            yield df.reset_index(drop=True)
+
+
+def _concat(frames):
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    # 各分塊欄位數不同時，缺少的欄位以 None 表示
+    return df.astype(object).where(pd.notna(df), None)
+
+
+def has_cached_upload(user_id, token):
+    """檢查上傳憑證是否仍有效"""
+    app = current_app._get_current_object()
+    try:
+        entry = _entry_dir(app, user_id, token)
+    except UploadCacheMiss:
+        return False
+    return os.path.isdir(entry) and not _is_expired(app, entry)
+
+
+@contextmanager
+def open_cached_upload(app, user_id, token):
+    """
+    開啟快取的上傳檔案並返回 Parquet 工作表來源，尚未解析時先解析。
+    使用期間持有租約，任何程序都不會清理這個項目。
+    """
+    entry = _entry_dir(app, user_id, token)
+    lease = _acquire_lease(app, entry, token)
+    try:
+        yield ParquetWorkbookSource(entry, _materialize(app, entry, lease), lease)
+    finally:
+        _release_lease(lease)
+
+
+def evict_expired_entries(app, keep=None):
+    """
+    刪除逾時的快取項目，並依最後存取時間淘汰最舊的項目，使總大小不超過上限；有有效租約的項目不會被刪除。
+    項目在鎖內改名移出後才刪除，不會長時間持有鎖。
+    """
+    root = _cache_root(app)
+    max_bytes = app.config.get('UPLOAD_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+    trash = [os.path.join(root, name) for name in os.listdir(root) if name.startswith(TRASH_PREFIX)]
+    with _cache_lock(root):
+        doomed, entries, total = [], [], 0
+        for name in os.listdir(root):
+            entry = os.path.join(root, name)
+            if name.startswith('.') or not os.path.isdir(entry):
+                continue
+            size = _dir_size(entry)
+            total += size
+            if entry == keep or _live_leases(app, entry):
+                continue
+            if _is_expired(app, entry):
+                doomed.append(entry)
+                total -= size
+                continue
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        for _, size, entry in sorted(entries):
+            if total <= max_bytes:
+                break
+            doomed.append(entry)
+            total -= size
+
+        for entry in doomed:
+            target = os.path.join(root, f"{TRASH_PREFIX}{uuid.uuid4().hex}")
+            try:
+                os.rename(entry, target)
+            except OSError:
+                continue
+            trash.append(target)
+    for target in trash:
+        shutil.rmtree(target, ignore_errors=True)
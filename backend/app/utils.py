@@ -1,15 +1,21 @@
+import hashlib
 import requests
 import json
-from .models import Sheep, SheepEvent, SheepHistoricalData
-from flask import current_app
+from datetime import date, datetime
+from sqlalchemy import literal, null, select, union_all
+from .models import db, Sheep, SheepEvent, SheepHistoricalData
+from .cache import cached_for_user
+from .http_client import get_http_session, get_timeout
+from flask import current_app, has_app_context
 
-def call_gemini_api(prompt_text, api_key, generation_config_override=None, safety_settings_override=None):
-    """
-    通用 Gemini API 調用函數。
-    """
-    GEMINI_MODEL_NAME = "gemini-2.5-pro"
+DEFAULT_GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com"
+GEMINI_MODEL_NAME = "gemini-2.5-pro"
+
+def _gemini_request(prompt_text, api_key, method, generation_config_override=None, safety_settings_override=None):
+    """組合 Gemini API 的請求網址與內容 (method 為 generateContent 或 streamGenerateContent)"""
     MAX_OUTPUT_TOKENS_GEMINI = 16384 
-    GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL_NAME}:generateContent?key={api_key}"
+    base_url = (current_app.config.get('GEMINI_API_BASE_URL') if has_app_context() else None) or DEFAULT_GEMINI_API_BASE_URL
+    GEMINI_API_URL = f"{base_url}/v1beta/models/{GEMINI_MODEL_NAME}:{method}?key={api_key}"
     
     generation_config = {
         "temperature": 0.4, 
@@ -40,10 +46,42 @@ def call_gemini_api(prompt_text, api_key, generation_config_override=None, safet
         "generationConfig": generation_config,
         "safetySettings": safety_settings
     }
+    return GEMINI_API_URL, payload
+
+
+def gemini_prompt_hash(prompt_text, generation_config_override=None, safety_settings_override=None):
+    """提示詞、完整生成設定與模型名稱的雜湊，相同的請求得到相同的值 (不含 API 金鑰)"""
+    _, payload = _gemini_request(prompt_text, '', "generateContent", generation_config_override, safety_settings_override)
+    key = json.dumps({"model": GEMINI_MODEL_NAME, **payload}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _http_error_message(e):
+    """由 HTTPError 取出 API 返回的錯誤訊息"""
+    error_message = f"API 請求失敗 (碼: {e.response.status_code if e.response else 'N/A'})"
+    try:
+        error_detail = e.response.json()
+        api_error_msg = error_detail.get("error", {}).get("message", "API 金鑰無效或請求錯誤。")
+        error_message = f"{api_error_msg} (碼: {e.response.status_code if e.response else 'N/A'})"
+    except (ValueError, json.JSONDecodeError):
+        pass
+    return error_message
+
+
+def _candidate_text(candidate):
+    parts = (candidate.get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def call_gemini_api(prompt_text, api_key, generation_config_override=None, safety_settings_override=None):
+    """
+    通用 Gemini API 調用函數。
+    """
+    GEMINI_API_URL, payload = _gemini_request(prompt_text, api_key, "generateContent", generation_config_override, safety_settings_override)
     headers = {'Content-Type': 'application/json'}
 
     try:
-        response = requests.post(GEMINI_API_URL, headers=headers, data=json.dumps(payload), timeout=180)
+        response = get_http_session().post(GEMINI_API_URL, headers=headers, data=json.dumps(payload), timeout=get_timeout())
         response.raise_for_status()
         result_json = response.json()
 
@@ -64,14 +102,7 @@ def call_gemini_api(prompt_text, api_key, generation_config_override=None, safet
             return {"error": "API 回應格式不符合預期。", "raw_response": result_json}
 
     except requests.exceptions.HTTPError as e:
-        error_message = f"API 請求失敗 (碼: {e.response.status_code if e.response else 'N/A'})"
-        try:
-            error_detail = e.response.json()
-            api_error_msg = error_detail.get("error", {}).get("message", "API 金鑰無效或請求錯誤。")
-            error_message = f"{api_error_msg} (碼: {e.response.status_code if e.response else 'N/A'})"
-        except (ValueError, json.JSONDecodeError):
-            pass
-        return {"error": error_message}
+        return {"error": _http_error_message(e)}
     except requests.exceptions.RequestException as e:
         return {"error": f"網路或請求錯誤: {e}"}
     except Exception as e:
@@ -79,27 +110,101 @@ def call_gemini_api(prompt_text, api_key, generation_config_override=None, safet
         return {"error": f"處理 API 請求時發生未知錯誤: {e}"}
 
 
+def stream_gemini_api(prompt_text, api_key, generation_config_override=None, safety_settings_override=None):
+    """
+    以串流方式調用 Gemini API (server-sent events)，模型每產生一段文字就返回 {"text": ...}；
+    結束時返回 {"text": "", "finish_reason": ...}，發生錯誤時返回 {"error": ...} 並結束。
+    """
+    GEMINI_API_URL, payload = _gemini_request(prompt_text, api_key, "streamGenerateContent", generation_config_override, safety_settings_override)
+    headers = {'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+
+    try:
+        with get_http_session().post(f"{GEMINI_API_URL}&alt=sse", headers=headers, data=json.dumps(payload),
+                                     timeout=get_timeout(), stream=True) as response:
+            if not response.ok:
+                response.content  # 連線關閉前讀取錯誤內容，供錯誤訊息使用
+            response.raise_for_status()
+            finish_reason = "UNKNOWN"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                result_json = json.loads(line[5:])
+                if result_json.get("candidates"):
+                    candidate = result_json["candidates"][0]
+                    finish_reason = candidate.get("finishReason", finish_reason)
+                    text_content = _candidate_text(candidate)
+                    if text_content:
+                        yield {"text": text_content}
+                elif result_json.get("promptFeedback", {}).get("blockReason"):
+                    block_reason = result_json["promptFeedback"]["blockReason"]
+                    safety_ratings = result_json["promptFeedback"].get("safetyRatings", [])
+                    yield {"error": f"提示詞被拒絕。原因：{block_reason}。安全評級: {safety_ratings}"}
+                    return
+            yield {"text": "", "finish_reason": finish_reason}
+
+    except requests.exceptions.HTTPError as e:
+        yield {"error": _http_error_message(e)}
+    except requests.exceptions.RequestException as e:
+        yield {"error": f"網路或請求錯誤: {e}"}
+    except Exception as e:
+        current_app.logger.error(f"處理串流 API 請求時發生未知錯誤: {e}", exc_info=True)
+        yield {"error": f"處理 API 請求時發生未知錯誤: {e}"}
+
+
 def get_sheep_info_for_context(ear_num, user_id):
     """
     獲取指定羊隻的資訊，用於組合AI提示詞。
+    結果以 (用戶, 耳號) 快取於目前的數據版本下，羊隻、事件或歷史數據寫入後自動失效；
+    返回的字典為共用的快取內容，呼叫端不可修改。
     """
     if not ear_num: return None
-    
-    sheep_info = Sheep.query.filter_by(EarNum=ear_num, user_id=user_id).first()
-    if not sheep_info: return None
-    
-    sheep_dict = sheep_info.to_dict()
-    
-    # 獲取最近的5條事件記錄
-    recent_events = SheepEvent.query.filter_by(sheep_id=sheep_info.id)\
-        .order_by(SheepEvent.event_date.desc(), SheepEvent.id.desc())\
-        .limit(5).all()
-    sheep_dict['recent_events'] = [event.to_dict() for event in recent_events]
-    
-    # 獲取最近的10條歷史數據
-    history_records = SheepHistoricalData.query.filter_by(
-        sheep_id=sheep_info.id, user_id=user_id
-    ).order_by(SheepHistoricalData.record_date.desc()).limit(10).all()
-    sheep_dict['history_records'] = [rec.to_dict() for rec in history_records]
+    return cached_for_user('sheep_context', user_id, lambda: _load_sheep_context(ear_num, user_id), extra_key=ear_num)
+
+
+# 近期事件與歷史數據合併查詢時的共用欄位 (不存在的欄位以 NULL 補齊)
+_CONTEXT_EVENT_FIELDS = [c.name for c in SheepEvent.__table__.columns]
+_CONTEXT_HISTORY_FIELDS = [c.name for c in SheepHistoricalData.__table__.columns]
+_CONTEXT_FIELDS = list(dict.fromkeys(_CONTEXT_EVENT_FIELDS + _CONTEXT_HISTORY_FIELDS))
+
+
+def _context_records(model, kind, date_column, sheep_id, limit, *criteria):
+    """單隻羊依日期倒序的最近記錄，欄位對齊為 _CONTEXT_FIELDS"""
+    table = model.__table__
+    ranked = select(table).where(table.c.sheep_id == sheep_id, *criteria)\
+        .order_by(table.c[date_column].desc(), table.c.id.desc()).limit(limit).subquery()
+    return select(
+        literal(kind).label('kind'), ranked.c[date_column].label('sort_date'),
+        *[(ranked.c[name] if name in ranked.c else null()).label(name) for name in _CONTEXT_FIELDS]
+    )
+
+
+def _load_sheep_context(ear_num, user_id):
+    """以單一查詢載入羊隻、最近 5 條事件與最近 10 條歷史數據"""
+    sheep_id = select(Sheep.id).where(Sheep.user_id == user_id, Sheep.EarNum == ear_num).scalar_subquery()
+    records = union_all(
+        _context_records(SheepEvent, 'event', 'event_date', sheep_id, 5),
+        _context_records(SheepHistoricalData, 'history', 'record_date', sheep_id, 10, SheepHistoricalData.user_id == user_id),
+    ).subquery()
+    rows = db.session.execute(
+        select(Sheep, records)
+        .outerjoin(records, records.c.sheep_id == Sheep.id)
+        .where(Sheep.user_id == user_id, Sheep.EarNum == ear_num)
+        .order_by(records.c.kind, records.c.sort_date.desc(), records.c.id.desc())
+    ).all()
+    if not rows: return None
+
+    sheep_dict = _json_ready(rows[0][0].to_dict())
+    sheep_dict['recent_events'] = []
+    sheep_dict['history_records'] = []
+    for row in rows:
+        record = row._mapping
+        if record['kind'] == 'event':
+            sheep_dict['recent_events'].append(_json_ready({name: record[name] for name in _CONTEXT_EVENT_FIELDS}))
+        elif record['kind'] == 'history':
+            sheep_dict['history_records'].append(_json_ready({name: record[name] for name in _CONTEXT_HISTORY_FIELDS}))
+    return sheep_dict
+
 
-    return sheep_dict
\ No newline at end of file
+def _json_ready(values):
+    """日期時間轉為 ISO 字串，使快取內容可序列化為 JSON"""
+    return {key: value.isoformat() if isinstance(value, (date, datetime)) else value for key, value in values.items()}
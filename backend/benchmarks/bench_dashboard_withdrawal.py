@@ -0,0 +1,110 @@
+"""
+儀表板停藥期提醒效能基準測試：比較舊版 (讀取全部用藥事件後在 Python 計算結束日)
+與以 withdrawal_end_date 索引只讀取停藥中事件的新版。
+
+使用方式 (於 backend 目錄下)：
+    python -m benchmarks.bench_dashboard_withdrawal --events 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import db  # noqa: E402
+from app.models import User, Sheep, SheepEvent  # noqa: E402
+from app.reminders import compute_withdrawal_end_date  # noqa: E402
+from benchmarks.bench_export import create_bench_app  # noqa: E402
+
+
+def seed(sheep_count, event_count, medicated_ratio):
+    """產生橫跨約五年的事件，其中部分為有停藥期的用藥事件"""
+    user = User(username='bench')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+
+    db.session.execute(insert(Sheep), [
+        {'user_id': user.id, 'EarNum': f'B{i:06d}'} for i in range(sheep_count)
+    ])
+    sheep_ids = [sid for (sid,) in db.session.query(Sheep.id).order_by(Sheep.id)]
+    start = date.today() - timedelta(days=5 * 365)
+    step = max(1, int(1 / medicated_ratio))
+    rows = []
+    for i in range(event_count):
+        event_date = (start + timedelta(days=i * 5 * 365 // event_count)).strftime('%Y-%m-%d')
+        withdrawal_days = 7 + i % 21 if i % step == 0 else None
+        rows.append({
+            'user_id': user.id, 'sheep_id': sheep_ids[i % sheep_count], 'event_date': event_date,
+            'event_type': '藥物治療' if withdrawal_days else '疫苗接種', 'medication': '抗生素' if withdrawal_days else None,
+            'withdrawal_days': withdrawal_days, 'withdrawal_end_date': compute_withdrawal_end_date(event_date, withdrawal_days)
+        })
+    db.session.execute(insert(SheepEvent), rows)
+    db.session.commit()
+    return user.id
+
+
+def legacy_withdrawals(user_id, today):
+    """重現舊版 get_dashboard_data 的停藥期計算"""
+    rows = db.session.query(
+        Sheep.EarNum, SheepEvent.event_date, SheepEvent.medication, SheepEvent.withdrawal_days
+    ).join(Sheep, Sheep.id == SheepEvent.sheep_id)\
+     .filter(Sheep.user_id == user_id, SheepEvent.withdrawal_days != None, SheepEvent.withdrawal_days > 0).all()
+    result = []
+    for row in rows:
+        end_date = datetime.strptime(row.event_date, '%Y-%m-%d').date() + timedelta(days=row.withdrawal_days)
+        if end_date >= today:
+            result.append((row.EarNum, row.medication, end_date))
+    return sorted(result)
+
+
+def indexed_withdrawals(user_id, today):
+    rows = db.session.query(
+        Sheep.EarNum, SheepEvent.medication, SheepEvent.withdrawal_end_date
+    ).join(Sheep, Sheep.id == SheepEvent.sheep_id)\
+     .filter(SheepEvent.user_id == user_id, SheepEvent.withdrawal_end_date >= today).all()
+    return sorted(tuple(row) for row in rows)
+
+
+def measure(label, func, user_id, today, repeat):
+    func(user_id, today)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(user_id, today)
+    seconds = (time.perf_counter() - start) / repeat
+    print(f"{label:<8} rows={len(result):<6} {seconds * 1000:8.2f} ms/request")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sheep', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--medicated', type=float, default=0.2, help='有停藥期的事件比例')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_bench_app(db_path)
+    try:
+        with app.app_context():
+            db.create_all()
+            user_id = seed(args.sheep, args.events, args.medicated)
+            today = date.today()
+            print(f"fixture: {args.sheep} sheep, {args.events} events ({args.medicated:.0%} with withdrawal period)")
+            legacy = measure('legacy', legacy_withdrawals, user_id, today, args.repeat)
+            indexed = measure('indexed', indexed_withdrawals, user_id, today, args.repeat)
+            print(f"output={'same' if legacy == indexed else 'DIFFERENT'}")
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
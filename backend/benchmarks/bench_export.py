@@ -0,0 +1,142 @@
+"""
+匯出效能基準測試：比較舊版 export_excel (重複查詢 + sheep_map) 與以 JOIN 單次讀取的新版。
+
+使用方式 (於 backend 目錄下)：
+    python -m benchmarks.bench_export --sheep 2000 --events 24000 --history 24000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import pandas as pd
+from flask import Flask
+from sqlalchemy import event, insert
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import db  # noqa: E402
+from app.exporters import read_export_frames  # noqa: E402
+from app.models import User, Sheep, SheepEvent, SheepHistoricalData, ChatHistory  # noqa: E402
+
+
+def create_bench_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(sheep_count, event_count, history_count):
+    user = User(username='bench')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.commit()
+
+    db.session.execute(insert(Sheep), [
+        {'user_id': user.id, 'EarNum': f'B{i:06d}', 'Breed': '波爾羊', 'Sex': '母', 'Body_Weight_kg': 40.0}
+        for i in range(sheep_count)
+    ])
+    sheep_ids = [sid for (sid,) in db.session.query(Sheep.id).order_by(Sheep.id)]
+    db.session.execute(insert(SheepEvent), [
+        {'user_id': user.id, 'sheep_id': sheep_ids[i % sheep_count], 'event_date': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}', 'event_type': '疫苗接種', 'description': '例行接種'}
+        for i in range(event_count)
+    ])
+    db.session.execute(insert(SheepHistoricalData), [
+        {'user_id': user.id, 'sheep_id': sheep_ids[i % sheep_count], 'record_date': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}', 'record_type': 'milk_yield_kg_day', 'value': 2.5}
+        for i in range(history_count)
+    ])
+    db.session.execute(insert(ChatHistory), [
+        {'user_id': user.id, 'session_id': 's', 'role': 'user', 'content': '你好'} for _ in range(100)
+    ])
+    db.session.commit()
+    return user.id
+
+
+def legacy_frames(user_id):
+    """重現舊版 export_excel 的查詢方式 (查詢的次數與順序與舊版相同)"""
+    db_engine = db.engine
+    sheep_query = Sheep.query.filter_by(user_id=user_id).order_by(Sheep.EarNum)
+    events_query = SheepEvent.query.join(Sheep).filter(Sheep.user_id == user_id).order_by(Sheep.EarNum, SheepEvent.event_date.desc())
+    history_query = SheepHistoricalData.query.join(Sheep).filter(Sheep.user_id == user_id).order_by(Sheep.EarNum, SheepHistoricalData.record_date)
+    chat_query = ChatHistory.query.filter_by(user_id=user_id).order_by(ChatHistory.timestamp)
+
+    df_sheep = pd.read_sql(sheep_query.statement, db_engine) if sheep_query.first() else pd.DataFrame()
+    df_events = pd.read_sql(events_query.statement, db_engine) if events_query.first() else pd.DataFrame()
+    df_history = pd.read_sql(history_query.statement, db_engine) if history_query.first() else pd.DataFrame()
+    df_chat = pd.read_sql(chat_query.statement, db_engine) if chat_query.first() else pd.DataFrame()
+
+    frames = [('Sheep_Basic_Info', df_sheep)]
+    sheep_map = None
+    if not df_events.empty:
+        sheep_map = {s.id: s.EarNum for s in sheep_query.all()}
+        df_events['EarNum'] = df_events['sheep_id'].map(sheep_map)
+        frames.append(('Sheep_Events_Log', df_events[['EarNum'] + [c for c in df_events.columns if c not in ['EarNum', 'sheep_id']]]))
+    if not df_history.empty:
+        # 舊版在事件工作表已建立 sheep_map 時沿用，不再查詢
+        if sheep_map is None:
+            sheep_map = {s.id: s.EarNum for s in sheep_query.all()}
+        df_history['EarNum'] = df_history['sheep_id'].map(sheep_map)
+        frames.append(('Sheep_Historical_Data', df_history[['EarNum'] + [c for c in df_history.columns if c not in ['EarNum', 'sheep_id']]]))
+    frames.append(('Chat_History', df_chat))
+    return frames
+
+
+def write_xlsx(frames):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for sheet_name, df in frames:
+            if not df.empty:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return output.getbuffer().nbytes
+
+
+def measure(label, build_frames, user_id, write):
+    queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        frames = build_frames(user_id)
+        fetch_seconds = time.perf_counter() - start
+        size = write_xlsx(frames) if write else 0
+        total_seconds = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    db.session.remove()
+
+    rows = sum(len(df) for _, df in frames)
+    print(f"{label:<8} queries={len(queries):<3} rows={rows:<7} fetch={fetch_seconds:7.3f}s total={total_seconds:7.3f}s xlsx={size / 1e6:6.2f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sheep', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=24000)
+    parser.add_argument('--history', type=int, default=24000)
+    parser.add_argument('--skip-xlsx', action='store_true', help='只量測資料讀取，不寫出 xlsx')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_bench_app(db_path)
+    try:
+        with app.app_context():
+            db.create_all()
+            user_id = seed(args.sheep, args.events, args.history)
+            print(f"fixture: {args.sheep} sheep, {args.events} events, {args.history} history rows")
+            measure('legacy', legacy_frames, user_id, not args.skip_xlsx)
+            measure('join', read_export_frames, user_id, not args.skip_xlsx)
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
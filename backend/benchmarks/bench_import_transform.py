@@ -0,0 +1,146 @@
+"""
+導入轉換效能基準測試：比較舊版逐列 (format_date / map.get / float()) 與以欄為單位的向量化轉換，
+以每秒處理列數表示。只量測轉換本身，不含讀取 Excel 與寫入資料庫。
+
+使用方式 (於 backend 目錄下)：
+    python -m benchmarks.bench_import_transform --rows 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.import_engine import (  # noqa: E402
+    DEFAULT_IMPORT_CONFIG, PROTECTED_SHEEP_FIELDS, _SKIP, _build_record_rows, _transform_basic_chunk, format_date
+)
+from app.models import Sheep  # noqa: E402
+
+
+def make_frames(rows, sheep_count):
+    """產生與 ExcelWorkbookSource 輸出相同型態 (字串或 None) 的測試工作表"""
+    rng = np.random.default_rng(0)
+    ear_nums = np.array([f'B{i:06d}' for i in range(sheep_count)], dtype=object)
+    days = pd.date_range('2020-01-01', periods=1500).strftime('%Y-%m-%d %H:%M:%S').to_numpy(dtype=object)
+
+    def dates(sentinel_ratio=0.05):
+        values = days[rng.integers(0, len(days), rows)]
+        values[rng.random(rows) < sentinel_ratio] = '1900-01-01 00:00:00'
+        values[rng.random(rows) < 0.02] = None
+        return values
+
+    ears = ear_nums[rng.integers(0, sheep_count, rows)]
+    milk = rng.uniform(0.5, 4.5, rows).round(2).astype(str).astype(object)
+    milk[rng.random(rows) < 0.02] = None
+    return {
+        'basic_info': pd.DataFrame({
+            'EarNum': ears, 'Breed': rng.integers(1, 6, rows).astype(str), 'Sex': rng.integers(1, 3, rows).astype(str),
+            'BirthDate': dates(), 'MoveDate': dates(0.5), 'BirWei': milk, 'FarmNum': 'F001'
+        }),
+        'milk_yield_record': pd.DataFrame({'EarNum': ears, 'MeaDate': dates(), 'Milk': milk}),
+        'kidding_record': pd.DataFrame({'EarNum': ears, 'YeanDate': dates(), 'KidNum': rng.integers(1, 4, rows).astype(str)}),
+        'yean_record': pd.DataFrame({'EarNum': ears, 'YeanDate': dates(), 'DryOffDate': dates(0.3), 'Lactation': rng.integers(1, 6, rows).astype(str)}),
+    }, {ear: i + 1 for i, ear in enumerate(ear_nums)}
+
+
+def legacy_basic(records, cols, breed_map, sex_map):
+    """重現舊版 _import_basic_chunk 中逐列轉換欄位的迴圈"""
+    sheep_columns = set(Sheep.__table__.columns.keys()) - set(PROTECTED_SHEEP_FIELDS)
+    out = []
+    for row in records:
+        values = {}
+        for db_field, xls_col in cols.items():
+            if db_field in sheep_columns and xls_col in row and row[xls_col] is not None:
+                value = row[xls_col]
+                if db_field == 'Breed': value = breed_map.get(str(value), value)
+                elif db_field == 'Sex': value = sex_map.get(str(value), value)
+                elif 'Date' in db_field: value = format_date(value)
+                values[db_field] = value
+        out.append(values)
+    return out
+
+
+def vectorized_basic(chunk, cols, breed_map, sex_map):
+    return [
+        {field: value for field, value in fields.items() if value is not _SKIP}
+        for fields in _transform_basic_chunk(chunk, cols, breed_map, sex_map).to_dict(orient='records')
+    ]
+
+
+def legacy_records(records, purpose, cols, user_id, sheep_ids):
+    """重現舊版逐列 _build_record_rows"""
+    events, histories = [], []
+    for row in records:
+        sheep_id = sheep_ids.get(row.get(cols.get('EarNum')))
+        if not sheep_id: continue
+        event_type, event_desc, event_date_val = None, None, None
+        hist_type, hist_value, hist_date_val = None, None, None
+        if purpose == 'kidding_record':
+            event_type, event_date_val = '產仔', row.get(cols.get('YeanDate'))
+            event_desc = f"產下仔羊: {row.get(cols.get('KidNum'))}" if cols.get('KidNum') in row else None
+        elif purpose == 'yean_record':
+            yean_date = format_date(row.get(cols.get('YeanDate')))
+            dry_off_date = format_date(row.get(cols.get('DryOffDate')))
+            lactation = row.get(cols.get('Lactation'))
+            if yean_date:
+                events.append({'user_id': user_id, 'sheep_id': sheep_id, 'event_date': yean_date, 'event_type': '泌乳開始', 'description': f"第 {lactation} 胎次"})
+            if dry_off_date:
+                events.append({'user_id': user_id, 'sheep_id': sheep_id, 'event_date': dry_off_date, 'event_type': '乾乳', 'description': f"第 {lactation} 胎次結束"})
+            continue
+        elif purpose == 'milk_yield_record':
+            hist_type, hist_date_val, hist_value = 'milk_yield_kg_day', row.get(cols.get('MeaDate')), row.get(cols.get('Milk'))
+        formatted_date = format_date(event_date_val or hist_date_val)
+        if not formatted_date: continue
+        if event_type:
+            events.append({'user_id': user_id, 'sheep_id': sheep_id, 'event_date': formatted_date, 'event_type': event_type, 'description': event_desc})
+        elif hist_type and hist_value is not None:
+            try:
+                value = float(hist_value)
+            except (ValueError, TypeError):
+                continue
+            histories.append({'user_id': user_id, 'sheep_id': sheep_id, 'record_date': formatted_date, 'record_type': hist_type, 'value': value})
+    return events, histories
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--sheep', type=int, default=2000)
+    args = parser.parse_args()
+
+    frames, sheep_ids = make_frames(args.rows, args.sheep)
+    sheets = {config['purpose']: config['columns'] for config in DEFAULT_IMPORT_CONFIG['sheets'].values()}
+    breed_map = {str(i): f'品種{i}' for i in range(1, 6)}
+    sex_map = {'1': '公', '2': '母'}
+    print(f"fixture: {args.rows} rows per sheet, {args.sheep} sheep")
+
+    for purpose, chunk in frames.items():
+        cols = sheets[purpose]
+        # 舊版在轉換前先以 to_dict 轉為逐列字典，計入舊版時間
+        if purpose == 'basic_info':
+            legacy, legacy_seconds = timed(lambda: legacy_basic(chunk.to_dict(orient='records'), cols, breed_map, sex_map))
+            new, new_seconds = timed(lambda: vectorized_basic(chunk, cols, breed_map, sex_map))
+        else:
+            legacy, legacy_seconds = timed(lambda: legacy_records(chunk.to_dict(orient='records'), purpose, cols, 1, sheep_ids))
+            new, new_seconds = timed(lambda: _build_record_rows(chunk, purpose, cols, 1, sheep_ids))
+        status = 'same' if legacy == new else 'DIFFERENT'
+        print(
+            f"{purpose:<18} legacy={len(chunk) / legacy_seconds:>10,.0f} rows/s  "
+            f"vectorized={len(chunk) / new_seconds:>10,.0f} rows/s  "
+            f"speedup={legacy_seconds / new_seconds:5.1f}x  output={status}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Index event and history rows by user, type and date for rollup recomputes
+
+Revision ID: 3f9c1d7a2e64
+Revises: 9d4b2e6f1a73
+Create Date: 2026-10-18 09:41:17.530284
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d7a2e64'
+down_revision = '9d4b2e6f1a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (user_id, event_type) 為新索引的前綴，依類型統計事件的查詢改用新索引
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_event_user_event_type')
+        batch_op.create_index('ix_sheep_event_user_event_type_date', ['user_id', 'event_type', 'event_date'], unique=False)
+
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.create_index('ix_sheep_historical_data_user_type_date', ['user_id', 'record_type', 'record_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_historical_data_user_type_date')
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_event_user_event_type_date')
+        batch_op.create_index('ix_sheep_event_user_event_type', ['user_id', 'event_type'], unique=False)
@@ -0,0 +1,147 @@
+"""Convert string date fields to DATE columns
+
+Revision ID: 44cd75712a74
+Revises: c6d2a9f4e817
+Create Date: 2026-10-17 18:42:17.905316
+
+"""
+from datetime import date, datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '44cd75712a74'
+down_revision = 'c6d2a9f4e817'
+branch_labels = None
+depends_on = None
+
+# 資料表 -> (可為空的日期欄位, 不可為空的日期欄位)；羊隻的提醒日期已於 7d2f6b1e9c48 轉為 DATE
+DATE_COLUMNS = {
+    'sheep': (('BirthDate', 'MoveDate'), ()),
+    'sheep_event': ((), ('event_date',)),
+    'sheep_historical_data': ((), ('record_date',)),
+    'history_daily_rollup': ((), ('record_date',)),
+    'event_daily_rollup': ((), ('event_date',)),
+}
+
+_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S')
+
+
+def _parse(value):
+    """與 app.models.parse_date_value 相同的規則；'1900' 開頭代表 Excel 空值，無法解析時返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text or text.startswith('1900'):
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _fallback_date(recorded_at):
+    """不可為空的日期無法解析時，改用記錄建立日期"""
+    parsed = _parse(recorded_at[:10] if isinstance(recorded_at, str) else recorded_at)
+    return (parsed or date(1970, 1, 1)).isoformat()
+
+
+def _normalize(bind, table, nullable, required):
+    """將日期字串統一為 YYYY-MM-DD；無法解析的值設為 NULL (或不可為空時以建立日期代替)"""
+    columns = nullable + required
+    extra = ', recorded_at' if table in ('sheep_event', 'sheep_historical_data') else ''
+    select = ', '.join(f'"{c}"' for c in columns)
+    rows = bind.execute(sa.text(f'SELECT id, {select}{extra} FROM {table}')).fetchall()
+    updates = []
+    for row in rows:
+        values = {}
+        for index, column in enumerate(columns, start=1):
+            raw = row[index]
+            parsed = _parse(raw)
+            if parsed is not None:
+                value = parsed.isoformat()
+            elif column in required:
+                value = _fallback_date(row[-1] if extra else None)
+            else:
+                value = None
+            if value != raw:
+                values[column] = value
+        if values:
+            updates.append((row[0], values))
+    for row_id, values in updates:
+        assignments = ', '.join(f'"{c}" = :{c}' for c in values)
+        bind.execute(sa.text(f'UPDATE {table} SET {assignments} WHERE id = :id'), {'id': row_id, **values})
+
+
+def _recompute_withdrawal_end_dates(bind):
+    """event_date 修正後重新計算停藥期結束日"""
+    rows = bind.execute(sa.text(
+        "SELECT id, event_date, withdrawal_days FROM sheep_event WHERE withdrawal_days > 0"
+    )).fetchall()
+    updates = [
+        {'id': row[0], 'withdrawal_end_date': date.fromisoformat(str(row[1])[:10]) + timedelta(days=row[2])}
+        for row in rows
+    ]
+    if updates:
+        bind.execute(sa.text("UPDATE sheep_event SET withdrawal_end_date = :withdrawal_end_date WHERE id = :id"), updates)
+
+
+def _fill_rollups():
+    """以正規化後的日期重建每日彙總 (與 flask rebuild-rollups 相同)"""
+    op.execute(
+        "INSERT INTO history_daily_rollup (user_id, record_date, record_type, count, sum, min, max) "
+        "SELECT user_id, record_date, record_type, COUNT(id), SUM(value), MIN(value), MAX(value) "
+        "FROM sheep_historical_data GROUP BY user_id, record_date, record_type"
+    )
+    op.execute(
+        "INSERT INTO event_daily_rollup (user_id, event_date, event_type, count) "
+        "SELECT user_id, event_date, event_type, COUNT(id) FROM sheep_event GROUP BY user_id, event_date, event_type"
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table, (nullable, required) in DATE_COLUMNS.items():
+        if table.endswith('_rollup'): continue
+        _normalize(bind, table, nullable, required)
+    _recompute_withdrawal_end_dates(bind)
+    # 正規化可能合併原本不同的日期鍵，彙總表清空後於轉型完成時重建
+    op.execute("DELETE FROM history_daily_rollup")
+    op.execute("DELETE FROM event_daily_rollup")
+
+    sqlite = bind.dialect.name == 'sqlite'
+    for table, (nullable, required) in DATE_COLUMNS.items():
+        # SQLite 的 DATE 即以 YYYY-MM-DD 文字保存；重建資料表時若 CAST AS DATE 會被當作數值截斷為年份，
+        # 因此以 reflect_args 將原欄位視為 DATE，直接複製資料
+        reflect_args = [sa.Column(c, sa.Date(), nullable=c in nullable) for c in nullable + required] if sqlite else ()
+        with op.batch_alter_table(table, schema=None, reflect_args=reflect_args) as batch_op:
+            for column in nullable + required:
+                batch_op.alter_column(column,
+                       existing_type=sa.String(length=50),
+                       type_=sa.Date(),
+                       existing_nullable=column in nullable,
+                       postgresql_using=f'"{column}"::date')
+
+    _fill_rollups()
+
+
+def downgrade():
+    for table, (nullable, required) in DATE_COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in nullable + required:
+                batch_op.alter_column(column,
+                       existing_type=sa.Date(),
+                       type_=sa.String(length=50),
+                       existing_nullable=column in nullable)
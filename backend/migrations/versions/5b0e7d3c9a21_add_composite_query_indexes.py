@@ -0,0 +1,39 @@
+"""Add composite indexes for event, history and chat queries
+
+Revision ID: 5b0e7d3c9a21
+Revises: 44cd75712a74
+Create Date: 2026-10-18 00:12:36.204718
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0e7d3c9a21'
+down_revision = '44cd75712a74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.create_index('ix_sheep_event_sheep_event_date', ['sheep_id', 'event_date', 'id'], unique=False)
+        batch_op.create_index('ix_sheep_event_user_event_type', ['user_id', 'event_type'], unique=False)
+
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.create_index('ix_sheep_historical_data_sheep_user_record_date', ['sheep_id', 'user_id', 'record_date', 'id'], unique=False)
+
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_history_user_session_timestamp', ['user_id', 'session_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_history_user_session_timestamp')
+
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_historical_data_sheep_user_record_date')
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_event_user_event_type')
+        batch_op.drop_index('ix_sheep_event_sheep_event_date')
@@ -0,0 +1,48 @@
+"""Add agent response cache and hit counters
+
+Revision ID: 7c1e9a4f2b58
+Revises: 5b0e7d3c9a21
+Create Date: 2026-10-18 09:27:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e9a4f2b58'
+down_revision = '5b0e7d3c9a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('agent_response_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('prompt_hash', sa.String(length=64), nullable=False),
+    sa.Column('endpoint', sa.String(length=50), nullable=False),
+    sa.Column('response_text', sa.Text(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('prompt_hash')
+    )
+    with op.batch_alter_table('agent_response_cache', schema=None) as batch_op:
+        batch_op.create_index('ix_agent_response_cache_last_used_at', ['last_used_at'], unique=False)
+
+    op.create_table('agent_cache_stat',
+    sa.Column('endpoint', sa.String(length=50), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('misses', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('endpoint')
+    )
+
+
+def downgrade():
+    op.drop_table('agent_cache_stat')
+    with op.batch_alter_table('agent_response_cache', schema=None) as batch_op:
+        batch_op.drop_index('ix_agent_response_cache_last_used_at')
+
+    op.drop_table('agent_response_cache')
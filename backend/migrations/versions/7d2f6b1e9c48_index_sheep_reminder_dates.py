@@ -0,0 +1,87 @@
+"""Store sheep reminder dates in indexed DATE columns
+
+Revision ID: 7d2f6b1e9c48
+Revises: f3a7c2d91b46
+Create Date: 2026-10-17 16:41:12.093517
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f6b1e9c48'
+down_revision = 'f3a7c2d91b46'
+branch_labels = None
+depends_on = None
+
+# 與 app.reminders.REMINDER_FIELDS 相同的欄位
+REMINDER_FIELDS = ('next_vaccination_due_date', 'next_deworming_due_date', 'expected_lambing_date')
+
+_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S')
+
+
+def _parse(value):
+    """與 app.models.parse_date_value 相同的規則；'1900' 開頭代表 Excel 空值，無法解析時返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text or text.startswith('1900'):
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in _FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize(bind):
+    """將提醒日期統一為 YYYY-MM-DD；無法解析的日期設為 NULL (不產生提醒)"""
+    rows = bind.execute(sa.text(f"SELECT id, {', '.join(REMINDER_FIELDS)} FROM sheep")).fetchall()
+    for row in rows:
+        values = {}
+        for field, raw in zip(REMINDER_FIELDS, row[1:]):
+            parsed = _parse(raw)
+            value = parsed.isoformat() if parsed else None
+            if value != raw:
+                values[field] = value
+        if values:
+            assignments = ', '.join(f'{field} = :{field}' for field in values)
+            bind.execute(sa.text(f'UPDATE sheep SET {assignments} WHERE id = :id'), {'id': row[0], **values})
+
+
+def upgrade():
+    bind = op.get_bind()
+    _normalize(bind)
+
+    # SQLite 重建資料表時若 CAST AS DATE 會被當作數值截斷為年份，以 reflect_args 將原欄位視為 DATE 直接複製
+    reflect_args = [sa.Column(field, sa.Date(), nullable=True) for field in REMINDER_FIELDS] if bind.dialect.name == 'sqlite' else ()
+    with op.batch_alter_table('sheep', schema=None, reflect_args=reflect_args) as batch_op:
+        for field in REMINDER_FIELDS:
+            batch_op.alter_column(field,
+                   existing_type=sa.String(length=50),
+                   type_=sa.Date(),
+                   existing_nullable=True,
+                   postgresql_using=f'{field}::date')
+            batch_op.create_index(f'ix_sheep_user_{field}', ['user_id', field], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sheep', schema=None) as batch_op:
+        for field in reversed(REMINDER_FIELDS):
+            batch_op.drop_index(f'ix_sheep_user_{field}')
+            batch_op.alter_column(field,
+                   existing_type=sa.Date(),
+                   type_=sa.String(length=50),
+                   existing_nullable=True)
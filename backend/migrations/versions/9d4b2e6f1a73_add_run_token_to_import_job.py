@@ -0,0 +1,26 @@
+"""Add run_token to import_job for run ownership
+
+Revision ID: 9d4b2e6f1a73
+Revises: 7c1e9a4f2b58
+Create Date: 2026-10-18 14:06:52.731940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b2e6f1a73'
+down_revision = '7c1e9a4f2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('run_token', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.drop_column('run_token')
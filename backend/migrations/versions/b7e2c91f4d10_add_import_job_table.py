@@ -0,0 +1,38 @@
+"""Add import_job table for background Excel imports
+
+Revision ID: b7e2c91f4d10
+Revises: a6d3b4664bd0
+Create Date: 2026-10-17 09:12:44.120531
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c91f4d10'
+down_revision = 'a6d3b4664bd0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_job',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('config', sa.JSON(), nullable=False),
+        sa.Column('rows_processed', sa.JSON(), nullable=True),
+        sa.Column('report_details', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('import_job')
@@ -0,0 +1,51 @@
+"""Add indexed withdrawal_end_date to sheep_event
+
+Revision ID: b91f5e27d6a3
+Revises: 7d2f6b1e9c48
+Create Date: 2026-10-17 17:20:44.618290
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b91f5e27d6a3'
+down_revision = '7d2f6b1e9c48'
+branch_labels = None
+depends_on = None
+
+
+def _backfill():
+    """為既有的用藥事件計算停藥期結束日 (與 app.reminders.compute_withdrawal_end_date 相同的規則)"""
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, event_date, withdrawal_days FROM sheep_event WHERE withdrawal_days > 0"
+    )).fetchall()
+    updates = []
+    for row in rows:
+        try:
+            end_date = datetime.strptime(row[1], '%Y-%m-%d').date() + timedelta(days=row[2])
+        except (TypeError, ValueError):
+            continue
+        updates.append({'id': row[0], 'withdrawal_end_date': end_date})
+    if updates:
+        bind.execute(sa.text("UPDATE sheep_event SET withdrawal_end_date = :withdrawal_end_date WHERE id = :id"), updates)
+
+
+def upgrade():
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('withdrawal_end_date', sa.Date(), nullable=True))
+
+    _backfill()
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.create_index('ix_sheep_event_user_withdrawal_end_date', ['user_id', 'withdrawal_end_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_event_user_withdrawal_end_date')
+        batch_op.drop_column('withdrawal_end_date')
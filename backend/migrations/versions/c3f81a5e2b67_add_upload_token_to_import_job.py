@@ -0,0 +1,26 @@
+"""Add upload_token to import_job for cached uploads
+
+Revision ID: c3f81a5e2b67
+Revises: b7e2c91f4d10
+Create Date: 2026-10-17 11:03:27.415902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f81a5e2b67'
+down_revision = 'b7e2c91f4d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upload_token', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_job', schema=None) as batch_op:
+        batch_op.drop_column('upload_token')
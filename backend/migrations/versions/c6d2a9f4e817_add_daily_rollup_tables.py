@@ -0,0 +1,58 @@
+"""Add daily rollup tables for historical data and events
+
+Revision ID: c6d2a9f4e817
+Revises: b91f5e27d6a3
+Create Date: 2026-10-17 18:05:52.440931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d2a9f4e817'
+down_revision = 'b91f5e27d6a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('history_daily_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('record_date', sa.String(length=50), nullable=False),
+    sa.Column('record_type', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=False),
+    sa.Column('max', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'record_type', 'record_date', name='_history_rollup_uc')
+    )
+    op.create_table('event_daily_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_date', sa.String(length=50), nullable=False),
+    sa.Column('event_type', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'event_type', 'event_date', name='_event_rollup_uc')
+    )
+
+    # 以既有資料建立彙總 (與 flask rebuild-rollups 相同)
+    op.execute(
+        "INSERT INTO history_daily_rollup (user_id, record_date, record_type, count, sum, min, max) "
+        "SELECT user_id, record_date, record_type, COUNT(id), SUM(value), MIN(value), MAX(value) "
+        "FROM sheep_historical_data GROUP BY user_id, record_date, record_type"
+    )
+    op.execute(
+        "INSERT INTO event_daily_rollup (user_id, event_date, event_type, count) "
+        "SELECT user_id, event_date, event_type, COUNT(id) FROM sheep_event GROUP BY user_id, event_date, event_type"
+    )
+
+
+def downgrade():
+    op.drop_table('event_daily_rollup')
+    op.drop_table('history_daily_rollup')
@@ -0,0 +1,80 @@
+"""Add fingerprint columns for deduplicating imported events and history
+
+Revision ID: d52a9c7e4f18
+Revises: c3f81a5e2b67
+Create Date: 2026-10-17 13:26:51.803344
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd52a9c7e4f18'
+down_revision = 'c3f81a5e2b67'
+branch_labels = None
+depends_on = None
+
+
+def _fingerprint(sheep_id, record_date, record_type, detail):
+    # 與 app.import_engine.record_fingerprint 相同的規則
+    if detail is None: detail = ''
+    elif isinstance(detail, float): detail = repr(detail)
+    key = '\x1f'.join([str(sheep_id), record_date or '', record_type or '', str(detail)])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _backfill(table, date_column, type_column, detail_column):
+    """
+    為所有既有記錄 (包括手動輸入的記錄，無法與先前的導入區分) 補上指紋，依 id 分批讀寫以限制記憶體用量；
+    之後以單一語句清除重複記錄的指紋，只有最早的一筆保留。
+    """
+    bind = op.get_bind()
+    select_batch = sa.text(
+        f"SELECT id, sheep_id, {date_column}, {type_column}, {detail_column} FROM {table} "
+        f"WHERE id > :last_id ORDER BY id LIMIT :batch_size"
+    )
+    update_row = sa.text(f"UPDATE {table} SET fingerprint = :fingerprint WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}).fetchall()
+        if not rows: break
+        updates = []
+        for row in rows:
+            detail = float(row[4]) if detail_column == 'value' and row[4] is not None else row[4]
+            updates.append({'id': row[0], 'fingerprint': _fingerprint(row[1], row[2], row[3], detail)})
+        bind.execute(update_row, updates)
+        last_id = rows[-1][0]
+    bind.execute(sa.text(
+        f"UPDATE {table} SET fingerprint = NULL WHERE id NOT IN "
+        f"(SELECT MIN(id) FROM {table} WHERE fingerprint IS NOT NULL GROUP BY fingerprint)"
+    ))
+
+
+def upgrade():
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+    _backfill('sheep_event', 'event_date', 'event_type', 'description')
+    _backfill('sheep_historical_data', 'record_date', 'record_type', 'value')
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sheep_event_fingerprint'), ['fingerprint'], unique=True)
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sheep_historical_data_fingerprint'), ['fingerprint'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sheep_historical_data_fingerprint'))
+        batch_op.drop_column('fingerprint')
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sheep_event_fingerprint'))
+        batch_op.drop_column('fingerprint')
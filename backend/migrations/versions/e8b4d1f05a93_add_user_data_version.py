@@ -0,0 +1,26 @@
+"""Add data_version counter to user for ETag support
+
+Revision ID: e8b4d1f05a93
+Revises: d52a9c7e4f18
+Create Date: 2026-10-17 14:48:09.276615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4d1f05a93'
+down_revision = 'd52a9c7e4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
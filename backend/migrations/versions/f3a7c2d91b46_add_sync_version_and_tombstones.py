@@ -0,0 +1,63 @@
+"""Add sync_version to sheep records and sync_tombstone table for incremental sync
+
+Revision ID: f3a7c2d91b46
+Revises: e8b4d1f05a93
+Create Date: 2026-10-17 16:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c2d91b46'
+down_revision = 'e8b4d1f05a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('ear_num', sa.String(length=100), nullable=True),
+    sa.Column('sync_version', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('sync_tombstone', schema=None) as batch_op:
+        batch_op.create_index('ix_sync_tombstone_user_sync_version', ['user_id', 'sync_version'], unique=False)
+
+    with op.batch_alter_table('sheep', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_sheep_user_sync_version', ['user_id', 'sync_version'], unique=False)
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_sheep_event_user_sync_version', ['user_id', 'sync_version'], unique=False)
+
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_sheep_historical_data_user_sync_version', ['user_id', 'sync_version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sheep_historical_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_historical_data_user_sync_version')
+        batch_op.drop_column('sync_version')
+
+    with op.batch_alter_table('sheep_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_event_user_sync_version')
+        batch_op.drop_column('sync_version')
+
+    with op.batch_alter_table('sheep', schema=None) as batch_op:
+        batch_op.drop_index('ix_sheep_user_sync_version')
+        batch_op.drop_column('sync_version')
+
+    with op.batch_alter_table('sync_tombstone', schema=None) as batch_op:
+        batch_op.drop_index('ix_sync_tombstone_user_sync_version')
+
+    op.drop_table('sync_tombstone')
@@ -1,6 +1,7 @@
 import os
 from app import create_app, db
 from app.models import User, Sheep, SheepEvent, ChatHistory
+from app.import_jobs import start_job_supervisor
 
 # 從工廠函數創建 app 實例
 app = create_app()
@@ -32,6 +33,10 @@ if __name__ == '__main__':
     print(f" * Debug mode: {'on' if debug else 'off'}")
     print("===================================================")
     
+    # 重新載入模式下只在實際提供服務的子程序中續跑導入任務
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_supervisor(app)
+
     # 使用 app.run 啟動開發伺服器
     # 在生產環境中，應使用 Gunicorn 或 Waitress
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
@@ -5,6 +5,9 @@
 import pytest
 import tempfile
 import os
+import io
+import shutil
+import pandas as pd
 from app import create_app, db
 from app.models import User, Sheep, SheepEvent
 from werkzeug.security import generate_password_hash
@@ -24,6 +27,7 @@ def app():
     # 創建臨時資料庫文件
     db_fd, db_path = tempfile.mkstemp(suffix='.db')
     os.close(db_fd)  # 立即關閉，讓 SQLite 可以使用
+    upload_cache_dir = tempfile.mkdtemp(prefix='upload_cache_')
     
     # 設置測試配置
     app = create_app()
@@ -31,7 +35,8 @@ def app():
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
         'WTF_CSRF_ENABLED': False,
-        'SECRET_KEY': 'test-secret-key'
+        'SECRET_KEY': 'test-secret-key',
+        'UPLOAD_CACHE_DIR': upload_cache_dir
     })
     
     with app.app_context():
@@ -46,6 +51,7 @@ def app():
         os.unlink(db_path)
     except OSError:
         pass  # 文件可能已經被刪除
+    shutil.rmtree(upload_cache_dir, ignore_errors=True)
 
 
 @pytest.fixture
@@ -173,6 +179,32 @@ def multiple_test_sheep(app, test_user):
         return sheep_list
 
 
+@pytest.fixture
+def make_excel_file():
+    """以 {工作表名稱: [列資料]} 建立記憶體中的 Excel 檔案"""
+    def _make_excel_file(sheets):
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            for sheet_name, rows in sheets.items():
+                pd.DataFrame(rows).to_excel(writer, sheet_name=sheet_name, index=False)
+        output.seek(0)
+        return output
+    return _make_excel_file
+
+
+@pytest.fixture
+def finish_import_job(client):
+    """等待導入任務完成並返回任務狀態"""
+    from app.import_jobs import wait_for_job
+
+    def _finish_import_job(response):
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+        wait_for_job(job_id, timeout=60)
+        return client.get(f'/api/data/jobs/{job_id}').get_json()
+    return _finish_import_job
+
+
 @pytest.fixture
 def mock_gemini_api(monkeypatch):
     """模擬 Gemini API 調用"""
@@ -194,6 +226,7 @@ def mock_gemini_api_error(monkeypatch):
         return {"error": "API 調用失敗"}
     
     monkeypatch.setattr('app.utils.call_gemini_api', mock_call_gemini_api_error)
+    monkeypatch.setattr('app.api.agent.call_gemini_api', mock_call_gemini_api_error)
     return mock_call_gemini_api_error
 
 
@@ -206,5 +239,5 @@ def db_session(app):
 
 @pytest.fixture
 def mock_post(mocker):
-    """模擬requests.post方法"""
-    return mocker.patch('requests.post')
+    """模擬共用 Session 的 post 方法"""
+    return mocker.patch('requests.Session.post')
@@ -275,3 +275,127 @@ class TestAgentAPI:
         data = json.loads(response.data)
         assert 'field_errors' in data
         assert field in data['field_errors']
+
+
+def _read_events(response):
+    """將 server-sent events 回應解析為 (事件, 資料) 列表"""
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if line and not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class TestChatStreaming:
+    """串流聊天測試類別"""
+
+    CHAT = {'api_key': 'test-api-key', 'message': '如何預防腹瀉？', 'session_id': 'stream-session'}
+
+    @pytest.fixture
+    def stream_reply(self, monkeypatch):
+        """模擬模型分段產生回覆，記錄收到的對話內容"""
+        calls = []
+
+        def set_chunks(chunks):
+            def fake_stream(prompt, api_key, generation_config_override=None):
+                calls.append(prompt)
+                yield from chunks
+            monkeypatch.setattr('app.api.agent.stream_gemini_api', fake_stream)
+            return calls
+        return set_chunks
+
+    def test_streams_deltas_and_saves_history_when_done(self, authenticated_client, test_user, stream_reply):
+        """測試逐段返回文字與已完成的 Markdown 區塊，完成後才儲存對話記錄"""
+        stream_reply([
+            {'text': '## 建議\n\n保持'}, {'text': '**乾燥**\n\n- 清潔'}, {'text': '飲水'}, {'text': '', 'finish_reason': 'STOP'}
+        ])
+
+        response = authenticated_client.post('/api/agent/chat/stream', json=self.CHAT)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = _read_events(response)
+        assert [name for name, _ in events] == ['delta', 'delta', 'delta', 'done']
+        assert ''.join(data['text'] for name, data in events if name == 'delta') == '## 建議\n\n保持**乾燥**\n\n- 清潔飲水'
+        assert events[0][1]['html'] == '<h2>建議</h2>'
+        assert events[1][1]['html'] == '<p>保持<strong>乾燥</strong></p>'
+        assert events[1][1]['pending'] == '- 清潔'
+        assert 'pending' not in events[2][1]
+        assert events[2][1]['html'] == ''
+        assert events[-1][1]['html'] == '<ul>\n<li>清潔飲水</li>\n</ul>'
+        assert events[-1][1]['reply_html'] == '<h2>建議</h2>\n<p>保持<strong>乾燥</strong></p>\n<ul>\n<li>清潔飲水</li>\n</ul>'
+
+        history = ChatHistory.query.filter_by(user_id=test_user.id, session_id='stream-session').order_by(ChatHistory.id).all()
+        assert [(h.role, h.content) for h in history] == [('user', '如何預防腹瀉？'), ('model', '## 建議\n\n保持**乾燥**\n\n- 清潔飲水')]
+
+    def test_history_is_sent_to_model(self, authenticated_client, test_user, stream_reply):
+        """測試串流聊天同樣帶入先前的對話與羊隻背景資料"""
+        from app import db
+        db.session.add(ChatHistory(user_id=test_user.id, session_id='stream-session', role='user', content='上一個問題'))
+        db.session.commit()
+        calls = stream_reply([{'text': '好的'}])
+
+        authenticated_client.post('/api/agent/chat/stream', json=self.CHAT).get_data()
+
+        texts = [message['parts'][0]['text'] for message in calls[0]]
+        assert '上一個問題' in texts
+        assert texts[-1] == '如何預防腹瀉？'
+
+    def test_error_is_streamed_and_not_saved(self, authenticated_client, test_user, stream_reply):
+        """測試模型錯誤以 error 事件返回，且不儲存對話記錄"""
+        stream_reply([{'text': '部分'}, {'error': '網路或請求錯誤: timeout'}])
+
+        events = _read_events(authenticated_client.post('/api/agent/chat/stream', json=self.CHAT))
+
+        assert events[-1] == ('error', {'error': '網路或請求錯誤: timeout'})
+        assert ChatHistory.query.filter_by(user_id=test_user.id).count() == 0
+
+    def test_validation_error(self, authenticated_client):
+        """測試請求資料驗證失敗時直接返回 400"""
+        response = authenticated_client.post('/api/agent/chat/stream', json={'api_key': 'k', 'message': '你好'})
+        assert response.status_code == 400
+        assert 'session_id' in response.get_json()['field_errors']
+
+
+class TestIncrementalMarkdown:
+    """逐段 Markdown 轉換測試類別"""
+
+    TEXT = "# 標題\n\n第一段**重點**\n第二行\n\n- a\n- b\n\n```python\nx = 1\n\ny = 2\n```\n\n| a | b |\n|---|---|\n| 1 | 2 |\n\n最後一段"
+
+    @pytest.mark.parametrize('size', [1, 5, 17, 1000])
+    def test_blocks_match_full_render(self, size):
+        """測試任意切分的串流，逐段輸出的區塊與完整轉換結果相同"""
+        from app.markdown_stream import IncrementalMarkdown, render_markdown
+
+        renderer = IncrementalMarkdown()
+        blocks = [renderer.feed(self.TEXT[i:i + size]) for i in range(0, len(self.TEXT), size)] + [renderer.finish()]
+
+        assert '\n'.join(block for block in blocks if block) == render_markdown(self.TEXT)
+        assert renderer.text == self.TEXT
+
+    def test_open_code_block_is_not_rendered(self):
+        """測試尚未結束的程式碼區塊與未完成的段落不會提前輸出"""
+        from app.markdown_stream import IncrementalMarkdown
+
+        renderer = IncrementalMarkdown()
+        assert renderer.feed('說明\n\n```\na = 1\n\n') == '<p>說明</p>'
+        assert renderer.feed('b = 2\n\n') == ''
+        assert renderer.feed('```\n\n1. 第一項\n\n   延續') == '<pre><code>a = 1\n\nb = 2\n\n</code></pre>'
+        assert renderer.feed('\n') == ''
+
+    @pytest.mark.parametrize('chunks', [
+        ['1. 第一項\n\n', '2. 第二項\n\n', '3. 第三項\n'],
+        ['- a\n\n', '- b\n', '\n> 引言\n\n', '> 續\n\n結尾'],
+    ])
+    def test_loose_lists_are_not_split(self, chunks):
+        """測試以空行分隔的清單項目與引言不會被切分成多個元素"""
+        from app.markdown_stream import IncrementalMarkdown, render_markdown
+
+        renderer = IncrementalMarkdown()
+        blocks = [renderer.feed(chunk) for chunk in chunks] + [renderer.finish()]
+
+        html = '\n'.join(block for block in blocks if block)
+        assert html == render_markdown(''.join(chunks))
+        assert html.count('<ol>') + html.count('<ul>') == 1
+        assert blocks[0] == ''
@@ -0,0 +1,131 @@
+"""
+AI 模型呼叫並行上限測試
+以卡住的模型呼叫佔用名額，驗證其他 AI 請求立即返回 503，而一般端點不受影響。
+"""
+
+import threading
+import time
+import pytest
+from app import db
+from app.agent_limiter import run_agent_call
+from app.models import ChatHistory
+
+CHAT = {'api_key': 'test-api-key', 'message': '你好', 'session_id': 'limit-session'}
+
+
+def _login(app):
+    client = app.test_client()
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'testpass'})
+    return client
+
+
+@pytest.fixture
+def blocking_gemini(app, monkeypatch):
+    """模型呼叫在 finish 被設定前不返回；記錄執行模型呼叫的執行緒"""
+    state = {'started': threading.Event(), 'finish': threading.Event(), 'threads': []}
+
+    def slow_call_gemini_api(prompt, api_key, generation_config_override=None, safety_settings_override=None):
+        state['threads'].append(threading.current_thread().name)
+        state['started'].set()
+        state['finish'].wait(10)
+        return {"text": "慢速回應", "finish_reason": "STOP"}
+
+    def slow_stream_gemini_api(prompt, api_key, generation_config_override=None, safety_settings_override=None):
+        state['started'].set()
+        state['finish'].wait(10)
+        yield {"text": "慢速回應"}
+        yield {"text": "", "finish_reason": "STOP"}
+
+    monkeypatch.setattr('app.utils.call_gemini_api', slow_call_gemini_api)
+    monkeypatch.setattr('app.api.agent.call_gemini_api', slow_call_gemini_api)
+    monkeypatch.setattr('app.api.agent.stream_gemini_api', slow_stream_gemini_api)
+    app.config.update(AGENT_MAX_CONCURRENCY=1, AGENT_RETRY_AFTER=3)
+    app.extensions.pop('agent_limiter', None)
+    yield state
+    state['finish'].set()
+
+
+def _in_background(request):
+    """在背景執行請求，返回 (執行緒, 結果列表)"""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(request()), daemon=True)
+    thread.start()
+    return thread, results
+
+
+class TestAgentConcurrencyLimit:
+    """AI 模型呼叫並行上限測試類別"""
+
+    def test_busy_agent_does_not_block_other_endpoints(self, app, authenticated_client, test_sheep, blocking_gemini):
+        """測試名額用完時 AI 請求返回 503，羊隻端點照常回應"""
+        thread, results = _in_background(lambda: _login(app).post('/api/agent/chat', json=CHAT))
+        assert blocking_gemini['started'].wait(5)
+
+        start = time.perf_counter()
+        busy = authenticated_client.post('/api/agent/recommendation', json={'api_key': 'test-api-key', 'EarNum': 'TEST001'})
+        assert busy.status_code == 503
+        assert busy.headers['Retry-After'] == '3'
+        assert 'error' in busy.get_json()
+        assert time.perf_counter() - start < 1
+
+        assert authenticated_client.get('/api/sheep/').status_code == 200
+        assert authenticated_client.get('/api/sheep/TEST001').status_code == 200
+
+        blocking_gemini['finish'].set()
+        thread.join(5)
+        assert results[0].status_code == 200
+        # 模型呼叫在專用執行緒池中執行
+        assert blocking_gemini['threads'][0].startswith('agent-call')
+        assert authenticated_client.post('/api/agent/chat', json=CHAT).status_code == 200
+
+    def test_stream_holds_slot_until_finished(self, app, authenticated_client, blocking_gemini):
+        """測試串流在模型回應結束前佔用名額，結束後釋放"""
+        thread, results = _in_background(lambda: _login(app).post('/api/agent/chat/stream', json=CHAT).get_data(as_text=True))
+        assert blocking_gemini['started'].wait(5)
+
+        assert authenticated_client.post('/api/agent/chat/stream', json=CHAT).status_code == 503
+
+        blocking_gemini['finish'].set()
+        thread.join(5)
+        assert 'event: done' in results[0]
+        assert authenticated_client.post('/api/agent/chat', json=CHAT).status_code == 200
+
+    def test_unread_stream_releases_slot_on_close(self, authenticated_client, blocking_gemini):
+        """測試客戶端未讀取串流就關閉時釋放名額"""
+        blocking_gemini['finish'].set()
+        response = authenticated_client.post('/api/agent/chat/stream', json=CHAT, buffered=False)
+        assert response.status_code == 200
+        response.close()
+
+        assert authenticated_client.post('/api/agent/chat', json=CHAT).status_code == 200
+
+    def test_cached_tip_served_while_busy(self, app, authenticated_client, blocking_gemini):
+        """測試已快取的每日提示不需要名額"""
+        blocking_gemini['finish'].set()
+        headers = {'X-Api-Key': 'test-api-key'}
+        assert authenticated_client.get('/api/agent/tip', headers=headers).status_code == 200
+
+        blocking_gemini['finish'].clear()
+        blocking_gemini['started'].clear()
+        thread, results = _in_background(lambda: _login(app).post('/api/agent/chat', json=CHAT))
+        assert blocking_gemini['started'].wait(5)
+
+        assert authenticated_client.get('/api/agent/tip', headers=headers).status_code == 200
+
+        blocking_gemini['finish'].set()
+        thread.join(5)
+        assert results[0].status_code == 200
+
+    def test_model_call_releases_connection_without_commit(self, app, test_user):
+        """測試模型呼叫期間不持有資料庫交易，且不會隱含提交未提交的變更"""
+        with app.test_request_context():
+            session = db.session()
+            ChatHistory.query.count()
+            assert session.in_transaction()
+            assert run_agent_call(session.in_transaction) is False
+
+            db.session.add(ChatHistory(user_id=test_user.id, session_id='s', role='user', content='未提交'))
+            with pytest.raises(RuntimeError):
+                run_agent_call(lambda: None)
+            db.session.rollback()
+            assert ChatHistory.query.count() == 0
@@ -19,7 +19,7 @@ class TestUtilsEnhanced:
     def test_call_gemini_api_with_custom_config(self, app):
         """測試使用自定義配置調用Gemini API"""
         with app.app_context():
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 # 模擬成功響應
                 mock_response = MagicMock()
                 mock_response.status_code = 200
@@ -70,7 +70,7 @@ class TestUtilsEnhanced:
     def test_call_gemini_api_with_blocked_content(self, app):
         """測試內容被阻止的情況"""
         with app.app_context():
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 # 模擬內容被阻止的響應
                 mock_response = MagicMock()
                 mock_response.status_code = 200
@@ -92,7 +92,7 @@ class TestUtilsEnhanced:
     def test_call_gemini_api_with_malformed_response(self, app):
         """測試畸形響應的處理"""
         with app.app_context():
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 # 模擬畸形響應
                 mock_response = MagicMock()
                 mock_response.status_code = 200
@@ -109,7 +109,7 @@ class TestUtilsEnhanced:
     def test_call_gemini_api_with_network_timeout(self, app):
         """測試網路超時的處理"""
         with app.app_context():
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 import requests
                 mock_post.side_effect = requests.exceptions.Timeout()
 
@@ -121,7 +121,7 @@ class TestUtilsEnhanced:
     def test_call_gemini_api_with_connection_error(self, app):
         """測試連接錯誤的處理"""
         with app.app_context():
-            with patch('requests.post') as mock_post:
+            with patch('requests.Session.post') as mock_post:
                 import requests
                 mock_post.side_effect = requests.exceptions.ConnectionError()
 
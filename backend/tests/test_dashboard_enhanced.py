@@ -398,3 +398,168 @@ class TestDashboardAPIEnhanced:
         assert any('疫苗接種' in t for t in reminder_types)
         assert any('驅蟲' in t for t in reminder_types)
         assert any('停藥期' in t for t in reminder_types)
+
+
+class TestReminderIndex:
+    """儀表板提醒索引測試類別"""
+
+    def _reminders(self, client):
+        response = client.get('/api/dashboard/data')
+        assert response.status_code == 200
+        return [(r['ear_num'], r['type'], r['status']) for r in response.get_json()['reminders']]
+
+    def test_index_follows_sheep_writes(self, authenticated_client, test_user):
+        """測試新增、修改與刪除羊隻時提醒同步更新"""
+        today = date.today()
+        soon = (today + timedelta(days=3)).strftime('%Y-%m-%d')
+        assert authenticated_client.post('/api/sheep/', json={'EarNum': 'IDX001'}).status_code == 201
+        authenticated_client.put('/api/sheep/IDX001', json={
+            'next_vaccination_due_date': soon,
+            'expected_lambing_date': (today + timedelta(days=30)).strftime('%Y-%m-%d')
+        })
+        assert self._reminders(authenticated_client) == [('IDX001', '疫苗接種', '即將到期')]
+
+        authenticated_client.put('/api/sheep/IDX001', json={
+            'next_vaccination_due_date': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'next_deworming_due_date': soon
+        })
+        assert self._reminders(authenticated_client) == [('IDX001', '疫苗接種', '已過期'), ('IDX001', '驅蟲', '即將到期')]
+
+        authenticated_client.put('/api/sheep/IDX001', json={'next_vaccination_due_date': None})
+        assert self._reminders(authenticated_client) == [('IDX001', '驅蟲', '即將到期')]
+
+        authenticated_client.delete('/api/sheep/IDX001')
+        assert self._reminders(authenticated_client) == []
+
+    def test_only_due_reminders_are_loaded(self, authenticated_client, app, test_user):
+        """測試只以日期範圍查詢到期的提醒，各提醒欄位的查詢使用索引"""
+        from app import db
+        from app.reminders import REMINDER_FIELDS
+
+        today = date.today()
+        db.session.add_all([
+            Sheep(user_id=test_user.id, EarNum='FAR001', next_vaccination_due_date=(today + timedelta(days=60)).strftime('%Y-%m-%d')),
+            Sheep(user_id=test_user.id, EarNum='DUE001', expected_lambing_date=today.strftime('%Y-%m-%d')),
+        ])
+        db.session.commit()
+
+        assert self._reminders(authenticated_client) == [('DUE001', '預產期', '即將到期')]
+
+        for field in REMINDER_FIELDS:
+            plan = db.session.execute(db.text(
+                f"EXPLAIN QUERY PLAN SELECT EarNum FROM sheep WHERE user_id = 1 AND {field} <= '2024-01-01'"
+            )).fetchall()
+            assert any(f'ix_sheep_user_{field}' in str(row) for row in plan)
+
+    def test_bulk_import_updates_index(self, authenticated_client, test_user, make_excel_file, finish_import_job):
+        """測試批次導入的提醒日期也會出現在提醒中"""
+        due = date.today().strftime('%Y-%m-%d')
+        config = {'sheets': {'Basic': {'purpose': 'basic_info', 'columns': {
+            'EarNum': 'EarNum', 'next_vaccination_due_date': 'Vaccine'
+        }}}}
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (make_excel_file({'Basic': [{'EarNum': 'IMP001', 'Vaccine': due}]}), 'basic.xlsx'),
+            'is_default_mode': 'false', 'mapping_config': json.dumps(config)
+        }, content_type='multipart/form-data')
+        assert finish_import_job(response)['status'] == 'completed'
+
+        assert self._reminders(authenticated_client) == [('IMP001', '疫苗接種', '即將到期')]
+
+    def test_withdrawal_end_date_follows_event_writes(self, authenticated_client, test_sheep):
+        """測試新增與修改用藥事件時重新計算停藥期結束日，只返回停藥中的事件"""
+        today = date.today()
+        event = {
+            'event_date': (today - timedelta(days=10)).strftime('%Y-%m-%d'), 'event_type': '藥物治療',
+            'medication': '抗生素', 'withdrawal_days': 5
+        }
+        event['id'] = authenticated_client.post('/api/sheep/TEST001/events', json=event).get_json()['event']['id']
+        assert SheepEvent.query.get(event['id']).withdrawal_end_date == (today - timedelta(days=5)).isoformat()
+        assert self._reminders(authenticated_client) == []
+
+        authenticated_client.put(f"/api/sheep/events/{event['id']}", json=dict(event, withdrawal_days=14))
+        assert SheepEvent.query.get(event['id']).withdrawal_end_date == (today + timedelta(days=4)).isoformat()
+        assert self._reminders(authenticated_client) == [('TEST001', '停藥期 (抗生素)', '停藥中')]
+
+        authenticated_client.put(f"/api/sheep/events/{event['id']}", json=dict(event, withdrawal_days=None))
+        assert SheepEvent.query.get(event['id']).withdrawal_end_date is None
+
+    def test_withdrawal_query_uses_index(self, app):
+        """測試停藥期查詢使用 (user_id, withdrawal_end_date) 索引"""
+        from app import db
+
+        plan = db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT * FROM sheep_event WHERE user_id = 1 AND withdrawal_end_date >= '2024-01-01'"
+        )).fetchall()
+        assert any('ix_sheep_event_user_withdrawal_end_date' in str(row) for row in plan)
+
+
+class TestFarmReportAggregation:
+    """牧場報告合併查詢測試類別"""
+
+    @pytest.fixture
+    def flock(self, app, test_user):
+        from app import db
+
+        sheep = [
+            Sheep(user_id=test_user.id, EarNum='AGG001', Breed='波爾羊', Sex='母', BirWei=3.2, LittleSize=2),
+            Sheep(user_id=test_user.id, EarNum='AGG002', Breed='波爾羊', Sex='公', BirWei=3.9),
+            Sheep(user_id=test_user.id, EarNum='AGG003', Breed='努比亞羊', Sex='母', LittleSize=3),
+            Sheep(user_id=test_user.id, EarNum='AGG004', Breed=None, Sex='母'),
+            Sheep(user_id=test_user.id, EarNum='AGG005', Breed='努比亞羊', Sex=None, BirWei=2.75),
+        ]
+        db.session.add_all(sheep)
+        db.session.commit()
+        records = [SheepHistoricalData(user_id=test_user.id, sheep_id=sheep[0].id, record_date=f'2024-01-0{i}', record_type='milk_yield_kg_day', value=v)
+                   for i, v in enumerate([2.5, 3.0, 3.25], start=1)]
+        records.append(SheepHistoricalData(user_id=test_user.id, sheep_id=sheep[0].id, record_date='2024-01-01', record_type='Body_Weight_kg', value=40))
+        diseases = ['感冒'] * 3 + ['腹瀉'] * 2 + ['A', 'B', 'C', 'D']
+        events = [SheepEvent(user_id=test_user.id, sheep_id=sheep[1].id, event_date='2024-02-01', event_type='疾病治療', description=d) for d in diseases]
+        events.append(SheepEvent(user_id=test_user.id, sheep_id=sheep[1].id, event_date='2024-02-01', event_type='疫苗接種', description='感冒'))
+        db.session.add_all(records + events)
+        db.session.commit()
+
+    def test_report_values(self, authenticated_client, flock):
+        """測試合併查詢的結果與各別查詢相同"""
+        report = authenticated_client.get('/api/dashboard/farm_report').get_json()
+
+        assert report['flock_composition'] == {
+            'by_breed': [{'name': '努比亞羊', 'count': 2}, {'name': '波爾羊', 'count': 2}],
+            'by_sex': [{'name': '公', 'count': 1}, {'name': '母', 'count': 3}],
+            'total': 5
+        }
+        assert report['production_summary'] == {'avg_birth_weight': 3.28, 'avg_litter_size': 2.5, 'avg_milk_yield': 2.92}
+        assert report['health_summary']['top_diseases'] == [
+            {'name': '感冒', 'count': 3}, {'name': '腹瀉', 'count': 2},
+            {'name': 'A', 'count': 1}, {'name': 'B', 'count': 1}, {'name': 'C', 'count': 1}
+        ]
+
+    def test_full_report_uses_two_queries(self, authenticated_client, flock):
+        """測試完整報告只執行兩次聚合查詢"""
+        from sqlalchemy import event
+        from app import db
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM user' not in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            assert authenticated_client.get('/api/dashboard/farm_report').status_code == 200
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        assert len(statements) == 2
+
+    def test_select_sections(self, authenticated_client, flock):
+        """測試只返回指定的報告區塊"""
+        report = authenticated_client.get('/api/dashboard/farm_report?sections=health_summary').get_json()
+        assert list(report) == ['health_summary']
+
+        report = authenticated_client.get('/api/dashboard/farm_report?sections=production_summary,flock_composition').get_json()
+        assert sorted(report) == ['flock_composition', 'production_summary']
+        assert report['production_summary']['avg_milk_yield'] == 2.92
+
+        response = authenticated_client.get('/api/dashboard/farm_report?sections=finance')
+        assert response.status_code == 400
+        assert 'finance' in response.get_json()['error']
@@ -0,0 +1,205 @@
+"""
+數據匯出測試
+"""
+
+import io
+import json
+import os
+import zipfile
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+from app import exporters
+from app.models import Sheep, SheepEvent, SheepHistoricalData, ChatHistory
+
+
+def _seed_export_data(user_id, sheep_count=3):
+    """建立含事件、歷史數據與聊天記錄的測試資料"""
+    for i in range(sheep_count):
+        sheep = Sheep(user_id=user_id, EarNum=f'EXP{i:03d}', Breed='波爾羊', Body_Weight_kg=40 + i)
+        db.session.add(sheep)
+        db.session.flush()
+        db.session.add(SheepEvent(user_id=user_id, sheep_id=sheep.id, event_date=f'2024-01-1{i}', event_type='疫苗接種', description='接種'))
+        db.session.add(SheepHistoricalData(user_id=user_id, sheep_id=sheep.id, record_date=f'2024-02-1{i}', record_type='Body_Weight_kg', value=40.5 + i))
+    db.session.add(ChatHistory(user_id=user_id, session_id='s1', role='user', content='你好', timestamp=datetime(2024, 1, 15, 10, 0, 0)))
+    db.session.commit()
+
+
+def _read_workbook(data):
+    return pd.read_excel(io.BytesIO(data), sheet_name=None)
+
+
+class TestExportQueries:
+    """匯出查詢測試類別"""
+
+    def test_each_table_is_read_once(self, app, test_user):
+        """測試一般匯出每個工作表只執行一次查詢，且事件與歷史數據已帶有耳號"""
+        _seed_export_data(test_user.id)
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        try:
+            frames = dict(exporters.read_export_frames(test_user.id))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+        assert len(statements) == 4
+        assert frames['Sheep_Events_Log'].columns[0] == 'EarNum'
+        assert frames['Sheep_Events_Log']['EarNum'].tolist() == ['EXP000', 'EXP001', 'EXP002']
+        assert 'sheep_id' not in frames['Sheep_Historical_Data'].columns
+        assert len(frames['Chat_History']) == 1
+
+    def test_internal_columns_are_not_exported(self, app, test_user):
+        """測試匯出欄位與原有匯出相同，不含同步版本、指紋等內部欄位"""
+        _seed_export_data(test_user.id)
+        frames = dict(exporters.read_export_frames(test_user.id))
+
+        assert set(frames['Sheep_Events_Log'].columns) == {
+            'EarNum', 'id', 'user_id', 'event_date', 'event_type', 'description', 'notes',
+            'medication', 'withdrawal_days', 'recorded_at',
+        }
+        assert set(frames['Sheep_Historical_Data'].columns) == {
+            'EarNum', 'id', 'user_id', 'record_date', 'record_type', 'value', 'notes', 'recorded_at',
+        }
+        sheep_columns = set(frames['Sheep_Basic_Info'].columns)
+        assert 'EarNum' in sheep_columns
+        assert not sheep_columns & {'data_version', 'sync_version'}
+
+
+class TestStreamingExport:
+    """串流 Excel 匯出測試類別"""
+
+    def test_stream_mode_matches_default_export(self, authenticated_client, test_user):
+        """測試串流模式的內容與一般匯出相同"""
+        _seed_export_data(test_user.id)
+
+        default = authenticated_client.get('/api/data/export_excel')
+        streamed = authenticated_client.get('/api/data/export_excel?mode=stream')
+
+        assert streamed.status_code == 200
+        assert 'spreadsheetml' in streamed.headers['Content-Type']
+        assert 'goat_data_export_' in streamed.headers['Content-Disposition']
+
+        expected = _read_workbook(default.data)
+        actual = _read_workbook(streamed.data)
+        assert list(actual) == ['Sheep_Basic_Info', 'Sheep_Events_Log', 'Sheep_Historical_Data', 'Chat_History']
+        for sheet_name, df in expected.items():
+            pd.testing.assert_frame_equal(actual[sheet_name], df, check_dtype=False)
+
+    def test_stream_mode_empty_export(self, authenticated_client):
+        """測試沒有數據時串流模式仍產生說明工作表"""
+        response = authenticated_client.get('/api/data/export_excel?mode=stream')
+        assert response.status_code == 200
+
+        sheets = _read_workbook(response.data)
+        assert list(sheets) == ['Empty_Export']
+        assert sheets['Empty_Export']['說明'].tolist() == ['目前沒有數據可匯出']
+
+    def test_stream_mode_removes_temp_file(self, authenticated_client, test_user, monkeypatch):
+        """測試回應結束後刪除暫存檔"""
+        created = []
+        original = exporters.create_export_tempfile
+
+        def tracking_tempfile(suffix):
+            path = original(suffix)
+            created.append(path)
+            return path
+
+        monkeypatch.setattr('app.api.data_management.create_export_tempfile', tracking_tempfile)
+        response = authenticated_client.get('/api/data/export_excel?mode=stream')
+        response.close()
+
+        assert len(created) == 1
+        assert not os.path.exists(created[0])
+
+    def test_write_streaming_xlsx_in_small_batches(self, app, test_user, tmp_path):
+        """測試以小批次分頁讀取時仍寫出全部資料列"""
+        _seed_export_data(test_user.id, sheep_count=5)
+        path = tmp_path / 'export.xlsx'
+
+        exporters.write_streaming_xlsx(test_user.id, str(path), batch_size=2)
+
+        sheets = pd.read_excel(path, sheet_name=None)
+        assert sheets['Sheep_Basic_Info']['EarNum'].tolist() == [f'EXP{i:03d}' for i in range(5)]
+        assert sheets['Sheep_Events_Log'].columns[0] == 'EarNum'
+        assert 'sheep_id' not in sheets['Sheep_Events_Log'].columns
+        assert len(sheets['Sheep_Historical_Data']) == 5
+
+
+class TestExportFormats:
+    """機器可讀匯出格式測試類別"""
+
+    def test_csv_zip_export(self, authenticated_client, test_user):
+        """測試 CSV zip 匯出每個資料表一個檔案，內容與一般匯出相同"""
+        _seed_export_data(test_user.id)
+        response = authenticated_client.get('/api/data/export?format=csv.zip')
+
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'application/zip'
+        assert '.csv.zip' in response.headers['Content-Disposition']
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            assert archive.namelist() == ['Sheep_Basic_Info.csv', 'Sheep_Events_Log.csv', 'Sheep_Historical_Data.csv', 'Chat_History.csv']
+            events = pd.read_csv(archive.open('Sheep_Events_Log.csv'))
+            sheep = pd.read_csv(archive.open('Sheep_Basic_Info.csv'))
+        assert events['EarNum'].tolist() == ['EXP000', 'EXP001', 'EXP002']
+        assert sheep['Body_Weight_kg'].tolist() == [40, 41, 42]
+
+    def test_csv_zip_empty_tables_have_headers(self, app, test_user):
+        """測試沒有數據的資料表仍輸出欄位名稱"""
+        data = b''.join(exporters.iter_csv_zip(test_user.id))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            header = archive.read('Sheep_Events_Log.csv').decode('utf-8').strip()
+        assert header.split(',')[0] == 'EarNum'
+        assert 'sheep_id' not in header
+
+    def test_ndjson_export(self, authenticated_client, test_user):
+        """測試 NDJSON 每列一筆記錄並標示來源資料表"""
+        _seed_export_data(test_user.id)
+        response = authenticated_client.get('/api/data/export?format=ndjson')
+
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'application/x-ndjson'
+        records = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        tables = [r['table'] for r in records]
+        assert tables.count('Sheep_Basic_Info') == 3
+        assert tables.count('Sheep_Events_Log') == 3
+        assert tables.count('Sheep_Historical_Data') == 3
+        chat = next(r for r in records if r['table'] == 'Chat_History')
+        assert chat['content'] == '你好'
+        assert chat['timestamp'] == '2024-01-15T10:00:00'
+
+    def test_parquet_export(self, authenticated_client, test_user):
+        """測試 Parquet 匯出內容與一般匯出的 DataFrame 相同"""
+        _seed_export_data(test_user.id)
+        expected = dict(exporters.read_export_frames(test_user.id))
+        response = authenticated_client.get('/api/data/export?format=parquet')
+
+        assert response.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            for sheet_name, df in expected.items():
+                actual = pd.read_parquet(io.BytesIO(archive.read(f'{sheet_name}.parquet')))
+                pd.testing.assert_frame_equal(actual, df)
+
+    def test_xlsx_format(self, authenticated_client, test_user):
+        """測試 format=xlsx 產生 Excel 檔案"""
+        _seed_export_data(test_user.id)
+        response = authenticated_client.get('/api/data/export?format=xlsx')
+
+        assert response.status_code == 200
+        assert 'spreadsheetml' in response.headers['Content-Type']
+        assert len(_read_workbook(response.data)['Sheep_Basic_Info']) == 3
+
+    def test_invalid_format(self, authenticated_client):
+        """測試不支援的匯出格式"""
+        response = authenticated_client.get('/api/data/export?format=pdf')
+        assert response.status_code == 400
+        assert '不支援的匯出格式' in response.get_json()['error']
+
+    def test_export_requires_login(self, client):
+        """測試未登入無法匯出"""
+        response = client.get('/api/data/export?format=ndjson')
+        assert response.status_code == 401
@@ -87,31 +87,25 @@ class TestDataManagementAPI:
         data = json.loads(response.data)
         assert 'error' in data
 
-    def test_process_import_default_mode(self, authenticated_client):
+    def test_process_import_default_mode(self, authenticated_client, finish_import_job, make_excel_file):
         """測試預設模式導入"""
-        excel_content = b'\x50\x4b\x03\x04'  # 簡化的 Excel 文件標誌
-        
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['0009-0013A1_Basic']
-            with patch('pandas.read_excel') as mock_read:
-                mock_df = type('MockDataFrame', (), {
-                    'iterrows': lambda self: iter([
-                        (0, {'EarNum': 'TEST001', 'Breed': '1', 'Sex': '1'})
-                    ]),
-                    'where': lambda self, condition, other: self
-                })()
-                mock_read.return_value = mock_df
+        excel_file = make_excel_file({
+            '0009-0013A1_Basic': [{'EarNum': 'TEST001', 'Breed': '1', 'Sex': '1'}]
+        })
 
-                data = {
-                    'file': (io.BytesIO(excel_content), 'test.xlsx'),
-                    'is_default_mode': 'true'
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        data = {
+            'file': (excel_file, 'test.xlsx'),
+            'is_default_mode': 'true'
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
+        
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert Sheep.query.filter_by(EarNum='TEST001').count() == 1
 
     def test_process_import_manual_mode_no_config(self, authenticated_client):
         """測試手動模式沒有配置"""
@@ -144,10 +138,8 @@ class TestDataManagementAPI:
         result = json.loads(response.data)
         assert 'error' in result
 
-    def test_process_import_manual_mode_with_config(self, authenticated_client):
+    def test_process_import_manual_mode_with_config(self, authenticated_client, finish_import_job, make_excel_file):
         """測試手動模式有效配置"""
-        excel_content = b'\x50\x4b\x03\x04'
-        
         config = {
             "sheets": {
                 "Sheet1": {
@@ -160,29 +152,26 @@ class TestDataManagementAPI:
                 }
             }
         }
-        
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['Sheet1']
-            with patch('pandas.read_excel') as mock_read:
-                mock_df = type('MockDataFrame', (), {
-                    'iterrows': lambda self: iter([
-                        (0, {'EarNum': 'TEST001', 'Breed': '波爾羊', 'Sex': '母'})
-                    ]),
-                    'where': lambda self, condition, other: self
-                })()
-                mock_read.return_value = mock_df
+        excel_file = make_excel_file({
+            'Sheet1': [{'EarNum': 'TEST001', 'Breed': '波爾羊', 'Sex': '母'}]
+        })
 
-                data = {
-                    'file': (io.BytesIO(excel_content), 'test.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        data = {
+            'file': (excel_file, 'test.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
+        
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        sheep = Sheep.query.filter_by(EarNum='TEST001').first()
+        assert sheep.Breed == '波爾羊'
+        assert sheep.Sex == '母'
 
     def test_data_management_unauthenticated_access(self, client):
         """測試未認證用戶訪問數據管理 API"""
@@ -69,9 +69,7 @@ class TestDataManagementEnhanced:
     def test_export_excel_exception_handling(self, authenticated_client, mocker):
         """測試匯出Excel時的異常處理"""
         # 模擬資料庫查詢失敗
-        with patch('app.models.Sheep.query') as mock_query:
-            mock_query.filter_by.side_effect = Exception("Database error")
-            
+        with patch('app.api.data_management.read_export_frames', side_effect=Exception("Database error")):
             response = authenticated_client.get('/api/data/export_excel')
             assert response.status_code == 500
             data = json.loads(response.data)
@@ -142,49 +140,42 @@ class TestDataManagementEnhanced:
             result = json.loads(response.data)
             assert 'error' in result
 
-    def test_process_import_with_breed_and_sex_mapping(self, authenticated_client, app, test_user):
+    def test_process_import_with_breed_and_sex_mapping(self, authenticated_client, finish_import_job, app, test_user, make_excel_file):
         """測試使用品種和性別映射的導入"""
-        excel_content = b'\x50\x4b\x03\x04'
+        excel_file = make_excel_file({
+            'S2_Breed': [
+                {'Symbol': '1', 'Breed': '波爾羊'},
+                {'Symbol': '2', 'Breed': '努比亞羊'}
+            ],
+            'S7_Sex': [
+                {'Num': '1', 'Sex': '母'},
+                {'Num': '2', 'Sex': '公'}
+            ],
+            '0009-0013A1_Basic': [
+                {'EarNum': 'MAP001', 'Breed': '1', 'Sex': '1', 'BirthDate': '2023-01-15'}
+            ]
+        })
+
+        data = {
+            'file': (excel_file, 'mapping_test.xlsx'),
+            'is_default_mode': 'true'
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
         
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['S2_Breed', 'S7_Sex', '0009-0013A1_Basic']
-            
-            def mock_read_excel(xls, sheet_name, dtype):
-                df = MagicMock()
-                df.where = lambda condition, other=None: df
-                
-                if sheet_name == 'S2_Breed':
-                    df.iterrows.return_value = [
-                        (0, {'Code': '1', 'Name': '波爾羊'}),
-                        (1, {'Code': '2', 'Name': '努比亞羊'})
-                    ]
-                elif sheet_name == 'S7_Sex':
-                    df.iterrows.return_value = [
-                        (0, {'Code': '1', 'Name': '母'}),
-                        (1, {'Code': '2', 'Name': '公'})
-                    ]
-                else:  # 基本資料
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'MAP001', 'Breed': '1', 'Sex': '1', 'BirthDate': '2023-01-15'})
-                    ]
-                return df
-            
-            with patch('pandas.read_excel', side_effect=mock_read_excel):
-                data = {
-                    'file': (io.BytesIO(excel_content), 'mapping_test.xlsx'),
-                    'is_default_mode': 'true'
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
 
-    def test_process_import_with_various_record_types(self, authenticated_client, app, test_user):
+        sheep = Sheep.query.filter_by(user_id=test_user.id, EarNum='MAP001').first()
+        assert sheep.Breed == '波爾羊'
+        assert sheep.Sex == '母'
+        assert sheep.BirthDate == '2023-01-15'
+
+    def test_process_import_with_various_record_types(self, authenticated_client, finish_import_job, app, test_user, make_excel_file):
         """測試導入各種記錄類型"""
-        excel_content = b'\x50\x4b\x03\x04'
-        
         # 先創建基礎羊隻
         with app.app_context():
             sheep = Sheep(
@@ -221,55 +212,35 @@ class TestDataManagementEnhanced:
             }
         }
         
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = list(config["sheets"].keys())
-            
-            def mock_read_excel(xls, sheet_name, dtype):
-                df = MagicMock()
-                df.where = lambda condition, other: df
-                
-                if sheet_name == "0009-0013A4_Kidding":
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'RECORD001', 'YeanDate': '2024-01-15', 'KidNum': '2'})
-                    ]
-                elif sheet_name == "0009-0013A2_PubMat":
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'RECORD001', 'Mat_date': '2023-12-01', 'Mat_grouM_Sire': 'SIRE001'})
-                    ]
-                elif sheet_name == "0009-0013A3_Yean":
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'RECORD001', 'YeanDate': '2024-01-15', 'DryOffDate': '2024-06-15', 'Lactation': '1'})
-                    ]
-                elif sheet_name == "0009-0013A9_Milk":
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'RECORD001', 'MeaDate': '2024-02-01', 'Milk': '2.5'})
-                    ]
-                elif sheet_name == "0009-0013A11_MilkAnalysis":
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'RECORD001', 'MeaDate': '2024-02-01', 'AMFat': '3.8'})
-                    ]
-                else:
-                    df.iterrows.return_value = []
-                
-                return df
-            
-            with patch('pandas.read_excel', side_effect=mock_read_excel):
-                data = {
-                    'file': (io.BytesIO(excel_content), 'records_test.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        excel_file = make_excel_file({
+            "0009-0013A4_Kidding": [{'EarNum': 'RECORD001', 'YeanDate': '2024-01-15', 'KidNum': '2'}],
+            "0009-0013A2_PubMat": [{'EarNum': 'RECORD001', 'Mat_date': '2023-12-01', 'Mat_grouM_Sire': 'SIRE001'}],
+            "0009-0013A3_Yean": [{'EarNum': 'RECORD001', 'YeanDate': '2024-01-15', 'DryOffDate': '2024-06-15', 'Lactation': '1'}],
+            "0009-0013A9_Milk": [{'EarNum': 'RECORD001', 'MeaDate': '2024-02-01', 'Milk': '2.5'}],
+            "0009-0013A11_MilkAnalysis": [{'EarNum': 'RECORD001', 'MeaDate': '2024-02-01', 'AMFat': '3.8'}]
+        })
 
-    def test_process_import_with_invalid_dates(self, authenticated_client, app, test_user):
-        """測試導入包含無效日期的數據"""
-        excel_content = b'\x50\x4b\x03\x04'
+        data = {
+            'file': (excel_file, 'records_test.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
         
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+
+        events = SheepEvent.query.filter_by(user_id=test_user.id).all()
+        assert sorted(e.event_type for e in events) == sorted(['產仔', '配種', '泌乳開始', '乾乳'])
+        history = SheepHistoricalData.query.filter_by(user_id=test_user.id).all()
+        assert {(h.record_type, h.value) for h in history} == {('milk_yield_kg_day', 2.5), ('milk_fat_percentage', 3.8)}
+
+    def test_process_import_with_invalid_dates(self, authenticated_client, finish_import_job, app, test_user, make_excel_file):
+        """測試導入包含無效日期的數據"""
         # 先創建基礎羊隻
         with app.app_context():
             sheep = Sheep(
@@ -290,37 +261,32 @@ class TestDataManagementEnhanced:
             }
         }
         
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['Events']
-            
-            def mock_read_excel(xls, sheet_name, dtype):
-                df = MagicMock()
-                df.where = lambda condition, other: df
-                df.iterrows.return_value = [
-                    (0, {'EarNum': 'INVALID001', 'YeanDate': '1900-01-01'}),  # 無效日期
-                    (1, {'EarNum': 'INVALID001', 'YeanDate': 'invalid-date'}),  # 無效格式
-                    (2, {'EarNum': 'INVALID001', 'YeanDate': None})  # 空值
-                ]
-                return df
-            
-            with patch('pandas.read_excel', side_effect=mock_read_excel):
-                data = {
-                    'file': (io.BytesIO(excel_content), 'invalid_dates.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                # 應該仍然成功，但會跳過無效的記錄
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        excel_file = make_excel_file({
+            'Events': [
+                {'EarNum': 'INVALID001', 'YeanDate': '1900-01-01'},  # 無效日期
+                {'EarNum': 'INVALID001', 'YeanDate': 'invalid-date'},  # 無效格式
+                {'EarNum': 'INVALID001', 'YeanDate': None}  # 空值
+            ]
+        })
 
-    def test_process_import_rollback_on_error(self, authenticated_client, app, test_user):
-        """測試導入過程中發生錯誤時的回滾"""
-        excel_content = b'\x50\x4b\x03\x04'
+        data = {
+            'file': (excel_file, 'invalid_dates.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
         
+        # 應該仍然成功，但會跳過無效的記錄
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert SheepEvent.query.filter_by(user_id=test_user.id).count() == 0
+
+    def test_process_import_rollback_on_error(self, authenticated_client, app, test_user, make_excel_file, finish_import_job):
+        """測試導入過程中發生錯誤時的回滾"""
         config = {
             "sheets": {
                 "Test": {
@@ -329,30 +295,25 @@ class TestDataManagementEnhanced:
                 }
             }
         }
-        
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['Test']
-            
-            with patch('pandas.read_excel') as mock_read:
-                # 模擬pandas讀取Excel時發生異常
-                mock_read.side_effect = Exception("Pandas error")
-                
-                data = {
-                    'file': (io.BytesIO(excel_content), 'error_test.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 500
-                result = json.loads(response.data)
-                assert 'error' in result
+        excel_file = make_excel_file({'Test': [{'EarNum': 'ROLLBACK001', 'Breed': '波爾羊'}]})
 
-    def test_process_import_with_empty_ear_num(self, authenticated_client):
+        # 模擬寫入分塊時發生異常
+        with patch('app.import_engine._import_basic_chunk', side_effect=Exception("Pandas error")):
+            data = {
+                'file': (excel_file, 'error_test.xlsx'),
+                'is_default_mode': 'false',
+                'mapping_config': json.dumps(config)
+            }
+            response = authenticated_client.post('/api/data/process_import',
+                                              data=data, content_type='multipart/form-data')
+            job = finish_import_job(response)
+
+        assert job['status'] == 'failed'
+        assert '導入數據過程中發生錯誤' in job['error']
+        assert Sheep.query.filter_by(EarNum='ROLLBACK001').count() == 0
+
+    def test_process_import_with_empty_ear_num(self, authenticated_client, finish_import_job, make_excel_file):
         """測試導入包含空耳號的數據"""
-        excel_content = b'\x50\x4b\x03\x04'
-        
         config = {
             "sheets": {
                 "Test": {
@@ -362,36 +323,31 @@ class TestDataManagementEnhanced:
             }
         }
         
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['Test']
-            
-            def mock_read_excel(xls, sheet_name, dtype):
-                df = MagicMock()
-                df.where = lambda condition, other: df
-                df.iterrows.return_value = [
-                    (0, {'EarNum': None, 'Breed': '波爾羊'}),  # 空耳號
-                    (1, {'EarNum': '', 'Breed': '努比亞羊'}),   # 空字串耳號
-                    (2, {'EarNum': 'VALID001', 'Breed': '台灣黑山羊'})  # 正常耳號
-                ]
-                return df
-            
-            with patch('pandas.read_excel', side_effect=mock_read_excel):
-                data = {
-                    'file': (io.BytesIO(excel_content), 'empty_earnum.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        excel_file = make_excel_file({
+            'Test': [
+                {'EarNum': None, 'Breed': '波爾羊'},  # 空耳號
+                {'EarNum': '', 'Breed': '努比亞羊'},   # 空字串耳號
+                {'EarNum': 'VALID001', 'Breed': '台灣黑山羊'}  # 正常耳號
+            ]
+        })
 
-    def test_process_import_ignore_sheets(self, authenticated_client):
-        """測試導入時忽略某些工作表"""
-        excel_content = b'\x50\x4b\x03\x04'
+        data = {
+            'file': (excel_file, 'empty_earnum.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
         
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert [s.EarNum for s in Sheep.query.all()] == ['VALID001']
+
+    def test_process_import_ignore_sheets(self, authenticated_client, finish_import_job, make_excel_file):
+        """測試導入時忽略某些工作表"""
         config = {
             "sheets": {
                 "Ignore1": {"purpose": "ignore"},
@@ -403,32 +359,26 @@ class TestDataManagementEnhanced:
             }
         }
         
-        with patch('pandas.ExcelFile') as mock_excel:
-            mock_excel.return_value.sheet_names = ['Ignore1', 'Basic', 'Ignore2']
-            
-            def mock_read_excel(xls, sheet_name, dtype):
-                df = MagicMock()
-                df.where = lambda condition, other: df
-                if sheet_name == 'Basic':
-                    df.iterrows.return_value = [
-                        (0, {'EarNum': 'IGNORE001', 'Breed': '波爾羊'})
-                    ]
-                else:
-                    df.iterrows.return_value = []
-                return df
-            
-            with patch('pandas.read_excel', side_effect=mock_read_excel):
-                data = {
-                    'file': (io.BytesIO(excel_content), 'ignore_test.xlsx'),
-                    'is_default_mode': 'false',
-                    'mapping_config': json.dumps(config)
-                }
-                response = authenticated_client.post('/api/data/process_import',
-                                                  data=data, content_type='multipart/form-data')
-                
-                assert response.status_code == 200
-                result = json.loads(response.data)
-                assert result['success'] is True
+        excel_file = make_excel_file({
+            'Ignore1': [{'EarNum': 'SKIPPED001', 'Breed': '波爾羊'}],
+            'Basic': [{'EarNum': 'IGNORE001', 'Breed': '波爾羊'}],
+            'Ignore2': [{'EarNum': 'SKIPPED002', 'Breed': '波爾羊'}]
+        })
+
+        data = {
+            'file': (excel_file, 'ignore_test.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
+        
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert [s.EarNum for s in Sheep.query.all()] == ['IGNORE001']
 
     def test_export_excel_with_missing_sheep_map(self, authenticated_client, app, test_user):
         """測試匯出時缺少羊隻映射的情況"""
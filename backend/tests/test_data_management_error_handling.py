@@ -7,7 +7,7 @@ import pytest
 import json
 import io
 from datetime import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from app.models import Sheep, SheepEvent, SheepHistoricalData, ChatHistory
 
 
@@ -103,50 +103,32 @@ class TestDataManagementErrorHandling:
         assert 'error' in data
         assert '匯出 Excel 失敗' in data['error']
 
-    @patch('pandas.ExcelFile')
-    def test_process_import_with_breed_mapping(self, mock_excel_file, authenticated_client):
+    def test_process_import_with_breed_mapping(self, authenticated_client, finish_import_job, make_excel_file):
         """測試處理導入時的品種映射"""
-        # 設置模擬數據
-        mock_xls = MagicMock()
-        mock_xls.sheet_names = ['S2_Breed', '0009-0013A1_Basic']
-        mock_excel_file.return_value = mock_xls
-        
-        # 品種映射數據
-        breed_df = MagicMock()
-        breed_df.iterrows.return_value = [
-            (0, {'Symbol': '1', 'Breed': '波爾羊'}),
-            (1, {'Symbol': '2', 'Breed': '努比亞羊'})
-        ]
-        
-        # 基本資料
-        basic_df = MagicMock()
-        basic_df.iterrows.return_value = [
-            (0, {'EarNum': 'TEST001', 'Breed': '1', 'Sex': '1'})
-        ]
+        # 品種映射數據與基本資料
+        excel_file = make_excel_file({
+            'S2_Breed': [
+                {'Symbol': '1', 'Breed': '波爾羊'},
+                {'Symbol': '2', 'Breed': '努比亞羊'}
+            ],
+            '0009-0013A1_Basic': [
+                {'EarNum': 'TEST001', 'Breed': '1', 'Sex': '1'}
+            ]
+        })
+
+        data = {
+            'file': (excel_file, 'test.xlsx'),
+            'is_default_mode': 'true'
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
         
-        with patch('pandas.read_excel') as mock_read:
-            def side_effect(xls, sheet_name, dtype=None):
-                if sheet_name == 'S2_Breed':
-                    return breed_df
-                elif sheet_name == '0009-0013A1_Basic':
-                    return basic_df
-                return MagicMock()
-            
-            mock_read.side_effect = side_effect
-            breed_df.where.return_value = breed_df
-            basic_df.where.return_value = basic_df
-            
-            excel_content = b'\x50\x4b\x03\x04'
-            data = {
-                'file': (io.BytesIO(excel_content), 'test.xlsx'),
-                'is_default_mode': 'true'
-            }
-            response = authenticated_client.post('/api/data/process_import',
-                                              data=data, content_type='multipart/form-data')
-            
-            assert response.status_code == 200
-            result = json.loads(response.data)
-            assert result['success'] is True
+        assert response.status_code == 202
+        result = json.loads(response.data)
+        assert result['success'] is True
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert Sheep.query.filter_by(EarNum='TEST001').first().Breed == '波爾羊'
 
     @patch('pandas.ExcelFile')
     def test_process_import_exception_handling(self, mock_excel_file, authenticated_client):
@@ -167,50 +149,39 @@ class TestDataManagementErrorHandling:
         assert 'error' in result
         assert '導入數據過程中發生錯誤' in result['error']
 
-    @patch('pandas.ExcelFile')
-    def test_process_import_with_event_records(self, mock_excel_file, authenticated_client, test_sheep, db_session):
+    def test_process_import_with_event_records(self, authenticated_client, finish_import_job, test_sheep, db_session, make_excel_file):
         """測試處理導入事件記錄"""
-        # 重新附加 test_sheep 到 session
-        test_sheep_attached = db_session.merge(test_sheep)
-        db_session.commit()
-        
-        # 設置模擬數據
-        mock_xls = MagicMock()
-        mock_xls.sheet_names = ['0009-0013A4_Kidding']
-        mock_excel_file.return_value = mock_xls
-        
         # 產仔記錄數據
-        kidding_df = MagicMock()
-        kidding_df.iterrows.return_value = [
-            (0, {'EarNum': 'TEST001', 'YeanDate': '2024-01-15', 'KidNum': '2'})
-        ]
-        
-        with patch('pandas.read_excel') as mock_read:
-            mock_read.return_value = kidding_df
-            kidding_df.where.return_value = kidding_df
-            
-            # 簡化測試，直接測試導入功能而不依賴於非存在的方法
-            config = {
-                "sheets": {
-                    "0009-0013A4_Kidding": {
-                        "purpose": "kidding_record",
-                        "columns": {
-                            "EarNum": "EarNum",
-                            "YeanDate": "YeanDate", 
-                            "KidNum": "KidNum"
-                        }
+        excel_file = make_excel_file({
+            '0009-0013A4_Kidding': [
+                {'EarNum': 'TEST001', 'YeanDate': '2024-01-15', 'KidNum': '2'}
+            ]
+        })
+
+        config = {
+            "sheets": {
+                "0009-0013A4_Kidding": {
+                    "purpose": "kidding_record",
+                    "columns": {
+                        "EarNum": "EarNum",
+                        "YeanDate": "YeanDate", 
+                        "KidNum": "KidNum"
                     }
                 }
             }
-            
-            excel_content = b'\x50\x4b\x03\x04'
-            data = {
-                'file': (io.BytesIO(excel_content), 'test.xlsx'),
-                'is_default_mode': 'false',
-                'mapping_config': json.dumps(config)
-            }
-            response = authenticated_client.post('/api/data/process_import',
-                                              data=data, content_type='multipart/form-data')
-            
-            # 這個測試可能會因為實際的數據庫操作而失敗，但至少會測試到更多的代碼路徑
-            assert response.status_code in [200, 500]  # 允許兩種結果，因為可能有數據庫約束問題
+        }
+        
+        data = {
+            'file': (excel_file, 'test.xlsx'),
+            'is_default_mode': 'false',
+            'mapping_config': json.dumps(config)
+        }
+        response = authenticated_client.post('/api/data/process_import',
+                                          data=data, content_type='multipart/form-data')
+        
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        event = SheepEvent.query.filter_by(sheep_id=test_sheep.id).one()
+        assert event.event_type == '產仔'
+        assert event.event_date == '2024-01-15'
+        assert event.description == '產下仔羊: 2'
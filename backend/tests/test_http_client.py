@@ -0,0 +1,208 @@
+"""
+Gemini API 連線池測試
+以本地的模擬伺服器驗證連線重用、429/5xx 重試與逾時設定。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.http_client import create_http_session, get_http_session, get_timeout
+from app.utils import call_gemini_api, stream_gemini_api
+
+GEMINI_REPLY = {"candidates": [{"content": {"parts": [{"text": "模擬回應"}]}, "finishReason": "STOP"}]}
+
+
+class StubGeminiServer(ThreadingHTTPServer):
+    """模擬 Gemini API：依序返回指定的狀態碼，並記錄連線與請求數"""
+    daemon_threads = True
+
+    def __init__(self, setup_delay=0.0):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.setup_delay = setup_delay  # 模擬每次建立連線的成本 (DNS/TCP/TLS)
+        self.response_delay = 0.0
+        self.stream_chunks = []  # 串流端點依序送出的文字片段
+        self.chunk_delay = 0.0  # 模擬模型產生每個片段的時間
+        self.paths = []
+        self.statuses = []
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 標頭與內容一次送出，避免 Nagle 演算法與延遲確認造成的額外等待
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+        time.sleep(self.server.setup_delay)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server._lock:
+            self.server.requests += 1
+            self.server.paths.append(self.path)
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        time.sleep(self.server.response_delay)
+        if status == 200 and 'streamGenerateContent' in self.path:
+            return self._stream()
+        body = json.dumps(GEMINI_REPLY if status == 200 else {"error": {"message": "模擬錯誤"}}).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        """以 chunked 傳輸逐段送出 server-sent events"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunks = self.server.stream_chunks
+        for index, text in enumerate(chunks):
+            if index:
+                time.sleep(self.server.chunk_delay)
+            candidate = {"content": {"parts": [{"text": text}], "role": "model"}}
+            if index == len(chunks) - 1:
+                candidate["finishReason"] = "STOP"
+            event = f"data: {json.dumps({'candidates': [candidate]})}\r\n\r\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(app):
+    server = StubGeminiServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    app.config.update(GEMINI_API_BASE_URL=server.url, HTTP_BACKOFF_FACTOR=0, HTTP_BACKOFF_JITTER=0)
+    app.extensions.pop('http_session', None)
+    yield server
+    server.shutdown()
+    server.server_close()
+    session = app.extensions.pop('http_session', None)
+    if session is not None:
+        session.close()
+
+
+class TestGeminiConnectionPool:
+    """Gemini API 連線池測試類別"""
+
+    def test_calls_reuse_one_connection(self, app, stub_server):
+        """測試連續呼叫重用同一個連線"""
+        for _ in range(5):
+            assert call_gemini_api('你好', 'test-key') == {"text": "模擬回應", "finish_reason": "STOP"}
+
+        assert stub_server.requests == 5
+        assert stub_server.connections == 1
+        assert get_http_session() is get_http_session(app)
+
+    def test_retries_rate_limit_and_server_errors(self, app, stub_server):
+        """測試 429 與 5xx 回應會重試，成功後返回結果"""
+        stub_server.statuses = [429, 503, 500]
+
+        assert call_gemini_api('你好', 'test-key')['text'] == '模擬回應'
+        assert stub_server.requests == 4
+
+    def test_gives_up_after_max_retries(self, app, stub_server):
+        """測試重試用盡後返回錯誤，不會無限重試"""
+        app.config['HTTP_MAX_RETRIES'] = 2
+        stub_server.statuses = [503] * 10
+
+        result = call_gemini_api('你好', 'test-key')
+        assert '模擬錯誤' in result['error']
+        assert stub_server.requests == 3
+
+    def test_client_errors_are_not_retried(self, app, stub_server):
+        """測試 4xx (429 除外) 不重試"""
+        stub_server.statuses = [400]
+
+        assert 'error' in call_gemini_api('你好', 'test-key')
+        assert stub_server.requests == 1
+
+    def test_read_timeout_is_separate_and_not_retried(self, app, stub_server):
+        """測試讀取逾時與連線逾時分開設定，讀取逾時不重試"""
+        app.config.update(HTTP_CONNECT_TIMEOUT=2, HTTP_READ_TIMEOUT=0.2)
+        stub_server.response_delay = 0.5
+
+        assert get_timeout() == (2, 0.2)
+        assert '網路或請求錯誤' in call_gemini_api('你好', 'test-key')['error']
+        assert stub_server.requests == 1
+
+    def test_pooled_session_saves_connection_setup(self):
+        """測試重用連線省下每次呼叫的連線建立時間"""
+        server = StubGeminiServer(setup_delay=0.05)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        url = f'{server.url}/v1beta/models/test:generateContent'
+        calls = 8
+        try:
+            start = time.perf_counter()
+            for _ in range(calls):
+                requests.post(url, data='{}', headers={'Connection': 'close'}, timeout=5).raise_for_status()
+            fresh = time.perf_counter() - start
+            fresh_connections = server.connections
+
+            session = create_http_session()
+            server.connections = 0
+            start = time.perf_counter()
+            for _ in range(calls):
+                session.post(url, data='{}', timeout=5).raise_for_status()
+            pooled = time.perf_counter() - start
+            session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert fresh_connections == calls
+        assert server.connections == 1
+        # 每次新建連線約多 50ms，重用連線應省下其中大部分
+        assert fresh - pooled > 0.05 * (calls - 2)
+
+
+class TestGeminiStreaming:
+    """Gemini 串流 API 測試類別"""
+
+    def test_first_chunk_arrives_before_completion(self, app, stub_server):
+        """測試第一段文字在模型完成前就返回"""
+        stub_server.stream_chunks = ['羊隻', '需要', '乾淨', '飲水']
+        stub_server.chunk_delay = 0.2
+
+        start = time.perf_counter()
+        chunks = []
+        for chunk in stream_gemini_api('你好', 'test-key'):
+            chunks.append((time.perf_counter() - start, chunk))
+        first_token, total = chunks[0][0], chunks[-1][0]
+
+        assert [c for _, c in chunks] == [
+            {'text': '羊隻'}, {'text': '需要'}, {'text': '乾淨'}, {'text': '飲水'}, {'text': '', 'finish_reason': 'STOP'}
+        ]
+        assert 'streamGenerateContent' in stub_server.paths[0] and 'alt=sse' in stub_server.paths[0]
+        assert first_token < 0.2 <= total - first_token
+
+    def test_stream_errors(self, app, stub_server):
+        """測試串流請求失敗時返回單一錯誤"""
+        stub_server.statuses = [400]
+        assert list(stream_gemini_api('你好', 'test-key')) == [{'error': '模擬錯誤 (碼: N/A)'}]
+
+        stub_server.statuses = [503] * 10
+        app.config['HTTP_MAX_RETRIES'] = 1
+        assert '模擬錯誤' in list(stream_gemini_api('你好', 'test-key'))[0]['error']
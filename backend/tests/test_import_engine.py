@@ -0,0 +1,371 @@
+"""
+數據導入引擎測試
+"""
+
+import pytest
+import pandas as pd
+from datetime import datetime
+from app import db
+from app.models import Sheep, SheepEvent, SheepHistoricalData
+from app.import_engine import (
+    DEFAULT_IMPORT_CONFIG, ExcelWorkbookSource, analyze_workbook, float_column, format_date,
+    format_date_column, map_code_column, record_fingerprint, run_import
+)
+
+
+class TestImportEngine:
+    """分塊導入引擎測試類別"""
+
+    def test_format_date_semantics(self):
+        """測試日期格式化規則與原有導入流程一致"""
+        assert format_date('2024-01-15') == '2024-01-15'
+        assert format_date('2024/1/5') == '2024-01-05'
+        assert format_date('2024-01-15 00:00:00') == '2024-01-15'
+        assert format_date('1900-01-01') is None
+        assert format_date('1900/1/1') is None
+        assert format_date('not-a-date') is None
+        assert format_date(None) is None
+
+    def test_format_date_column_matches_format_date(self):
+        """測試向量化日期格式化與逐值 format_date 結果一致"""
+        values = [
+            None, '2024-01-15', '2024/1/5', '2024-01-15 00:00:00', '1900-01-01', '1900/1/1 00:00:00',
+            '1899-12-31', '0001-01-01', '2024-02-30', 'not-a-date', '20240115', 'Jan 5 2024', '5/1/24', '2024-01-15',
+        ]
+        assert format_date_column(values).tolist() == [format_date(v) for v in values]
+
+        mixed_timezones = [None, '2024-01-15T08:00:00+08:00', '2024-01-15T23:00:00-05:00', '2024-01-16']
+        assert format_date_column(mixed_timezones).tolist() == [format_date(v) for v in mixed_timezones]
+
+    def test_float_and_code_columns(self):
+        """測試數值轉換與代碼映射的向量化結果"""
+        numbers, valid = float_column([None, '2.5', ' 3 ', '1_000', 'n/a', 'inf'])
+        assert valid.tolist() == [False, True, True, True, False, True]
+        assert numbers[valid].tolist() == [2.5, 3.0, 1000.0, float('inf')]
+
+        mapped = map_code_column(['1', '2', None, '9'], {'1': '波爾羊', '2': None})
+        assert mapped.tolist() == ['波爾羊', None, None, '9']
+
+    def test_iter_chunks_matches_read_excel(self, make_excel_file):
+        """測試串流分塊讀取的結果與 pd.read_excel(dtype=str) 相同"""
+        rows = [
+            {'EarNum': f'E{i:03d}', 'BirWei': 3 if i % 2 else 2.5, 'BirthDate': datetime(2023, 1, i + 1), 'Note': 'NA' if i == 3 else None}
+            for i in range(7)
+        ]
+        excel_file = make_excel_file({'Sheet1': rows})
+        expected = pd.read_excel(excel_file, sheet_name='Sheet1', dtype=str)
+        expected = expected.where(pd.notna(expected), None)
+        excel_file.seek(0)
+
+        source = ExcelWorkbookSource(pd.ExcelFile(excel_file))
+        chunks = list(source.iter_chunks('Sheet1', chunk_size=3))
+
+        assert [len(c) for c in chunks] == [3, 3, 1]
+        combined = pd.concat(chunks, ignore_index=True)
+        assert combined.to_dict(orient='records') == expected.to_dict(orient='records')
+
+    def test_iter_chunks_header_and_cell_formatting(self, make_excel_file):
+        """測試標題列命名、重複欄位、空值字串與數值格式與 pd.read_excel(dtype=str) 相同"""
+        import openpyxl
+        from io import BytesIO
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = 'Sheet1'
+        sheet.append(['A', None, 'A', 'A.1', 2023, 'A'])
+        sheet.append([1.0, 'NA', 2.5, '', 1e20, datetime(2023, 1, 2)])
+        sheet.append([])
+        sheet.append(['null', ' ', None, '=1/0', -4])
+        excel_file = BytesIO()
+        workbook.save(excel_file)
+        excel_file.seek(0)
+        expected = pd.read_excel(excel_file, sheet_name='Sheet1', dtype=str)
+        expected = expected.where(pd.notna(expected), None)
+        excel_file.seek(0)
+
+        chunks = list(ExcelWorkbookSource(pd.ExcelFile(excel_file)).iter_chunks('Sheet1', chunk_size=2))
+
+        combined = pd.concat(chunks, ignore_index=True)
+        assert list(combined.columns) == list(expected.columns)
+        assert combined.to_dict(orient='records') == expected.to_dict(orient='records')
+
+    def test_basic_info_chunked_create_and_update(self, app, test_user, make_excel_file):
+        """測試基礎資料分塊新增與更新，以及每個分塊的報告"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001', Breed='舊品種', FarmNum='F009'))
+        db.session.commit()
+
+        excel_file = make_excel_file({
+            'S2_Breed': [{'Symbol': 1, 'Breed': '波爾羊'}],
+            'S7_Sex': [{'Num': 2, 'Sex': '母'}],
+            '0009-0013A1_Basic': [
+                {'EarNum': 'E001', 'Breed': 1, 'Sex': 2, 'BirthDate': '2023-01-15'},
+                {'EarNum': 'E002', 'Breed': 1, 'Sex': 2, 'BirthDate': '1900-01-01'},
+                {'EarNum': None, 'Breed': 1, 'Sex': 2, 'BirthDate': None},
+                {'EarNum': 'E003', 'Breed': 9, 'Sex': 2, 'BirthDate': None},
+                {'EarNum': 'E002', 'Breed': 1, 'Sex': 2, 'BirthDate': '2023-03-01'},
+            ]
+        })
+
+        source = ExcelWorkbookSource(pd.ExcelFile(excel_file))
+        report = run_import(source, DEFAULT_IMPORT_CONFIG, test_user.id, chunk_size=2)
+
+        assert report[0]['sheet'] == '0009-0013A1_Basic'
+        assert report[0]['message'] == '處理完成。新增 2 筆，更新 2 筆基礎資料。'
+        assert report[0]['chunks'] == [
+            {'chunk': 1, 'rows': 2, 'created': 1, 'updated': 1},
+            {'chunk': 2, 'rows': 2, 'created': 1, 'updated': 0},
+            {'chunk': 3, 'rows': 1, 'created': 0, 'updated': 1},
+        ]
+
+        sheep = {s.EarNum: s for s in Sheep.query.filter_by(user_id=test_user.id).all()}
+        assert set(sheep) == {'E001', 'E002', 'E003'}
+        assert sheep['E001'].Breed == '波爾羊'
+        assert sheep['E001'].Sex == '母'
+        assert sheep['E001'].BirthDate == '2023-01-15'
+        assert sheep['E001'].FarmNum == 'F009'  # 未映射的欄位保持不變
+        assert sheep['E002'].BirthDate == '2023-03-01'
+        assert sheep['E003'].Breed == '9'
+
+    def test_record_sheets_bulk_insert(self, app, test_user, make_excel_file):
+        """測試事件與歷史數據分塊批次寫入"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+
+        excel_file = make_excel_file({
+            '0009-0013A3_Yean': [
+                {'EarNum': 'E001', 'YeanDate': '2024-01-15', 'DryOffDate': '2024-06-15', 'Lactation': 1},
+                {'EarNum': 'UNKNOWN', 'YeanDate': '2024-01-15', 'DryOffDate': None, 'Lactation': 1},
+            ],
+            '0009-0013A9_Milk': [
+                {'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5},
+                {'EarNum': 'E001', 'MeaDate': '2024-02-02', 'Milk': 'n/a'},
+                {'EarNum': 'E001', 'MeaDate': '1900-01-01', 'Milk': 3},
+                {'EarNum': 'E001', 'MeaDate': '2024-02-03', 'Milk': 3},
+            ]
+        })
+
+        source = ExcelWorkbookSource(pd.ExcelFile(excel_file))
+        report = run_import(source, DEFAULT_IMPORT_CONFIG, test_user.id, chunk_size=2)
+
+        assert {r['sheet']: r['message'] for r in report} == {
+            '0009-0013A3_Yean': '成功導入 2 筆記錄。',
+            '0009-0013A9_Milk': '成功導入 2 筆記錄。',
+        }
+        milk_report = next(r for r in report if r['sheet'] == '0009-0013A9_Milk')
+        assert [c['imported'] for c in milk_report['chunks']] == [1, 1]
+
+        events = SheepEvent.query.filter_by(user_id=test_user.id).order_by(SheepEvent.event_date).all()
+        assert [(e.event_date, e.event_type, e.description) for e in events] == [
+            ('2024-01-15', '泌乳開始', '第 1 胎次'),
+            ('2024-06-15', '乾乳', '第 1 胎次結束'),
+        ]
+        history = SheepHistoricalData.query.filter_by(user_id=test_user.id).order_by(SheepHistoricalData.record_date).all()
+        assert [(h.record_date, h.value) for h in history] == [('2024-02-01', 2.5), ('2024-02-03', 3.0)]
+        assert all(h.recorded_at is not None for h in history)
+
+    def test_event_sheets_descriptions(self, app, test_user, make_excel_file):
+        """測試產仔與配種記錄的說明欄位，以及缺少說明欄位時的處理"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+
+        excel_file = make_excel_file({
+            '0009-0013A4_Kidding': [
+                {'EarNum': 'E001', 'YeanDate': '2024-03-01', 'KidNum': 2},
+                {'EarNum': 'E001', 'YeanDate': '2024-04-01', 'KidNum': None},
+                {'EarNum': 'E001', 'YeanDate': None, 'KidNum': 1},
+            ],
+            '0009-0013A2_PubMat': [{'EarNum': 'E001', 'Mat_date': '2023-10-01'}],
+        })
+
+        run_import(ExcelWorkbookSource(pd.ExcelFile(excel_file)), DEFAULT_IMPORT_CONFIG, test_user.id)
+
+        events = SheepEvent.query.filter_by(user_id=test_user.id).order_by(SheepEvent.event_date).all()
+        assert [(e.event_date, e.event_type, e.description) for e in events] == [
+            ('2023-10-01', '配種', None),
+            ('2024-03-01', '產仔', '產下仔羊: 2'),
+            ('2024-04-01', '產仔', '產下仔羊: None'),
+        ]
+
+    def test_event_description_suffix(self, app, test_user, make_excel_file, monkeypatch):
+        """測試說明格式的後綴也會寫入說明欄位"""
+        from app import import_engine
+
+        monkeypatch.setitem(import_engine.EVENT_PURPOSES, 'kidding_record', ('產仔', 'YeanDate', 'KidNum', '產下 ', ' 隻仔羊'))
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        excel_file = make_excel_file({'0009-0013A4_Kidding': [{'EarNum': 'E001', 'YeanDate': '2024-03-01', 'KidNum': 2}]})
+
+        run_import(ExcelWorkbookSource(pd.ExcelFile(excel_file)), DEFAULT_IMPORT_CONFIG, test_user.id)
+
+        assert [e.description for e in SheepEvent.query.filter_by(user_id=test_user.id)] == ['產下 2 隻仔羊']
+
+    def test_failed_chunk_keeps_committed_chunks(self, app, test_user, make_excel_file, monkeypatch):
+        """測試分塊提交：失敗的分塊不影響先前已提交的分塊"""
+        from app import import_engine
+
+        excel_file = make_excel_file({
+            '0009-0013A1_Basic': [{'EarNum': f'E{i:03d}'} for i in range(4)]
+        })
+        original = import_engine._import_basic_chunk
+        calls = []
+
+        def failing_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('chunk failure')
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(import_engine, '_import_basic_chunk', failing_chunk)
+        source = ExcelWorkbookSource(pd.ExcelFile(excel_file))
+        with pytest.raises(RuntimeError):
+            run_import(source, DEFAULT_IMPORT_CONFIG, test_user.id, chunk_size=2)
+        db.session.rollback()
+
+        assert sorted(s.EarNum for s in Sheep.query.filter_by(user_id=test_user.id)) == ['E000', 'E001']
+
+
+class TestAnalyzeWorkbook:
+    """快速工作表分析測試類別"""
+
+    def test_analyze_matches_full_parse(self, make_excel_file):
+        """測試快速分析的欄位、列數與預覽和完整解析一致"""
+        excel_file = make_excel_file({
+            'Basic': [{'EarNum': f'E{i:03d}', 'BirWei': 3.5, 'Note': None} for i in range(50)],
+            'Short': [{'EarNum': 'E001', 'Milk': 2}],
+            'HeaderOnly': pd.DataFrame(columns=['EarNum', 'MeaDate']),
+        })
+        xls = pd.ExcelFile(excel_file)
+
+        result = analyze_workbook(xls)
+
+        for sheet_name in xls.sheet_names:
+            df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
+            df = df.where(pd.notna(df), None)
+            assert result[sheet_name] == {
+                'columns': list(df.columns),
+                'rows': len(df),
+                'preview': df.head(3).to_dict(orient='records'),
+            }
+
+    def test_analyze_reads_only_preview_window(self, make_excel_file, monkeypatch):
+        """測試快速分析只轉換標題列與預覽範圍內的儲存格"""
+        from app import import_engine
+
+        excel_file = make_excel_file({'Basic': [{'EarNum': f'E{i:03d}'} for i in range(500)]})
+        converted = []
+        original = import_engine.format_cell
+        monkeypatch.setattr(import_engine, 'format_cell', lambda cell: converted.append(1) or original(cell))
+
+        result = ExcelWorkbookSource(pd.ExcelFile(excel_file)).analyze('Basic', preview_rows=3)
+
+        assert result['rows'] == 500
+        assert [r['EarNum'] for r in result['preview']] == ['E000', 'E001', 'E002']
+        assert len(converted) <= 5
+
+    def test_analyze_endpoint_fast_and_full_modes(self, authenticated_client, make_excel_file):
+        """測試分析端點的快速模式與完整模式返回相同結果"""
+        sheets = {'Sheet1': [{'EarNum': f'E{i:03d}', 'Breed': '波爾羊'} for i in range(10)]}
+
+        fast = authenticated_client.post('/api/data/analyze_excel', data={'file': (make_excel_file(sheets), 'a.xlsx')}, content_type='multipart/form-data')
+        full = authenticated_client.post('/api/data/analyze_excel?mode=full', data={'file': (make_excel_file(sheets), 'a.xlsx')}, content_type='multipart/form-data')
+
+        assert fast.status_code == 200
+        assert fast.get_json()['sheets'] == full.get_json()['sheets']
+        assert fast.get_json()['sheets']['Sheet1']['rows'] == 10
+
+
+class TestDedupeImport:
+    """去除重複導入測試類別"""
+
+    def _workbook(self, make_excel_file, milk_rows):
+        return make_excel_file({
+            '0009-0013A4_Kidding': [{'EarNum': 'E001', 'YeanDate': '2024-03-01', 'KidNum': 2}],
+            '0009-0013A3_Yean': [{'EarNum': 'E001', 'YeanDate': '2024-01-15', 'DryOffDate': '2024-06-15', 'Lactation': 1}],
+            '0009-0013A9_Milk': milk_rows,
+        })
+
+    def test_reimport_skips_existing_records(self, app, test_user, make_excel_file):
+        """測試去除重複模式下重複導入同一檔案不會新增記錄，只寫入新的記錄"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        config = {**DEFAULT_IMPORT_CONFIG, 'dedupe': True}
+        milk = [{'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5}, {'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5}]
+
+        first = run_import(ExcelWorkbookSource(pd.ExcelFile(self._workbook(make_excel_file, milk))), config, test_user.id)
+        milk.append({'EarNum': 'E001', 'MeaDate': '2024-02-02', 'Milk': 3})
+        second = run_import(ExcelWorkbookSource(pd.ExcelFile(self._workbook(make_excel_file, milk))), config, test_user.id)
+
+        assert {r['sheet']: r['message'] for r in first}['0009-0013A9_Milk'] == '成功導入 1 筆記錄。略過 1 筆已存在的記錄。'
+        assert {r['sheet']: r['message'] for r in second} == {
+            '0009-0013A4_Kidding': '成功導入 0 筆記錄。略過 1 筆已存在的記錄。',
+            '0009-0013A3_Yean': '成功導入 0 筆記錄。略過 2 筆已存在的記錄。',
+            '0009-0013A9_Milk': '成功導入 1 筆記錄。略過 2 筆已存在的記錄。',
+        }
+        assert SheepEvent.query.filter_by(user_id=test_user.id).count() == 3
+        history = SheepHistoricalData.query.filter_by(user_id=test_user.id).order_by(SheepHistoricalData.record_date).all()
+        assert [(h.record_date, h.value) for h in history] == [('2024-02-01', 2.5), ('2024-02-02', 3.0)]
+        assert all(h.fingerprint for h in history)
+
+    def test_changed_value_is_a_new_record(self, app, test_user, make_excel_file):
+        """測試數值不同的記錄視為新記錄"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        config = {**DEFAULT_IMPORT_CONFIG, 'dedupe': True}
+
+        for value in (2.5, 2.6, 2.5):
+            excel_file = make_excel_file({'0009-0013A9_Milk': [{'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': value}]})
+            run_import(ExcelWorkbookSource(pd.ExcelFile(excel_file)), config, test_user.id)
+
+        assert sorted(h.value for h in SheepHistoricalData.query.filter_by(user_id=test_user.id)) == [2.5, 2.6]
+
+    def test_default_mode_keeps_appending(self, app, test_user, make_excel_file):
+        """測試未啟用去除重複模式時維持原有的附加行為"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        milk = [{'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5}]
+
+        for _ in range(2):
+            run_import(ExcelWorkbookSource(pd.ExcelFile(make_excel_file({'0009-0013A9_Milk': milk}))), DEFAULT_IMPORT_CONFIG, test_user.id)
+
+        history = SheepHistoricalData.query.filter_by(user_id=test_user.id).all()
+        assert len(history) == 2
+        assert all(h.fingerprint is None for h in history)
+
+    def test_process_import_dedupe_flag(self, authenticated_client, test_user, make_excel_file, finish_import_job):
+        """測試導入 API 的 dedupe 參數"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        sheets = {'0009-0013A9_Milk': [{'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5}]}
+
+        for _ in range(2):
+            response = authenticated_client.post('/api/data/process_import', data={
+                'file': (make_excel_file(sheets), 'milk.xlsx'), 'is_default_mode': 'true', 'dedupe': 'true'
+            }, content_type='multipart/form-data')
+            job = finish_import_job(response)
+            assert job['status'] == 'completed'
+
+        assert job['report_details'][0]['chunks'] == [{'chunk': 1, 'rows': 1, 'imported': 0, 'skipped': 1}]
+        assert SheepHistoricalData.query.filter_by(user_id=test_user.id).count() == 1
+
+    def test_edited_record_gets_new_fingerprint(self, app, test_user, make_excel_file):
+        """測試修改已導入的記錄後重新計算指紋：再次導入原內容時視為新記錄，與其他記錄相同時清除指紋"""
+        db.session.add(Sheep(user_id=test_user.id, EarNum='E001'))
+        db.session.commit()
+        config = {**DEFAULT_IMPORT_CONFIG, 'dedupe': True}
+        milk = {'0009-0013A9_Milk': [
+            {'EarNum': 'E001', 'MeaDate': '2024-02-01', 'Milk': 2.5}, {'EarNum': 'E001', 'MeaDate': '2024-02-02', 'Milk': 3.0}
+        ]}
+        run_import(ExcelWorkbookSource(pd.ExcelFile(make_excel_file(milk))), config, test_user.id)
+        first, second = SheepHistoricalData.query.filter_by(user_id=test_user.id).order_by(SheepHistoricalData.record_date).all()
+
+        first.value = 2.8
+        db.session.commit()
+        second.record_date = '2024/02/01'
+        second.value = 2.8
+        db.session.commit()
+
+        assert first.fingerprint == record_fingerprint(first.sheep_id, '2024-02-01', 'milk_yield_kg_day', 2.8)
+        assert second.fingerprint is None
+
+        reports = run_import(ExcelWorkbookSource(pd.ExcelFile(make_excel_file(milk))), config, test_user.id)
+        assert reports[0]['message'] == '成功導入 2 筆記錄。'
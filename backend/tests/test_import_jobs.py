@@ -0,0 +1,177 @@
+"""
+背景導入任務測試
+"""
+
+import io
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from app import db
+from app import import_jobs
+from app.import_engine import DEFAULT_IMPORT_CONFIG
+from app.models import ImportJob, Sheep, SheepHistoricalData, User
+
+
+class TestImportJobs:
+    """導入任務 API 與續跑機制測試類別"""
+
+    def test_process_import_returns_job_id(self, authenticated_client, make_excel_file, finish_import_job):
+        """測試導入請求立即返回任務 ID，完成後可查詢各工作表進度與報告"""
+        excel_file = make_excel_file({
+            '0009-0013A1_Basic': [{'EarNum': f'JOB{i:03d}'} for i in range(5)]
+        })
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (excel_file, 'job.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+
+        result = response.get_json()
+        assert response.status_code == 202
+        assert result['job_id']
+        assert result['status_url'].endswith(f"/api/data/jobs/{result['job_id']}")
+
+        job = finish_import_job(response)
+        assert job['status'] == 'completed'
+        assert job['rows_processed'] == {'0009-0013A1_Basic': 5}
+        assert job['report_details'][0]['message'] == '處理完成。新增 5 筆，更新 0 筆基礎資料。'
+        assert job['error'] is None
+        assert Sheep.query.count() == 5
+
+    def test_process_import_invalid_workbook(self, authenticated_client):
+        """測試無法解析的檔案會立即回報錯誤，不建立任務"""
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (io.BytesIO(b'not an excel file'), 'broken.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 500
+        assert '導入數據過程中發生錯誤' in response.get_json()['error']
+        assert ImportJob.query.count() == 0
+
+    def test_get_job_not_found(self, authenticated_client):
+        """測試查詢不存在的任務"""
+        response = authenticated_client.get('/api/data/jobs/does-not-exist')
+        assert response.status_code == 404
+
+    def test_get_job_of_other_user(self, authenticated_client, app):
+        """測試無法查詢其他用戶的任務"""
+        other = User(username='other_job_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(ImportJob(id='other-job', user_id=other.id, status='completed', config={}))
+        db.session.commit()
+
+        response = authenticated_client.get('/api/data/jobs/other-job')
+        assert response.status_code == 404
+
+    def test_resume_stale_job_skips_committed_rows(self, app, test_user, make_excel_file, tmp_path):
+        """測試工作程序中斷後，逾時的任務會從已提交的列之後續跑"""
+        sheep = Sheep(user_id=test_user.id, EarNum='RES001')
+        db.session.add(sheep)
+        db.session.commit()
+
+        file_path = tmp_path / 'resume.xlsx'
+        file_path.write_bytes(make_excel_file({
+            '0009-0013A9_Milk': [{'EarNum': 'RES001', 'MeaDate': f'2024-02-0{i + 1}', 'Milk': i + 1} for i in range(4)]
+        }).getvalue())
+        # 模擬前兩列已在中斷前提交
+        for i in range(2):
+            db.session.add(SheepHistoricalData(user_id=test_user.id, sheep_id=sheep.id, record_date=f'2024-02-0{i + 1}', record_type='milk_yield_kg_day', value=i + 1))
+        job = ImportJob(
+            id='stale-job', user_id=test_user.id, status='running', file_path=str(file_path),
+            config=DEFAULT_IMPORT_CONFIG, rows_processed={'0009-0013A9_Milk': 2}
+        )
+        db.session.add(job)
+        db.session.commit()
+        db.session.query(ImportJob).filter_by(id='stale-job').update({'updated_at': datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+
+        import_jobs.resume_pending_jobs(app)
+        import_jobs.wait_for_job('stale-job', timeout=60)
+        db.session.expire_all()
+
+        job = db.session.get(ImportJob, 'stale-job')
+        assert job.status == 'completed'
+        assert job.rows_processed == {'0009-0013A9_Milk': 4}
+        values = sorted(h.value for h in SheepHistoricalData.query.filter_by(sheep_id=sheep.id))
+        assert values == [1.0, 2.0, 3.0, 4.0]
+        assert not os.path.exists(file_path)
+
+    def test_resume_ignores_recently_active_job(self, app, test_user):
+        """測試仍在心跳期間內的執行中任務不會被重複執行"""
+        db.session.add(ImportJob(id='active-job', user_id=test_user.id, status='running', config={}))
+        db.session.commit()
+
+        import_jobs.resume_pending_jobs(app)
+
+        assert 'active-job' not in import_jobs._futures
+        assert db.session.get(ImportJob, 'active-job').status == 'running'
+
+    def test_heartbeat_keeps_long_running_job(self, app, test_user, monkeypatch, tmp_path):
+        """測試執行中的任務在長時間沒有提交分塊時仍會更新心跳，不會被重新排隊"""
+        app.config.update(IMPORT_JOB_HEARTBEAT_SECONDS=0.05, IMPORT_JOB_STALE_SECONDS=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_import(source, config, user_id, **kwargs):
+            started.set()
+            release.wait(10)
+            return []
+
+        monkeypatch.setattr(import_jobs, 'run_import', slow_import)
+        monkeypatch.setattr(import_jobs, '_open_job_source', lambda app, job: io.BytesIO())
+        job = import_jobs.enqueue_import_job(str(tmp_path / 'slow.xlsx'), DEFAULT_IMPORT_CONFIG, test_user.id)
+        try:
+            assert started.wait(10)
+            time.sleep(1.5)
+            import_jobs.resume_pending_jobs(app)
+            db.session.expire_all()
+            assert db.session.get(ImportJob, job.id).status == 'running'
+        finally:
+            release.set()
+        import_jobs.wait_for_job(job.id, timeout=10)
+        db.session.expire_all()
+        assert db.session.get(ImportJob, job.id).status == 'completed'
+
+    def test_preempted_run_does_not_commit(self, app, test_user, make_excel_file, monkeypatch, tmp_path):
+        """測試任務被其他執行接手後，原本的執行不會再提交分塊或最終狀態"""
+        file_path = tmp_path / 'preempted.xlsx'
+        file_path.write_bytes(make_excel_file({
+            '0009-0013A1_Basic': [{'EarNum': f'PRE{i:03d}'} for i in range(3)]
+        }).getvalue())
+        run_import = import_jobs.run_import
+
+        def preempted_import(source, config, user_id, **kwargs):
+            # 模擬心跳逾時後任務被重新排隊並由其他執行領取
+            db.session.query(ImportJob).update({'run_token': 'other-run'})
+            db.session.commit()
+            return run_import(source, config, user_id, **kwargs)
+
+        monkeypatch.setattr(import_jobs, 'run_import', preempted_import)
+        job = import_jobs.enqueue_import_job(str(file_path), DEFAULT_IMPORT_CONFIG, test_user.id)
+        import_jobs.wait_for_job(job.id, timeout=60)
+        db.session.expire_all()
+
+        job = db.session.get(ImportJob, job.id)
+        assert job.run_token == 'other-run'
+        assert job.status == 'running'
+        assert job.rows_processed == {}
+        assert Sheep.query.count() == 0
+        assert os.path.exists(file_path)
+
+    def test_cli_resumes_queued_jobs(self, app, runner, test_user, make_excel_file, tmp_path):
+        """測試以 CLI 指令續跑排隊中的任務 (一般請求不再觸發續跑)"""
+        file_path = tmp_path / 'queued.xlsx'
+        file_path.write_bytes(make_excel_file({'0009-0013A1_Basic': [{'EarNum': 'CLI001'}]}).getvalue())
+        db.session.add(ImportJob(id='queued-job', user_id=test_user.id, status='queued', file_path=str(file_path), config=DEFAULT_IMPORT_CONFIG))
+        db.session.commit()
+
+        app.test_client().get('/api/auth/status')
+        assert 'queued-job' not in import_jobs._futures
+
+        result = runner.invoke(args=['resume-import-jobs'])
+        assert '已續跑 1 個導入任務' in result.output
+        db.session.expire_all()
+        assert db.session.get(ImportJob, 'queued-job').status == 'completed'
+        assert Sheep.query.filter_by(EarNum='CLI001').count() == 1
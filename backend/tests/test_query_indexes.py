@@ -0,0 +1,120 @@
+"""
+常用查詢索引測試
+擷取各端點實際執行的查詢，並以 EXPLAIN 檢查是否使用對應的複合索引。
+設定 TEST_POSTGRES_URL 時同時在 PostgreSQL 上檢查查詢計畫 (在臨時 schema 中建立資料表，結束後刪除)。
+"""
+
+import os
+import uuid
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import create_engine, event, text
+from app import db
+from app.models import SheepEvent, SheepHistoricalData
+
+
+@contextmanager
+def captured_statements():
+    """記錄期間 ORM 執行的所有查詢"""
+    statements = []
+
+    def record(state):
+        statements.append(state.statement)
+
+    event.listen(db.session, 'do_orm_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.session, 'do_orm_execute', record)
+
+
+def explain(connection, statement):
+    """返回查詢在目前資料庫上的查詢計畫文字"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'postgresql':
+        # 測試資料量很小，關閉循序掃描以確認索引可被使用
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+        return '\n'.join(row[0] for row in connection.execute(text(f'EXPLAIN {sql}')))
+    return '\n'.join(str(row[-1]) for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+
+def assert_uses_index(connection, statements, table, index, ordered=True):
+    """擷取的查詢中，讀取指定資料表的查詢都使用索引；ordered 時排序也由索引提供"""
+    matching = [s for s in statements if f'FROM {table}' in str(s)]
+    assert matching, f'沒有查詢 {table}'
+    for statement in matching:
+        plan = explain(connection, statement)
+        assert index in plan, plan
+        if connection.dialect.name == 'postgresql':
+            assert 'Seq Scan' not in plan, plan
+        elif ordered:
+            assert 'TEMP B-TREE FOR ORDER BY' not in plan, plan
+
+
+def run_hot_endpoints(client):
+    """呼叫使用這些查詢的端點，返回 (資料表, 索引, 是否依索引排序, 查詢列表) 的列表"""
+    with captured_statements() as events:
+        client.get('/api/sheep/TEST001/events')
+    with captured_statements() as history:
+        client.get('/api/sheep/TEST001/history')
+    with captured_statements() as chat:
+        client.post('/api/agent/chat', json={
+            'api_key': 'test-api-key', 'message': '你好', 'session_id': 'index-session', 'ear_num_context': 'TEST001'
+        })
+    with captured_statements() as report:
+        client.get('/api/dashboard/farm_report?sections=health_summary')
+    return [
+        ('sheep_event', 'ix_sheep_event_sheep_event_date', True, events),
+        ('sheep_historical_data', 'ix_sheep_historical_data_sheep_user_record_date', True, history),
+        ('chat_history', 'ix_chat_history_user_session_timestamp', True, chat),
+        # 聊天時載入的羊隻上下文以單一查詢合併最近的事件與歷史數據，只有合併後的少量記錄需要排序
+        ('sheep_event', 'ix_sheep_event_sheep_event_date', False, chat),
+        ('sheep_historical_data', 'ix_sheep_historical_data_sheep_user_record_date', False, chat),
+        # 疾病統計依描述分組，排序無法由索引提供
+        ('sheep_event', 'ix_sheep_event_user_event_type_date', False, report),
+    ]
+
+
+@pytest.fixture
+def records(test_user, test_sheep):
+    db.session.add_all([
+        SheepEvent(user_id=test_user.id, sheep_id=test_sheep.id, event_date='2024-01-0%d' % day, event_type='疾病治療', description='腹瀉')
+        for day in range(1, 4)
+    ] + [
+        SheepHistoricalData(user_id=test_user.id, sheep_id=test_sheep.id, record_date='2024-01-0%d' % day, record_type='Body_Weight_kg', value=40.0 + day)
+        for day in range(1, 4)
+    ])
+    db.session.commit()
+
+
+class TestQueryIndexes:
+    """常用查詢索引測試類別"""
+
+    def test_endpoints_use_composite_indexes(self, authenticated_client, records, mock_gemini_api):
+        """測試各端點的查詢在 SQLite 上使用複合索引且不需排序"""
+        shapes = run_hot_endpoints(authenticated_client)
+        connection = db.session.connection()
+        for table, index, ordered, statements in shapes:
+            assert_uses_index(connection, statements, table, index, ordered)
+
+    @pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'), reason='未設定 TEST_POSTGRES_URL')
+    def test_endpoints_use_composite_indexes_on_postgres(self, authenticated_client, records, mock_gemini_api):
+        """測試相同的查詢在 PostgreSQL 上使用索引掃描"""
+        shapes = run_hot_endpoints(authenticated_client)
+        url = os.environ['TEST_POSTGRES_URL']
+        schema = f'test_indexes_{uuid.uuid4().hex[:12]}'
+        admin = create_engine(url)
+        with admin.begin() as connection:
+            connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+        # 只在臨時 schema 中建立資料表，不影響資料庫中既有的資料表
+        engine = create_engine(url, connect_args={'options': f'-csearch_path={schema}'})
+        try:
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                for table, index, ordered, statements in shapes:
+                    assert_uses_index(connection, statements, table, index, ordered)
+        finally:
+            engine.dispose()
+            with admin.begin() as connection:
+                connection.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+            admin.dispose()
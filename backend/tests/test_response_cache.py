@@ -0,0 +1,107 @@
+"""
+AI 回應快取測試
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import AgentResponseCache
+from app.response_cache import cached_gemini_call, end_of_local_day
+from app.utils import gemini_prompt_hash
+
+RECOMMENDATION = {'api_key': 'test-api-key', 'EarNum': 'TEST001', 'Breed': '波爾羊', 'Body_Weight_kg': 45.5, 'status': '懷孕'}
+
+
+@pytest.fixture
+def gemini_calls(monkeypatch):
+    """記錄實際送到模型的提示詞，依序返回不同的回應"""
+    calls = []
+
+    def fake_call_gemini_api(prompt, api_key, generation_config_override=None, safety_settings_override=None):
+        calls.append(prompt)
+        return {"text": f"第 {len(calls)} 次回應", "finish_reason": "STOP"}
+
+    monkeypatch.setattr('app.utils.call_gemini_api', fake_call_gemini_api)
+    return calls
+
+
+def _login_other_user(app):
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'otheruser', 'password': 'otherpass'})
+    client.post('/api/auth/login', json={'username': 'otheruser', 'password': 'otherpass'})
+    return client
+
+
+class TestAgentResponseCache:
+    """AI 回應快取測試類別"""
+
+    def test_tip_is_shared_for_the_day(self, app, authenticated_client, gemini_calls):
+        """測試每日提示只在第一次呼叫模型，之後所有用戶都由快取返回"""
+        headers = {'X-Api-Key': 'test-api-key'}
+        first = authenticated_client.get('/api/agent/tip', headers=headers)
+        again = authenticated_client.get('/api/agent/tip', headers=headers)
+        other = _login_other_user(app).get('/api/agent/tip', headers={'X-Api-Key': 'other-key'})
+
+        assert first.status_code == 200
+        assert first.get_json() == again.get_json() == other.get_json()
+        assert len(gemini_calls) == 1
+        assert db.session.scalar(db.select(AgentResponseCache.expires_at)) == end_of_local_day()
+
+        stats = authenticated_client.get('/api/agent/cache_stats').get_json()
+        assert stats['endpoints']['tip'] == {'hits': 2, 'misses': 1, 'hit_rate': 0.6667}
+        assert stats['entries'] == 1
+
+    def test_expired_entries_are_refreshed(self, authenticated_client, gemini_calls):
+        """測試到期的項目重新呼叫模型並取代舊的回應"""
+        headers = {'X-Api-Key': 'test-api-key'}
+        authenticated_client.get('/api/agent/tip', headers=headers)
+        db.session.execute(db.update(AgentResponseCache).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+
+        assert '第 2 次回應' in authenticated_client.get('/api/agent/tip', headers=headers).get_json()['tip_html']
+        assert '第 2 次回應' in authenticated_client.get('/api/agent/tip', headers=headers).get_json()['tip_html']
+        assert len(gemini_calls) == 2
+        assert AgentResponseCache.query.count() == 1
+
+    def test_recommendation_cached_per_prompt(self, authenticated_client, gemini_calls):
+        """測試相同數據的飼養建議由快取返回，數據不同時重新呼叫模型"""
+        first = authenticated_client.post('/api/agent/recommendation', json=RECOMMENDATION)
+        again = authenticated_client.post('/api/agent/recommendation', json={**RECOMMENDATION, 'api_key': 'another-key'})
+        changed = authenticated_client.post('/api/agent/recommendation', json={**RECOMMENDATION, 'Body_Weight_kg': 50})
+
+        assert first.get_json() == again.get_json() != changed.get_json()
+        assert len(gemini_calls) == 2
+        stats = authenticated_client.get('/api/agent/cache_stats').get_json()
+        assert stats['endpoints']['recommendation'] == {'hits': 1, 'misses': 2, 'hit_rate': 0.3333}
+
+    def test_errors_and_incomplete_replies_are_not_cached(self, app, monkeypatch):
+        """測試錯誤與未完整生成的回應不會被快取"""
+        replies = [{"error": "API 調用失敗"}, {"text": "被截斷", "finish_reason": "MAX_TOKENS"}, {"text": "完整", "finish_reason": "STOP"}]
+        monkeypatch.setattr('app.utils.call_gemini_api', lambda *args, **kwargs: replies.pop(0))
+
+        with app.test_request_context():
+            assert cached_gemini_call('tip', '提示', 'key') == {"error": "API 調用失敗"}
+            assert cached_gemini_call('tip', '提示', 'key')['text'] == '被截斷'
+            assert cached_gemini_call('tip', '提示', 'key')['text'] == '完整'
+            assert cached_gemini_call('tip', '提示', 'key')['text'] == '完整'
+        assert replies == []
+
+    def test_least_recently_used_entries_are_evicted(self, app, gemini_calls):
+        """測試超過容量時淘汰最久未使用的項目"""
+        app.config['AGENT_CACHE_MAX_ENTRIES'] = 2
+        with app.test_request_context():
+            cached_gemini_call('recommendation', 'A', 'key')
+            cached_gemini_call('recommendation', 'B', 'key')
+            cached_gemini_call('recommendation', 'A', 'key')  # A 最近被使用
+            cached_gemini_call('recommendation', 'C', 'key')
+
+            kept = {row.prompt_hash for row in AgentResponseCache.query}
+            assert kept == {gemini_prompt_hash('A'), gemini_prompt_hash('C')}
+            cached_gemini_call('recommendation', 'A', 'key')
+        assert gemini_calls == ['A', 'B', 'C']
+
+    def test_prompt_hash_covers_generation_config(self):
+        """測試雜湊包含生成設定，不包含 API 金鑰"""
+        assert gemini_prompt_hash('提示') == gemini_prompt_hash('提示', {"temperature": 0.4})
+        assert gemini_prompt_hash('提示') != gemini_prompt_hash('提示', {"temperature": 0.7})
+        assert gemini_prompt_hash('提示') != gemini_prompt_hash('提示。')
@@ -0,0 +1,204 @@
+"""
+查詢結果快取測試
+"""
+
+import time
+from sqlalchemy import event
+from app import db
+from app.cache import FileCacheStore, MemoryCacheStore, _MISSING, get_cache_store
+from app.models import Sheep
+
+DASHBOARD_URLS = ['/api/dashboard/data', '/api/dashboard/farm_report']
+
+
+def _capture_statements():
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    return statements, lambda: event.remove(db.engine, 'before_cursor_execute', capture)
+
+
+class TestDashboardCache:
+    """儀表板快取測試類別"""
+
+    def test_repeat_load_skips_aggregates(self, authenticated_client, test_sheep):
+        """測試重複載入時只查詢數據版本，不重新計算聚合"""
+        for url in DASHBOARD_URLS:
+            first = authenticated_client.get(url)
+            assert first.status_code == 200
+
+            statements, stop = _capture_statements()
+            try:
+                second = authenticated_client.get(url)
+            finally:
+                stop()
+
+            assert second.get_json() == first.get_json()
+            assert not any('FROM sheep' in s for s in statements)
+
+    def test_writes_invalidate_cache(self, authenticated_client, test_sheep):
+        """測試新增、修改、刪除羊隻與事件後重新計算"""
+        def total():
+            return authenticated_client.get('/api/dashboard/farm_report').get_json()['flock_composition']['total']
+
+        def statuses():
+            summary = authenticated_client.get('/api/dashboard/data').get_json()['flock_status_summary']
+            return {item['status']: item['count'] for item in summary}
+
+        assert total() == 1
+        assert '泌乳中' not in statuses()
+        authenticated_client.post('/api/sheep/', json={'EarNum': 'CACHE001'})
+        assert total() == 2
+        authenticated_client.put('/api/sheep/CACHE001', json={'status': '泌乳中'})
+        assert statuses()['泌乳中'] == 1
+
+        authenticated_client.post('/api/sheep/CACHE001/events', json={
+            'event_date': '2024-01-01', 'event_type': '疾病治療', 'description': '感冒'
+        })
+        report = authenticated_client.get('/api/dashboard/farm_report').get_json()
+        assert report['health_summary']['top_diseases'] == [{'name': '感冒', 'count': 1}]
+
+        authenticated_client.delete('/api/sheep/CACHE001')
+        assert total() == 1
+
+    def test_import_invalidates_cache(self, authenticated_client, test_sheep, make_excel_file, finish_import_job):
+        """測試批次導入後重新計算"""
+        before = authenticated_client.get('/api/dashboard/farm_report').get_json()['flock_composition']['total']
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (make_excel_file({'0009-0013A1_Basic': [{'EarNum': 'CACHE100'}, {'EarNum': 'CACHE101'}]}), 'basic.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert finish_import_job(response)['status'] == 'completed'
+
+        after = authenticated_client.get('/api/dashboard/farm_report').get_json()['flock_composition']['total']
+        assert after == before + 2
+
+    def test_cache_is_scoped_to_user(self, authenticated_client, app, test_sheep):
+        """測試其他用戶的寫入不會出現在快取結果中"""
+        from app.models import User
+
+        assert authenticated_client.get('/api/dashboard/farm_report').get_json()['flock_composition']['total'] == 1
+        other = User(username='cache_other_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(Sheep(user_id=other.id, EarNum='OTHER001'))
+        db.session.commit()
+
+        assert authenticated_client.get('/api/dashboard/farm_report').get_json()['flock_composition']['total'] == 1
+
+    def test_filesystem_backend(self, authenticated_client, app, test_sheep, tmp_path):
+        """測試檔案存放區可由多個存放區實例 (worker) 共用"""
+        app.config.update(RESULT_CACHE_BACKEND='filesystem', RESULT_CACHE_DIR=str(tmp_path))
+        app.extensions.pop('result_cache', None)
+
+        first = authenticated_client.get('/api/dashboard/farm_report').get_json()
+        assert isinstance(get_cache_store(app), FileCacheStore)
+        assert any(p.suffix == '.json' for p in tmp_path.iterdir())
+
+        # 另一個 worker 建立自己的存放區實例，仍可讀到相同的結果
+        app.extensions.pop('result_cache')
+        statements, stop = _capture_statements()
+        try:
+            second = authenticated_client.get('/api/dashboard/farm_report').get_json()
+        finally:
+            stop()
+        assert second == first
+        assert not any('FROM sheep' in s for s in statements)
+
+
+class TestSheepContextCache:
+    """AI 代理人羊隻背景資料快取測試類別"""
+
+    @staticmethod
+    def _context(test_user, ear_num='TEST001'):
+        from app.utils import get_sheep_info_for_context
+        return get_sheep_info_for_context(ear_num, test_user.id)
+
+    def test_miss_uses_single_query_and_hit_skips_database(self, test_user, test_sheep):
+        """測試未命中時以單一查詢載入，命中時只查詢數據版本"""
+        from app.models import SheepEvent, SheepHistoricalData
+
+        db.session.add_all([
+            SheepEvent(user_id=test_user.id, sheep_id=test_sheep.id, event_date=f'2024-01-{day:02d}', event_type='檢查')
+            for day in range(1, 8)
+        ] + [
+            SheepHistoricalData(user_id=test_user.id, sheep_id=test_sheep.id, record_date=f'2024-02-{day:02d}', record_type='Body_Weight_kg', value=float(day))
+            for day in range(1, 13)
+        ])
+        db.session.commit()
+
+        statements, stop = _capture_statements()
+        try:
+            first = self._context(test_user)
+            miss = list(statements)
+            second = self._context(test_user)
+        finally:
+            stop()
+
+        assert len([s for s in miss if 'FROM sheep' in s]) == 1
+        assert not any('FROM sheep' in s for s in statements[len(miss):])
+        assert second == first
+        assert [e['event_date'] for e in first['recent_events']] == [f'2024-01-{day:02d}' for day in range(7, 2, -1)]
+        assert [h['record_date'] for h in first['history_records']] == [f'2024-02-{day:02d}' for day in range(12, 2, -1)]
+        assert set(first['recent_events'][0]) == {c.name for c in SheepEvent.__table__.columns}
+        assert first['EarNum'] == 'TEST001' and 'history_records' in first
+
+    def test_writes_invalidate_context(self, authenticated_client, test_user, test_sheep):
+        """測試羊隻、事件與歷史數據寫入後重新載入"""
+        assert self._context(test_user)['recent_events'] == []
+
+        authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-05-01', 'event_type': '驅蟲'})
+        assert [e['event_type'] for e in self._context(test_user)['recent_events']] == ['驅蟲']
+
+        authenticated_client.put('/api/sheep/TEST001', json={'Body_Weight_kg': 52.0, 'agent_notes': '食慾良好'})
+        context = self._context(test_user)
+        assert context['agent_notes'] == '食慾良好'
+        assert [h['value'] for h in context['history_records']] == [52.0]
+
+    def test_context_is_scoped_to_user_and_ear_num(self, test_user, test_sheep):
+        """測試快取依用戶與耳號區分"""
+        from app.models import User
+
+        other = User(username='context_other_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(Sheep(user_id=other.id, EarNum='TEST001', Breed='其他品種'))
+        db.session.commit()
+
+        assert self._context(test_user)['Breed'] == test_sheep.Breed
+        assert self._context(other)['Breed'] == '其他品種'
+        assert self._context(test_user, 'NONE001') is None
+
+
+class TestCacheStores:
+    """快取存放區測試類別"""
+
+    def test_memory_store_lru_and_ttl(self):
+        """測試超過容量時淘汰最久未使用的項目，逾時項目不再返回"""
+        store = MemoryCacheStore(max_entries=2)
+        store.set('a', 1, ttl=60)
+        store.set('b', 2, ttl=60)
+        assert store.get('a') == 1
+        store.set('c', 3, ttl=60)
+        assert store.get('b') is _MISSING
+        assert store.get('a') == 1 and store.get('c') == 3
+
+        store.set('d', 4, ttl=-1)
+        assert store.get('d') is _MISSING
+
+    def test_file_store_prunes_and_expires(self, tmp_path):
+        """測試檔案存放區的容量上限與逾時"""
+        store = FileCacheStore(str(tmp_path), max_entries=2)
+        for i, key in enumerate(['a', 'b', 'c']):
+            store.set(key, {'value': i}, ttl=60)
+            time.sleep(0.01)
+        assert len(list(tmp_path.glob('*.json'))) == 2
+        assert store.get('c') == {'value': 2}
+
+        store.set('old', [1], ttl=-1)
+        assert store.get('old') is _MISSING
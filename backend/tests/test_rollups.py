@@ -0,0 +1,175 @@
+"""
+每日彙總表測試
+"""
+
+from contextlib import contextmanager
+from sqlalchemy import event, text, tuple_
+from app import db
+from app.models import EventDailyRollup, HistoryDailyRollup, SheepEvent, SheepHistoricalData
+from app.rollups import _aggregate_select, rebuild_rollups
+
+
+def _snapshot():
+    history = sorted(
+        (r.user_id, r.record_date, r.record_type, r.count, round(r.sum, 6), r.min, r.max)
+        for r in HistoryDailyRollup.query.all()
+    )
+    events = sorted((r.user_id, r.event_date, r.event_type, r.count) for r in EventDailyRollup.query.all())
+    return history, events
+
+
+@contextmanager
+def _recomputes():
+    """記錄期間以原始資料重算彙總格 (GROUP BY 原始表) 的查詢"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'GROUP BY' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def _add_history(user_id, sheep_id, record_date, value, record_type='milk_yield_kg_day'):
+    record = SheepHistoricalData(user_id=user_id, sheep_id=sheep_id, record_date=record_date, record_type=record_type, value=value)
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+
+class TestRollups:
+    """每日彙總表測試類別"""
+
+    def test_incremental_updates_match_rebuild(self, test_user, test_sheep):
+        """測試新增、修改、刪除後的彙總與完整重建結果相同"""
+        first = _add_history(test_user.id, test_sheep.id, '2024-01-01', 2.0)
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 3.5)
+        _add_history(test_user.id, test_sheep.id, '2024-01-02', 1.5)
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 40.0, record_type='Body_Weight_kg')
+        db.session.add_all([
+            SheepEvent(user_id=test_user.id, sheep_id=test_sheep.id, event_date='2024-01-01', event_type='疫苗接種'),
+            SheepEvent(user_id=test_user.id, sheep_id=test_sheep.id, event_date='2024-01-01', event_type='疫苗接種'),
+        ])
+        db.session.commit()
+
+        history, events = _snapshot()
+        assert (test_user.id, '2024-01-01', 'milk_yield_kg_day', 2, 5.5, 2.0, 3.5) in history
+        assert events == [(test_user.id, '2024-01-01', '疫苗接種', 2)]
+
+        # 修改日期與數值：舊格與新格都要更新；刪除最小值後重新計算最小值
+        first.record_date = '2024-01-02'
+        first.value = 0.5
+        db.session.commit()
+        db.session.delete(SheepEvent.query.first())
+        db.session.commit()
+        incremental = _snapshot()
+        assert (test_user.id, '2024-01-01', 'milk_yield_kg_day', 1, 3.5, 3.5, 3.5) in incremental[0]
+        assert (test_user.id, '2024-01-02', 'milk_yield_kg_day', 2, 2.0, 0.5, 1.5) in incremental[0]
+
+        rebuild_rollups()
+        db.session.commit()
+        assert _snapshot() == incremental
+
+    def test_inserts_and_inner_updates_do_not_recompute(self, test_user, test_sheep):
+        """測試新增記錄與不影響最小/最大值的修改只寫入增量，不以原始資料重算"""
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 1.0)
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 5.0)
+        with _recomputes() as statements:
+            middle = _add_history(test_user.id, test_sheep.id, '2024-01-01', 3.0)
+            middle.value = 4.0
+            db.session.commit()
+            db.session.add(SheepEvent(user_id=test_user.id, sheep_id=test_sheep.id, event_date='2024-01-01', event_type='驅蟲'))
+            db.session.commit()
+            db.session.delete(SheepEvent.query.one())
+            db.session.commit()
+        assert statements == []
+        assert _snapshot() == ([(test_user.id, '2024-01-01', 'milk_yield_kg_day', 3, 10.0, 1.0, 5.0)], [])
+
+        # 修改最大值時重算該格
+        with _recomputes() as statements:
+            SheepHistoricalData.query.filter_by(value=5.0).one().value = 2.0
+            db.session.commit()
+        assert len(statements) == 1
+        incremental = _snapshot()
+        assert incremental[0] == [(test_user.id, '2024-01-01', 'milk_yield_kg_day', 3, 7.0, 1.0, 4.0)]
+
+        rebuild_rollups()
+        db.session.commit()
+        assert _snapshot() == incremental
+
+    def test_recompute_uses_type_date_index(self, test_user):
+        """測試重算單一彙總格時以 (用戶, 類型, 日期) 索引讀取原始資料"""
+        for model, index in [
+            (SheepHistoricalData, 'ix_sheep_historical_data_user_type_date'),
+            (SheepEvent, 'ix_sheep_event_user_event_type_date'),
+        ]:
+            source = model.__table__
+            date_field, type_field = ('record_date', 'record_type') if model is SheepHistoricalData else ('event_date', 'event_type')
+            _, aggregate = _aggregate_select(model, tuple_(source.c.user_id, source.c[date_field], source.c[type_field]).in_(
+                [(test_user.id, '2024-01-01', 'milk_yield_kg_day')]
+            ))
+            sql = str(aggregate.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+            plan = ' '.join(str(row[-1]) for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+            assert index in plan, plan
+
+    def test_deleting_sheep_removes_rollups(self, authenticated_client, test_user, test_sheep):
+        """測試刪除羊隻時其記錄從彙總中移除"""
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 2.0)
+        authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-01-01', 'event_type': '驅蟲'})
+        assert _snapshot() != ([], [])
+
+        authenticated_client.delete('/api/sheep/TEST001')
+        assert _snapshot() == ([], [])
+
+    def test_import_updates_rollups(self, authenticated_client, test_user, test_sheep, make_excel_file, finish_import_job):
+        """測試批次導入的記錄也會更新彙總"""
+        _add_history(test_user.id, test_sheep.id, '2024-02-01', 1.0)
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (make_excel_file({
+                '0009-0013A9_Milk': [
+                    {'EarNum': 'TEST001', 'MeaDate': '2024-02-01', 'Milk': 3.0},
+                    {'EarNum': 'TEST001', 'MeaDate': '2024-02-02', 'Milk': 2.0},
+                ],
+                '0009-0013A4_Kidding': [{'EarNum': 'TEST001', 'YeanDate': '2024-02-01', 'KidNum': 2}],
+            }), 'records.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert finish_import_job(response)['status'] == 'completed'
+
+        history, events = _snapshot()
+        assert history == [
+            (test_user.id, '2024-02-01', 'milk_yield_kg_day', 2, 4.0, 1.0, 3.0),
+            (test_user.id, '2024-02-02', 'milk_yield_kg_day', 1, 2.0, 2.0, 2.0),
+        ]
+        assert events == [(test_user.id, '2024-02-01', '產仔', 1)]
+
+    def test_rebuild_command(self, app, test_user, test_sheep):
+        """測試 flask rebuild-rollups 指令以原始資料重建彙總"""
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 2.0)
+        expected = _snapshot()
+        HistoryDailyRollup.query.delete()
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=['rebuild-rollups', '--user-id', str(test_user.id)])
+        assert result.exit_code == 0
+        db.session.expire_all()
+        assert _snapshot() == expected
+
+    def test_trends_endpoint(self, authenticated_client, test_user, test_sheep):
+        """測試趨勢端點返回每日彙總，並可依類型與日期篩選"""
+        for day, value in [('2024-01-01', 2.0), ('2024-01-01', 4.0), ('2024-01-03', 3.0)]:
+            _add_history(test_user.id, test_sheep.id, day, value)
+        _add_history(test_user.id, test_sheep.id, '2024-01-01', 40.0, record_type='Body_Weight_kg')
+
+        data = authenticated_client.get('/api/dashboard/trends?record_type=milk_yield_kg_day&from=2024-01-01&to=2024-01-02').get_json()
+        assert data['history'] == [{
+            'record_date': '2024-01-01', 'record_type': 'milk_yield_kg_day', 'count': 2,
+            'sum': 6.0, 'min': 2.0, 'max': 4.0, 'avg': 3.0
+        }]
+        assert data['events'] == []
+
+        assert authenticated_client.get('/api/dashboard/trends?from=2024-1-1x').status_code == 400
@@ -154,3 +154,453 @@ class TestSheepAPI:
         # 刪除
         response = client.delete('/api/sheep/TEST001')
         assert response.status_code == 401
+
+
+class TestSheepListQuery:
+    """羊隻列表分頁、篩選與欄位選擇測試類別"""
+
+    @pytest.fixture
+    def farm(self, app, test_user):
+        from app import db
+        for i in range(7):
+            db.session.add(Sheep(
+                user_id=test_user.id, EarNum=f'L{i:03d}', Breed='波爾羊' if i % 2 else '努比亞',
+                Sex='母' if i < 4 else '公', FarmNum='F1', status='lactating' if i in (1, 3, 5) else 'maintenance'
+            ))
+        db.session.commit()
+
+    def test_list_without_params_is_unchanged(self, authenticated_client, farm):
+        """測試未帶參數時維持返回完整欄位的陣列"""
+        data = authenticated_client.get('/api/sheep/').get_json()
+
+        assert isinstance(data, list)
+        assert [s['EarNum'] for s in data] == [f'L{i:03d}' for i in range(7)]
+        assert set(data[0]) == set(Sheep.__table__.columns.keys())
+
+    def test_keyset_pagination(self, authenticated_client, farm):
+        """測試以耳號游標分頁可取得所有羊隻且不重複"""
+        pages, cursor = [], None
+        while True:
+            url = '/api/sheep/?limit=3' + (f'&cursor={cursor}' if cursor else '')
+            data = authenticated_client.get(url).get_json()
+            pages.append([s['EarNum'] for s in data['items']])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        assert pages == [['L000', 'L001', 'L002'], ['L003', 'L004', 'L005'], ['L006']]
+
+    def test_filters_and_fields(self, authenticated_client, farm):
+        """測試伺服器端篩選與欄位選擇"""
+        data = authenticated_client.get('/api/sheep/?Breed=波爾羊&Sex=母&fields=Breed,status').get_json()
+        assert data == [
+            {'EarNum': 'L001', 'Breed': '波爾羊', 'status': 'lactating'},
+            {'EarNum': 'L003', 'Breed': '波爾羊', 'status': 'lactating'},
+        ]
+
+        data = authenticated_client.get('/api/sheep/?status=lactating&status=maintenance&Sex=公&limit=10&fields=EarNum').get_json()
+        assert data['items'] == [{'EarNum': 'L004'}, {'EarNum': 'L005'}, {'EarNum': 'L006'}]
+        assert data['next_cursor'] is None
+
+    def test_fields_select_only_requested_columns(self, authenticated_client, farm, app):
+        """測試欄位選擇只在 SQL 中查詢所需欄位"""
+        from sqlalchemy import event
+        from app import db
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            authenticated_client.get('/api/sheep/?fields=Breed&limit=2')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        sheep_query = next(s for s in statements if 'FROM sheep' in s)
+        selected = sheep_query.split('FROM')[0]
+        assert 'sheep."EarNum"' in selected and 'sheep."Breed"' in selected
+        assert 'other_remarks' not in selected
+
+    def test_invalid_params(self, authenticated_client, farm):
+        """測試無效的分頁與欄位參數"""
+        for query in ['fields=EarNum,password', 'limit=0', 'limit=abc', 'limit=5000', 'cursor=@@@']:
+            response = authenticated_client.get(f'/api/sheep/?{query}')
+            assert response.status_code == 400, query
+            assert 'error' in response.get_json()
+
+    def test_list_is_scoped_to_user(self, authenticated_client, farm):
+        """測試只返回目前用戶的羊隻"""
+        from app import db
+        from app.models import User
+        other = User(username='other_list_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(Sheep(user_id=other.id, EarNum='L999', Breed='波爾羊'))
+        db.session.commit()
+
+        data = authenticated_client.get('/api/sheep/?Breed=波爾羊&limit=100').get_json()
+        assert 'L999' not in [s['EarNum'] for s in data['items']]
+
+
+class TestConditionalGet:
+    """ETag 條件式請求測試類別"""
+
+    ENDPOINTS = ['/api/sheep/', '/api/sheep/TEST001', '/api/sheep/TEST001/events', '/api/sheep/TEST001/history']
+
+    def test_not_modified_without_loading_data(self, authenticated_client, test_sheep, app):
+        """測試 If-None-Match 相符時回應 304，且只執行版本查詢"""
+        from sqlalchemy import event
+        from app import db
+
+        for url in self.ENDPOINTS:
+            first = authenticated_client.get(url)
+            assert first.status_code == 200
+            etag = first.headers['ETag']
+            assert not etag.startswith('W/')
+            assert first.headers['Cache-Control'] == 'private, no-cache'
+
+            statements = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                second = authenticated_client.get(url, headers={'If-None-Match': etag})
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+
+            assert second.status_code == 304
+            assert second.data == b''
+            assert second.headers['ETag'] == etag
+            assert not any('FROM sheep' in s for s in statements)
+
+    def test_etag_changes_after_writes(self, authenticated_client, test_sheep):
+        """測試新增、修改與刪除後 ETag 改變"""
+        def etag():
+            return authenticated_client.get('/api/sheep/').headers['ETag']
+
+        seen = [etag()]
+        authenticated_client.put('/api/sheep/TEST001', json={'Breed': '努比亞'})
+        seen.append(etag())
+        response = authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-01-01', 'event_type': '疫苗接種'})
+        seen.append(etag())
+        authenticated_client.delete(f"/api/sheep/events/{response.get_json()['event']['id']}")
+        seen.append(etag())
+        authenticated_client.delete('/api/sheep/TEST001')
+        seen.append(etag())
+
+        assert len(set(seen)) == len(seen)
+        stale = authenticated_client.get('/api/sheep/', headers={'If-None-Match': seen[0]})
+        assert stale.status_code == 200
+
+    def test_unchanged_update_keeps_etag(self, authenticated_client, test_sheep):
+        """測試讀取資料不會改變 ETag"""
+        first = authenticated_client.get('/api/sheep/TEST001').headers['ETag']
+        authenticated_client.get('/api/sheep/TEST001/events')
+        assert authenticated_client.get('/api/sheep/TEST001').headers['ETag'] == first
+
+    def test_bulk_import_changes_etag(self, authenticated_client, test_user, make_excel_file, finish_import_job):
+        """測試批次導入 (不經過 ORM 事件) 也會更新 ETag"""
+        before = authenticated_client.get('/api/sheep/').headers['ETag']
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (make_excel_file({'0009-0013A1_Basic': [{'EarNum': 'ETAG001'}]}), 'basic.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert finish_import_job(response)['status'] == 'completed'
+
+        after = authenticated_client.get('/api/sheep/', headers={'If-None-Match': before})
+        assert after.status_code == 200
+        assert after.headers['ETag'] != before
+        assert [s['EarNum'] for s in after.get_json()] == ['ETAG001']
+
+    def test_not_found_has_no_etag(self, authenticated_client):
+        """測試 404 回應不帶 ETag"""
+        response = authenticated_client.get('/api/sheep/NOPE')
+        assert response.status_code == 404
+        assert 'ETag' not in response.headers
+
+
+class TestIncrementalSync:
+    """增量同步 (changes since) 測試類別"""
+
+    def _changes(self, client, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = client.get('/api/sheep/sync/changes', query_string=params)
+        assert response.status_code == 200
+        return response.get_json()
+
+    def test_full_sync_without_since(self, authenticated_client, test_sheep):
+        """測試未提供 since 時返回全部資料"""
+        data = self._changes(authenticated_client)
+
+        assert [s['EarNum'] for s in data['sheep']] == ['TEST001']
+        assert data['events'] == [] and data['history'] == []
+        assert data['deleted'] == {'sheep': [], 'event': [], 'history': []}
+        assert data['next'].isdigit()
+
+    def test_returns_only_changes_since_token(self, authenticated_client, test_user, test_sheep):
+        """測試只返回 since 之後新增、修改與刪除的記錄"""
+        from app import db
+        from app.models import SheepHistoricalData
+
+        other = Sheep(user_id=test_user.id, EarNum='SYNC002')
+        db.session.add(other)
+        db.session.commit()
+        token = self._changes(authenticated_client)['next']
+        assert self._changes(authenticated_client, token)['sheep'] == []
+
+        authenticated_client.put('/api/sheep/TEST001', json={'Breed': '努比亞'})
+        event = authenticated_client.post('/api/sheep/SYNC002/events', json={'event_date': '2024-01-01', 'event_type': '疫苗接種'}).get_json()['event']
+        removed = authenticated_client.post('/api/sheep/SYNC002/events', json={'event_date': '2024-01-02', 'event_type': '驅蟲'}).get_json()['event']
+        authenticated_client.delete(f"/api/sheep/events/{removed['id']}")
+        db.session.add(SheepHistoricalData(user_id=test_user.id, sheep_id=other.id, record_date='2024-01-01', record_type='Body_Weight_kg', value=50.0))
+        db.session.commit()
+
+        data = self._changes(authenticated_client, token)
+        assert [s['EarNum'] for s in data['sheep']] == ['TEST001']
+        assert data['sheep'][0]['Breed'] == '努比亞'
+        assert [e['id'] for e in data['events']] == [event['id']]
+        assert [h['value'] for h in data['history']] == [50.0]
+        assert [d['id'] for d in data['deleted']['event']] == [removed['id']]
+
+        # 以新的 next 再次同步時沒有差異
+        assert self._changes(authenticated_client, data['next'])['events'] == []
+
+    def test_event_update_is_included(self, authenticated_client, test_sheep):
+        """測試修改事件後出現在增量同步中"""
+        event = authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-01-01', 'event_type': '疫苗接種'}).get_json()['event']
+        token = self._changes(authenticated_client)['next']
+
+        authenticated_client.put(f"/api/sheep/events/{event['id']}", json={'event_date': '2024-01-01', 'event_type': '疫苗接種', 'notes': '補打'})
+
+        events = self._changes(authenticated_client, token)['events']
+        assert [(e['id'], e['notes']) for e in events] == [(event['id'], '補打')]
+
+    def test_deleted_sheep_tombstones(self, authenticated_client, test_sheep):
+        """測試刪除羊隻時其事件一併記錄為已刪除"""
+        event = authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-01-01', 'event_type': '疫苗接種'}).get_json()['event']
+        token = self._changes(authenticated_client)['next']
+
+        authenticated_client.delete('/api/sheep/TEST001')
+
+        data = self._changes(authenticated_client, token)
+        assert data['sheep'] == []
+        assert [(d['id'], d['EarNum']) for d in data['deleted']['sheep']] == [(test_sheep.id, 'TEST001')]
+        assert [d['id'] for d in data['deleted']['event']] == [event['id']]
+
+    def test_bulk_import_is_included(self, authenticated_client, test_sheep, make_excel_file, finish_import_job):
+        """測試批次導入 (不經過 ORM 事件) 的記錄也會出現在增量同步中"""
+        token = self._changes(authenticated_client)['next']
+        response = authenticated_client.post('/api/data/process_import', data={
+            'file': (make_excel_file({
+                '0009-0013A1_Basic': [{'EarNum': 'SYNC100'}],
+                '0009-0013A9_Milk': [{'EarNum': 'SYNC100', 'MeaDate': '2024-02-01', 'Milk': 2.5}],
+            }), 'farm.xlsx'),
+            'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert finish_import_job(response)['status'] == 'completed'
+
+        data = self._changes(authenticated_client, token)
+        assert [s['EarNum'] for s in data['sheep']] == ['SYNC100']
+        assert [h['value'] for h in data['history']] == [2.5]
+
+    def test_full_sync_is_paginated(self, authenticated_client, test_user, test_sheep):
+        """測試完整同步依 limit 分頁，各頁沿用第一頁的版本上限"""
+        from app import db
+        from app.models import SheepHistoricalData
+
+        db.session.add(Sheep(user_id=test_user.id, EarNum='SYNC002'))
+        db.session.add(SheepHistoricalData(user_id=test_user.id, sheep_id=test_sheep.id, record_date='2024-01-01', record_type='Body_Weight_kg', value=50.0))
+        db.session.commit()
+        authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024-01-01', 'event_type': '疫苗接種'})
+
+        pages = [self._changes(authenticated_client, limit=2)]
+        # 分頁期間新增的記錄留待下次同步
+        authenticated_client.post('/api/sheep/', json={'EarNum': 'SYNC003'})
+        while pages[-1]['next_cursor']:
+            pages.append(self._changes(authenticated_client, cursor=pages[-1]['next_cursor'], limit=2))
+
+        assert [sum(len(p[k]) for k in ('sheep', 'events', 'history')) for p in pages] == [2, 2]
+        assert [s['EarNum'] for p in pages for s in p['sheep']] == ['TEST001', 'SYNC002']
+        assert len([e for p in pages for e in p['events']]) == 1
+        assert [h['value'] for p in pages for h in p['history']] == [50.0]
+        assert len({p['next'] for p in pages}) == 1
+
+        data = self._changes(authenticated_client, pages[-1]['next'])
+        assert [s['EarNum'] for s in data['sheep']] == ['SYNC003']
+        assert data['next_cursor'] is None
+
+    def test_ear_number_route_is_not_shadowed(self, authenticated_client, test_user):
+        """測試耳號為 changes 的羊隻仍可查詢"""
+        from app import db
+
+        db.session.add(Sheep(user_id=test_user.id, EarNum='changes'))
+        db.session.commit()
+
+        response = authenticated_client.get('/api/sheep/changes')
+        assert response.status_code == 200
+        assert response.get_json()['EarNum'] == 'changes'
+
+    def test_invalid_since(self, authenticated_client, test_sheep):
+        """測試格式錯誤或超出目前版本的 since"""
+        assert authenticated_client.get('/api/sheep/sync/changes?since=abc').status_code == 400
+        assert authenticated_client.get('/api/sheep/sync/changes?since=999999').status_code == 400
+        assert authenticated_client.get('/api/sheep/sync/changes?cursor=bad').status_code == 400
+        assert authenticated_client.get('/api/sheep/sync/changes?limit=0').status_code == 400
+
+    def test_changes_are_scoped_to_user(self, authenticated_client, test_sheep):
+        """測試不會返回其他用戶的變更"""
+        from app import db
+        from app.models import User
+
+        token = self._changes(authenticated_client)['next']
+        other = User(username='sync_other_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        db.session.add(Sheep(user_id=other.id, EarNum='OTHER001'))
+        db.session.commit()
+
+        assert self._changes(authenticated_client, token)['sheep'] == []
+        assert 'OTHER001' not in [s['EarNum'] for s in self._changes(authenticated_client)['sheep']]
+
+
+class TestHistoryQuery:
+    """歷史數據範圍查詢與降採樣測試類別"""
+
+    @pytest.fixture
+    def series(self, test_user, test_sheep):
+        from datetime import date, timedelta
+        from app import db
+        from app.models import SheepHistoricalData
+
+        start = date(2024, 1, 1)
+        db.session.add_all([
+            SheepHistoricalData(user_id=test_user.id, sheep_id=test_sheep.id, record_date=(start + timedelta(days=i)).strftime('%Y-%m-%d'),
+                                record_type='milk_yield_kg_day', value=float(i % 10))
+            for i in range(90)
+        ] + [
+            SheepHistoricalData(user_id=test_user.id, sheep_id=test_sheep.id, record_date='2024-01-15', record_type='Body_Weight_kg', value=45.0)
+        ])
+        db.session.commit()
+
+    def test_without_params_is_unchanged(self, authenticated_client, series):
+        """測試未提供參數時返回全部記錄"""
+        data = authenticated_client.get('/api/sheep/TEST001/history').get_json()
+        assert len(data) == 91
+        assert [d['record_date'] for d in data] == sorted(d['record_date'] for d in data)
+
+    def test_range_and_type_filters(self, authenticated_client, series):
+        """測試日期範圍與類型篩選"""
+        data = authenticated_client.get('/api/sheep/TEST001/history?from=2024-01-10&to=2024-01-20&record_type=milk_yield_kg_day').get_json()
+        assert len(data) == 11
+        assert {d['record_type'] for d in data} == {'milk_yield_kg_day'}
+        assert data[0]['record_date'] == '2024-01-10' and data[-1]['record_date'] == '2024-01-20'
+
+    def test_bucket_aggregates(self, authenticated_client, series):
+        """測試依週與月分桶計算平均、最小與最大值"""
+        months = authenticated_client.get('/api/sheep/TEST001/history?bucket=month&record_type=milk_yield_kg_day').get_json()
+        assert [m['bucket_start'] for m in months] == ['2024-01-01', '2024-02-01', '2024-03-01']
+        assert months[0]['count'] == 31
+        assert months[0]['min'] == 0.0 and months[0]['max'] == 9.0
+        assert months[0]['avg'] == pytest.approx(sum(i % 10 for i in range(31)) / 31)
+
+        weeks = authenticated_client.get('/api/sheep/TEST001/history?bucket=week&to=2024-01-14').get_json()
+        # 2024-01-01 為星期一，週分桶從星期一開始
+        assert [(w['record_type'], w['bucket_start'], w['count']) for w in weeks] == [
+            ('milk_yield_kg_day', '2024-01-01', 7), ('milk_yield_kg_day', '2024-01-08', 7)
+        ]
+
+    def test_lttb_downsampling(self, authenticated_client, series):
+        """測試以 LTTB 將每種類型降採樣至指定點數，保留首尾與極值"""
+        data = authenticated_client.get('/api/sheep/TEST001/history?max_points=20').get_json()
+        milk = [d for d in data if d['record_type'] == 'milk_yield_kg_day']
+        assert len(milk) == 20
+        assert milk[0]['record_date'] == '2024-01-01' and milk[-1]['record_date'] == '2024-03-30'
+        assert {0.0, 9.0} <= {d['value'] for d in milk}
+        assert len([d for d in data if d['record_type'] == 'Body_Weight_kg']) == 1
+
+    def test_invalid_params(self, authenticated_client, series):
+        """測試參數格式錯誤"""
+        for query in ['from=2024/01/01', 'bucket=year', 'max_points=2', 'max_points=abc', 'bucket=day&max_points=10']:
+            assert authenticated_client.get(f'/api/sheep/TEST001/history?{query}').status_code == 400
+
+
+class TestTypedDates:
+    """日期欄位型別測試類別"""
+
+    def test_dates_are_normalized_and_compared_natively(self, app, test_user):
+        """測試常見格式的日期寫入時統一為 YYYY-MM-DD，並可直接以日期比較"""
+        from datetime import date
+        from app import db
+
+        db.session.add_all([
+            Sheep(user_id=test_user.id, EarNum='D001', BirthDate='2024/1/5'),
+            Sheep(user_id=test_user.id, EarNum='D002', BirthDate='2023.12.31'),
+            Sheep(user_id=test_user.id, EarNum='D003', BirthDate=date(2024, 2, 1)),
+        ])
+        db.session.commit()
+        db.session.expire_all()
+
+        assert Sheep.query.filter_by(EarNum='D001').one().BirthDate == '2024-01-05'
+        ordered = Sheep.query.filter(Sheep.user_id == test_user.id, Sheep.BirthDate >= date(2024, 1, 1)).order_by(Sheep.BirthDate)
+        assert [s.EarNum for s in ordered] == ['D001', 'D003']
+        assert Sheep.query.filter(Sheep.BirthDate < '2024-01-01').one().EarNum == 'D002'
+
+    def test_malformed_date_is_rejected(self, app, test_user):
+        """測試無法解析的日期無法寫入資料庫"""
+        from sqlalchemy.exc import StatementError
+        from app import db
+
+        db.session.add(Sheep(user_id=test_user.id, EarNum='BAD001', next_deworming_due_date='2024/13/45'))
+        with pytest.raises(StatementError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_api_validates_dates(self, authenticated_client, test_sheep):
+        """測試 API 寫入日期時統一格式，格式錯誤返回 400"""
+        response = authenticated_client.post('/api/sheep/', json={'EarNum': 'D010', 'BirthDate': '2024/03/07'})
+        assert response.status_code == 201
+        assert authenticated_client.get('/api/sheep/D010').get_json()['BirthDate'] == '2024-03-07'
+
+        assert authenticated_client.post('/api/sheep/', json={'EarNum': 'D011', 'BirthDate': 'not-a-date'}).status_code == 400
+        assert authenticated_client.put('/api/sheep/TEST001', json={'expected_lambing_date': '2024-02-30'}).status_code == 400
+        assert authenticated_client.put('/api/sheep/TEST001', json={'expected_lambing_date': ''}).status_code == 200
+
+        event = authenticated_client.post('/api/sheep/TEST001/events', json={'event_date': '2024/4/1', 'event_type': '疫苗接種'})
+        assert event.status_code == 201
+        event_id = event.get_json()['event']['id']
+        assert event.get_json()['event']['event_date'] == '2024-04-01'
+        response = authenticated_client.put(f'/api/sheep/events/{event_id}', json={'event_date': 'yesterday', 'event_type': '疫苗接種'})
+        assert response.status_code == 400
+
+    def test_update_event_with_non_iso_date_keeps_withdrawal(self, authenticated_client, test_sheep):
+        """測試以非 ISO 格式的日期更新用藥事件時，停藥期結束日依新日期重新計算"""
+        from app.models import SheepEvent
+
+        event = authenticated_client.post('/api/sheep/TEST001/events', json={
+            'event_date': '2026-10-01', 'event_type': '用藥', 'medication': '抗生素', 'withdrawal_days': 30
+        }).get_json()['event']
+        response = authenticated_client.put(f"/api/sheep/events/{event['id']}", json={
+            'event_date': '2026/10/05', 'event_type': '用藥', 'withdrawal_days': 30
+        })
+
+        assert response.status_code == 200
+        assert response.get_json()['event']['event_date'] == '2026-10-05'
+        assert response.get_json()['event']['withdrawal_end_date'] == '2026-11-04'
+        assert SheepEvent.query.get(event['id']).withdrawal_end_date == '2026-11-04'
+
+    def test_withdrawal_end_date_wire_format(self, authenticated_client, test_sheep):
+        """測試停藥期結束日與其他日期欄位一樣以 YYYY-MM-DD 返回"""
+        created = authenticated_client.post('/api/sheep/TEST001/events', json={
+            'event_date': '2026-10-01', 'event_type': '用藥', 'medication': '抗生素', 'withdrawal_days': 30
+        }).get_json()['event']
+        assert created['event_date'] == '2026-10-01'
+        assert created['withdrawal_end_date'] == '2026-10-31'
+
+        events = authenticated_client.get('/api/sheep/TEST001/events').get_json()
+        assert [e['withdrawal_end_date'] for e in events if e['id'] == created['id']] == ['2026-10-31']
@@ -90,6 +90,26 @@ class TestSheepEventsAPI:
         
         assert response.status_code == 415  # 修正：非JSON請求返回415 Unsupported Media Type
 
+    def test_update_event_ignores_internal_fields(self, authenticated_client, test_sheep):
+        """測試更新事件時忽略指紋、同步版本等伺服器維護的欄位"""
+        event = authenticated_client.post('/api/sheep/TEST001/events', json={
+            'event_date': '2024-01-15', 'event_type': '用藥', 'withdrawal_days': 7
+        }).get_json()['event']
+
+        response = authenticated_client.put(f"/api/sheep/events/{event['id']}", json=dict(
+            event_date='2024-01-15', event_type='用藥', withdrawal_days=7,
+            notes='已更新', fingerprint='x' * 64, sync_version=999,
+            withdrawal_end_date='2030-01-01', sheep_id=test_sheep.id + 1, id=event['id'] + 1
+        ))
+
+        assert response.status_code == 200
+        updated = SheepEvent.query.get(event['id'])
+        assert updated.notes == '已更新'
+        assert updated.fingerprint is None
+        assert updated.sync_version != 999
+        assert updated.withdrawal_end_date == '2024-01-22'
+        assert updated.sheep_id == test_sheep.id
+
     def test_sheep_events_unauthenticated_access(self, client):
         """測試未認證用戶訪問山羊事件 API"""
         # 獲取事件
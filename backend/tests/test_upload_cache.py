@@ -0,0 +1,203 @@
+"""
+上傳檔案快取測試
+"""
+
+import os
+import time
+import pandas as pd
+from app.models import Sheep, SheepHistoricalData
+from app.import_engine import ExcelWorkbookSource
+from app.upload_cache import (
+    LEASE_DIR, LOCK_FILE, MANIFEST_FILE, ParquetWorkbookSource, evict_expired_entries, open_cached_upload
+)
+
+
+def _analyze(client, excel_file, filename='farm.xlsx'):
+    response = client.post('/api/data/analyze_excel', data={'file': (excel_file, filename)}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()['upload_token']
+
+
+def _entries(app):
+    root = app.config['UPLOAD_CACHE_DIR']
+    return sorted(name for name in os.listdir(root) if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+
+
+def _set_age(path, seconds):
+    os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+
+class TestUploadCache:
+    """上傳檔案快取測試類別"""
+
+    def test_analyze_returns_content_hash_token(self, authenticated_client, app, make_excel_file):
+        """測試相同內容重複上傳時返回相同憑證且只保存一份"""
+        sheets = {'Sheet1': [{'EarNum': 'E001'}]}
+        first = _analyze(authenticated_client, make_excel_file(sheets))
+        second = _analyze(authenticated_client, make_excel_file(sheets))
+        other = _analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': 'E002'}]}))
+
+        assert first == second
+        assert first != other
+        assert len(first) == 64
+        assert len(_entries(app)) == 2
+
+    def test_parquet_source_matches_excel_source(self, authenticated_client, app, test_user, make_excel_file):
+        """測試快取的 Parquet 工作表內容與直接讀取 Excel 相同，且可依任意大小分塊"""
+        sheets = {
+            'Basic': [{'EarNum': f'E{i:03d}', 'BirWei': 3.5 if i % 2 else None} for i in range(7)],
+            'Empty': pd.DataFrame(columns=['EarNum']),
+        }
+        token = _analyze(authenticated_client, make_excel_file(sheets))
+
+        expected = ExcelWorkbookSource(pd.ExcelFile(make_excel_file(sheets)))
+        with open_cached_upload(app, test_user.id, token) as source:
+            assert isinstance(source, ParquetWorkbookSource)
+            assert source.sheet_names == ['Basic', 'Empty']
+            chunks = list(source.iter_chunks('Basic', chunk_size=3))
+            assert [len(c) for c in chunks] == [3, 3, 1]
+            actual = pd.concat(chunks, ignore_index=True).to_dict(orient='records')
+            assert actual == pd.concat(expected.iter_chunks('Basic'), ignore_index=True).to_dict(orient='records')
+            assert list(source.iter_chunks('Empty')) == []
+
+        entry = os.path.join(app.config['UPLOAD_CACHE_DIR'], _entries(app)[0])
+        assert os.path.exists(os.path.join(entry, MANIFEST_FILE))
+        assert not any(name.startswith('source') for name in os.listdir(entry))
+
+    def test_process_import_with_upload_token(self, authenticated_client, app, test_user, make_excel_file, finish_import_job):
+        """測試以上傳憑證導入，不需再次上傳檔案"""
+        token = _analyze(authenticated_client, make_excel_file({
+            '0009-0013A1_Basic': [{'EarNum': 'TOK001'}, {'EarNum': 'TOK002'}],
+            '0009-0013A9_Milk': [{'EarNum': 'TOK001', 'MeaDate': '2024-02-01', 'Milk': 2.5}],
+        }))
+
+        response = authenticated_client.post('/api/data/process_import', data={
+            'upload_token': token, 'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        job = finish_import_job(response)
+
+        assert job['status'] == 'completed'
+        assert sorted(s.EarNum for s in Sheep.query.filter_by(user_id=test_user.id)) == ['TOK001', 'TOK002']
+        assert SheepHistoricalData.query.filter_by(user_id=test_user.id).count() == 1
+
+    def test_analyze_does_not_parse_upload(self, authenticated_client, app, make_excel_file):
+        """測試分析時只保存原始檔，沒有導入就不會解析為 Parquet"""
+        _analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}))
+
+        entry = os.path.join(app.config['UPLOAD_CACHE_DIR'], _entries(app)[0])
+        assert os.listdir(entry) == ['source.xlsx']
+
+    def test_first_open_parses_source_file(self, app, test_user, make_excel_file):
+        """測試第一次開啟時解析原始檔，之後讀取 Parquet"""
+        from app.upload_cache import _entry_dir
+
+        token = 'a' * 64
+        entry = _entry_dir(app, test_user.id, token)
+        os.makedirs(entry)
+        with open(os.path.join(entry, 'source.xlsx'), 'wb') as f:
+            f.write(make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}).getvalue())
+
+        for _ in range(2):
+            with open_cached_upload(app, test_user.id, token) as source:
+                assert isinstance(source, ParquetWorkbookSource)
+                assert source.sheet_names == ['Sheet1']
+                assert list(next(source.iter_chunks('Sheet1'))['EarNum']) == ['E001']
+        assert os.path.exists(os.path.join(entry, MANIFEST_FILE))
+        assert os.listdir(os.path.join(entry, LEASE_DIR)) == []
+
+    def test_process_import_with_unknown_token(self, authenticated_client):
+        """測試無效或已過期的上傳憑證"""
+        for token in ['0' * 64, '../../etc/passwd']:
+            response = authenticated_client.post('/api/data/process_import', data={
+                'upload_token': token, 'is_default_mode': 'true'
+            }, content_type='multipart/form-data')
+            assert response.status_code == 410
+            assert '請重新上傳' in response.get_json()['error']
+
+    def test_token_is_scoped_to_user(self, authenticated_client, app, make_excel_file):
+        """測試無法使用其他用戶的上傳憑證"""
+        from app import db
+        from app.models import User
+        from app.upload_cache import _entry_dir
+
+        other = User(username='other_cache_user')
+        other.set_password('password')
+        db.session.add(other)
+        db.session.commit()
+        token = 'b' * 64
+        entry = _entry_dir(app, other.id, token)
+        os.makedirs(entry)
+        with open(os.path.join(entry, 'source.xlsx'), 'wb') as f:
+            f.write(make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}).getvalue())
+
+        response = authenticated_client.post('/api/data/process_import', data={
+            'upload_token': token, 'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert response.status_code == 410
+
+    def test_expired_entries_are_removed(self, authenticated_client, app, test_user, make_excel_file):
+        """測試逾時的快取項目會被清理，且憑證失效"""
+        token = _analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}))
+        entry = os.path.join(app.config['UPLOAD_CACHE_DIR'], _entries(app)[0])
+        _set_age(entry, app.config['UPLOAD_CACHE_TTL'] + 10)
+
+        evict_expired_entries(app)
+
+        assert _entries(app) == []
+        response = authenticated_client.post('/api/data/process_import', data={
+            'upload_token': token, 'is_default_mode': 'true'
+        }, content_type='multipart/form-data')
+        assert response.status_code == 410
+
+    def test_size_bound_evicts_least_recently_used(self, authenticated_client, app, test_user, make_excel_file):
+        """測試超過容量上限時淘汰最久未使用的項目"""
+        tokens = []
+        for i in range(3):
+            tokens.append(_analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': f'E{i:03d}'}]})))
+        root = app.config['UPLOAD_CACHE_DIR']
+        for age, token in zip([300, 200, 100], tokens):
+            path = os.path.join(root, f'{test_user.id}_{token}')
+            os.utime(path, (time.time() - age, time.time() - age))
+        entry_size = sum(
+            os.path.getsize(os.path.join(root, f'{test_user.id}_{tokens[0]}', f))
+            for f in os.listdir(os.path.join(root, f'{test_user.id}_{tokens[0]}'))
+        )
+        app.config['UPLOAD_CACHE_MAX_BYTES'] = entry_size * 2 + entry_size // 2
+
+        evict_expired_entries(app)
+
+        assert _entries(app) == sorted(f'{test_user.id}_{t}' for t in tokens[1:])
+
+    def test_entry_in_use_is_not_evicted(self, authenticated_client, app, test_user, make_excel_file):
+        """測試使用中的項目不會被清理，包括其他程序的租約；租約過期後才會被清理"""
+        token = _analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}))
+        entry = os.path.join(app.config['UPLOAD_CACHE_DIR'], _entries(app)[0])
+
+        with open_cached_upload(app, test_user.id, token) as source:
+            _set_age(entry, app.config['UPLOAD_CACHE_TTL'] + 10)
+            evict_expired_entries(app)
+            assert list(next(source.iter_chunks('Sheet1'))['EarNum']) == ['E001']
+        assert _entries(app) != []
+
+        # 其他程序的租約只存在於磁碟上
+        lease = os.path.join(entry, LEASE_DIR, 'other-worker.lease')
+        open(lease, 'w').close()
+        _set_age(entry, app.config['UPLOAD_CACHE_TTL'] + 10)
+        app.config['UPLOAD_CACHE_MAX_BYTES'] = 0
+        evict_expired_entries(app)
+        assert _entries(app) != []
+
+        _set_age(lease, app.config['UPLOAD_CACHE_LEASE_TTL'] + 10)
+        evict_expired_entries(app)
+        assert _entries(app) == []
+        assert os.listdir(app.config['UPLOAD_CACHE_DIR']) == []
+
+    def test_stale_lock_file_is_broken(self, authenticated_client, app, make_excel_file):
+        """測試中止的程序遺留的鎖檔不會永久阻擋快取"""
+        lock = os.path.join(app.config['UPLOAD_CACHE_DIR'], LOCK_FILE)
+        open(lock, 'w').close()
+        _set_age(lock, 60)
+
+        _analyze(authenticated_client, make_excel_file({'Sheet1': [{'EarNum': 'E001'}]}))
+        assert not os.path.exists(lock)
+        assert len(_entries(app)) == 1
@@ -12,7 +12,7 @@ from app.utils import call_gemini_api, get_sheep_info_for_context
 class TestUtilsFunctions:
     """工具功能測試類別"""
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_success(self, mock_post):
         """測試成功調用 Gemini API"""
         # 設置模擬回應
@@ -36,7 +36,7 @@ class TestUtilsFunctions:
         assert result["finish_reason"] == "STOP"
         mock_post.assert_called_once()
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_with_list_prompt(self, mock_post):
         """測試使用列表格式的提示詞"""
         mock_response = MagicMock()
@@ -58,7 +58,7 @@ class TestUtilsFunctions:
         assert result["text"] == "回應列表格式的提示"
         assert result["finish_reason"] == "STOP"
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_http_error(self, mock_post):
         """測試 HTTP 錯誤處理"""
         import requests
@@ -74,7 +74,7 @@ class TestUtilsFunctions:
         assert "error" in result
         assert "API 金鑰無效" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_request_exception(self, mock_post):
         """測試網路請求異常"""
         import requests
@@ -85,7 +85,7 @@ class TestUtilsFunctions:
         assert "error" in result
         assert "網路或請求錯誤" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_prompt_blocked(self, mock_post):
         """測試提示詞被封鎖"""
         mock_response = MagicMock()
@@ -104,7 +104,7 @@ class TestUtilsFunctions:
         assert "提示詞被拒絕" in result["error"]
         assert "SAFETY" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_unexpected_response(self, mock_post):
         """測試意外的 API 回應格式"""
         mock_response = MagicMock()
@@ -117,7 +117,7 @@ class TestUtilsFunctions:
         assert "error" in result
         assert "API 回應格式不符合預期" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_with_custom_config(self, mock_post):
         """測試自訂配置參數"""
         mock_response = MagicMock()
@@ -202,7 +202,7 @@ class TestUtilsFunctions:
             assert "error" in result
             assert "處理 API 請求時發生未知錯誤" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_timeout(self, mock_post):
         """測試超時處理"""
         import requests
@@ -213,7 +213,7 @@ class TestUtilsFunctions:
         assert "error" in result
         assert "網路或請求錯誤" in result["error"]
 
-    @patch('app.utils.requests.post')
+    @patch('requests.Session.post')
     def test_call_gemini_api_empty_text_response(self, mock_post):
         """測試空回應文本"""
         mock_response = MagicMock()
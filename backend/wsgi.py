@@ -0,0 +1,10 @@
+"""
+正式環境的 WSGI 進入點 (waitress-serve wsgi:app / gunicorn wsgi:app)
+除建立應用程式外，啟動續跑中斷導入任務的監督執行緒；flask CLI 使用 run.py，不會啟動背景任務。
+"""
+
+from app import create_app
+from app.import_jobs import start_job_supervisor
+
+app = create_app()
+start_job_supervisor(app)
@@ -70,6 +70,80 @@ async function withErrorHandling(apiCall, errorHandler = null) {
   }
 }
 
+/**
+ * 輪詢導入任務直到完成
+ * @param {string} jobId - 導入任務 ID
+ * @param {number} intervalMs - 輪詢間隔 (毫秒)
+ * @returns {Promise} 與同步導入相同格式的結果 ({ success, message, details })
+ */
+async function waitForImportJob(jobId, intervalMs = 1000) {
+  for (;;) {
+    const job = await apiClient.get(`/api/data/jobs/${jobId}`);
+    if (job.status === 'completed') {
+      return { success: true, message: '數據導入已成功完成！', details: job.report_details };
+    }
+    if (job.status === 'failed') {
+      throw { error: job.error };
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+}
+
+/**
+ * 以 fetch 讀取 server-sent events 串流 (axios 在瀏覽器中無法逐段讀取回應)
+ * @param {string} url - 串流端點
+ * @param {Object} payload - POST 內容
+ * @param {Function} onEvent - 每個事件的回呼 (event, data)
+ * @returns {Promise} 串流結束時以 done 事件的資料 resolve，error 事件或 HTTP 錯誤時 reject
+ */
+async function postEventStream(url, payload, onEvent) {
+  const response = await fetch(url, {
+    method: 'POST',
+    credentials: 'include',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      'X-Requested-With': 'XMLHttpRequest',
+    },
+    body: JSON.stringify(payload),
+  });
+  if (!response.ok) {
+    if (response.status === 401) {
+      const { useAuthStore } = await import('../stores/auth');
+      useAuthStore().logout();
+    }
+    const body = await response.json().catch(() => ({}));
+    throw { error: body.error || `串流請求失敗 (碼: ${response.status})`, status: response.status };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // 事件之間以空行分隔
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      const dataLines = [];
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+      }
+      if (!dataLines.length) continue;
+      const data = JSON.parse(dataLines.join('\n'));
+      if (event === 'error') throw data;
+      if (onEvent) onEvent(event, data);
+      if (event === 'done') return data;
+    }
+  }
+  throw { error: '串流意外中斷' };
+}
+
 // 包裝 API 方法以提供錯誤處理
 export default {
   // 身份驗證 API
@@ -90,6 +164,22 @@ export default {
   getAllSheep(errorHandler) { 
     return withErrorHandling(() => apiClient.get('/api/sheep/'), errorHandler); 
   },
+  /**
+   * 分頁查詢羊隻列表
+   * @param {Object} params - limit、cursor、fields (逗號分隔) 及篩選欄位 (status、Breed、Sex、FarmNum、breed_category)
+   * @returns {Promise<{items: Array, next_cursor: string|null}>}
+   */
+  getSheepPage(params = {}, errorHandler) {
+    return withErrorHandling(() => apiClient.get('/api/sheep/', { params: { limit: 100, ...params } }), errorHandler);
+  },
+  /**
+   * 增量同步：取得 since 版本之後變更與刪除的羊隻、事件及歷史數據 (分頁)
+   * @param {Object} [params] - since (上次完成同步時的 next，省略時返回全部資料)、cursor (上一頁的 next_cursor)、limit
+   * @returns {Promise<{next: string, next_cursor: string|null, sheep: Array, events: Array, history: Array, deleted: Object}>}
+   */
+  getSheepChanges(params = {}, errorHandler) {
+    return withErrorHandling(() => apiClient.get('/api/sheep/sync/changes', { params }), errorHandler);
+  },
   getSheepDetails(earNum, errorHandler) { 
     return withErrorHandling(() => apiClient.get(`/api/sheep/${earNum}`), errorHandler); 
   },
@@ -137,6 +227,10 @@ export default {
     const payload = { api_key: apiKey, message, session_id: sessionId, ear_num_context: earNumContext };
     return withErrorHandling(() => apiClient.post('/api/agent/chat', payload), errorHandler);
   },
+  streamChatWithAgent(apiKey, message, sessionId, earNumContext, onEvent) {
+    const payload = { api_key: apiKey, message, session_id: sessionId, ear_num_context: earNumContext };
+    return postEventStream('/api/agent/chat/stream', payload, onEvent);
+  },
 
   // 儀表板 API
   getDashboardData(errorHandler) { 
@@ -157,16 +251,38 @@ export default {
       headers: { 'Content-Type': 'multipart/form-data' } 
     }), errorHandler);
   },
-  processImport(file, isDefaultMode, mappingConfig = {}, errorHandler) {
-    const formData = new FormData();
-    formData.append('file', file);
-    formData.append('is_default_mode', isDefaultMode);
-    if (!isDefaultMode) {
-      formData.append('mapping_config', JSON.stringify(mappingConfig));
-    }
-    return withErrorHandling(() => apiClient.post('/api/data/process_import', formData, { 
+  processImport(file, isDefaultMode, mappingConfig = {}, errorHandler, uploadToken = null) {
+    const buildForm = (useToken) => {
+      const formData = new FormData();
+      if (useToken) {
+        // 使用分析時返回的上傳憑證，無需再次上傳檔案
+        formData.append('upload_token', uploadToken);
+      } else {
+        formData.append('file', file);
+      }
+      formData.append('is_default_mode', isDefaultMode);
+      if (!isDefaultMode) {
+        formData.append('mapping_config', JSON.stringify(mappingConfig));
+      }
+      return formData;
+    };
+    const submit = (useToken) => apiClient.post('/api/data/process_import', buildForm(useToken), { 
       headers: { 'Content-Type': 'multipart/form-data' } 
-    }), errorHandler);
+    });
+    return withErrorHandling(async () => {
+      let job;
+      try {
+        job = await submit(Boolean(uploadToken));
+      } catch (error) {
+        // 上傳快取已過期時改為重新上傳檔案
+        if (!uploadToken || !file || error.response?.status !== 410) throw error;
+        job = await submit(false);
+      }
+      return waitForImportJob(job.job_id);
+    }, errorHandler);
+  },
+  getImportJob(jobId, errorHandler) {
+    return withErrorHandling(() => apiClient.get(`/api/data/jobs/${jobId}`), errorHandler);
   },
 
   // 事件選項管理 API
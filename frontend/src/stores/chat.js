@@ -8,6 +8,20 @@ const createInitialMessage = () => ({
   content: "<p>您好，我是領頭羊博士，請問有什麼可以為您服務的嗎？</p>"
 });
 
+// 跳脫 HTML 特殊字元
+const escapeHtml = (text) => text
+  .replace(/&/g, '&amp;')
+  .replace(/</g, '&lt;')
+  .replace(/>/g, '&gt;')
+  .replace(/"/g, '&quot;')
+  .replace(/'/g, '&#39;');
+
+// 尚未完成的段落以跳脫後的純文字顯示
+const renderPendingText = (text) => {
+  const trimmed = text.trim();
+  return trimmed ? `<p>${escapeHtml(trimmed).replace(/\n/g, '<br />')}</p>` : '';
+};
+
 export const useChatStore = defineStore('chat', () => {
   // --- State ---
   const sessionId = ref('session_' + Date.now());
@@ -45,6 +59,59 @@ export const useChatStore = defineStore('chat', () => {
     }
   }
 
+  // 以串流方式發送訊息：完成的段落逐段顯示，尚未完成的段落以純文字顯示，結束時以完整回覆取代
+  async function sendMessageStream(apiKey, userMessage, earNumContext) {
+    messages.push({ role: 'user', content: userMessage });
+
+    isLoading.value = true;
+    error.value = '';
+    let reply = null;
+    let renderedHtml = '';
+    let pendingText = '';
+
+    try {
+      const result = await api.streamChatWithAgent(
+        apiKey,
+        userMessage,
+        sessionId.value,
+        earNumContext,
+        (event, data) => {
+          if (event !== 'delta') return;
+          if (data.html) {
+            // 有區塊完成時，伺服器一併返回剩餘未完成的文字
+            renderedHtml += data.html;
+            pendingText = data.pending || '';
+          } else {
+            pendingText += data.text || '';
+          }
+          if (!renderedHtml && !pendingText.trim()) return;
+          // 收到第一段文字時才加入回覆，之前顯示載入動畫
+          if (!reply) {
+            messages.push({ role: 'model', content: '' });
+            reply = messages[messages.length - 1];
+          }
+          reply.content = renderedHtml + renderPendingText(pendingText);
+        }
+      );
+      if (reply) {
+        reply.content = result.reply_html;
+      } else {
+        messages.push({ role: 'model', content: result.reply_html });
+      }
+    } catch (err) {
+      const errorMessage = err.error || err.message || 'AI 助理回覆時發生未知錯誤';
+      error.value = errorMessage;
+      const errorHtml = `<p style="color:red;">助理回覆錯誤: ${errorMessage}</p>`;
+      if (reply) {
+        reply.content += errorHtml;
+      } else {
+        messages.push({ role: 'model', content: errorHtml });
+      }
+    } finally {
+      isLoading.value = false;
+    }
+  }
+
   // 清空對話歷史
   function clearChat() {
     sessionId.value = 'session_' + Date.now();
@@ -61,6 +128,7 @@ export const useChatStore = defineStore('chat', () => {
     isLoading,
     error,
     sendMessage,
+    sendMessageStream,
     clearChat,
   };
 });
\ No newline at end of file
@@ -11,7 +11,8 @@ import api from '../api'
 // Mock API
 vi.mock('../api', () => ({
   default: {
-    chatWithAgent: vi.fn()
+    chatWithAgent: vi.fn(),
+    streamChatWithAgent: vi.fn()
   }
 }))
 
@@ -169,6 +170,67 @@ describe('Chat Store', () => {
     })
   })
 
+  describe('sendMessageStream action', () => {
+    it('應該逐段顯示回覆並以完整回覆取代', async () => {
+      const contentDuringStream = []
+      api.streamChatWithAgent.mockImplementation(async (apiKey, message, sessionId, earNum, onEvent) => {
+        onEvent('delta', { text: '第一段\n\n', html: '' })
+        contentDuringStream.push(chatStore.messages[2].content)
+        onEvent('delta', { text: '第二段', html: '<p>第一段</p>', pending: '第二段' })
+        contentDuringStream.push(chatStore.messages[2].content)
+        onEvent('done', { html: '<p>第二段</p>', reply_html: '<p>第一段</p>\n<p>第二段</p>' })
+        return { html: '<p>第二段</p>', reply_html: '<p>第一段</p>\n<p>第二段</p>' }
+      })
+
+      await chatStore.sendMessageStream('test-api-key', '你好', 'SH001')
+
+      expect(api.streamChatWithAgent).toHaveBeenCalledWith(
+        'test-api-key', '你好', chatStore.sessionId, 'SH001', expect.any(Function)
+      )
+      expect(contentDuringStream).toEqual(['<p>第一段</p>', '<p>第一段</p><p>第二段</p>'])
+      expect(chatStore.messages).toHaveLength(3)
+      expect(chatStore.messages[2]).toEqual({ role: 'model', content: '<p>第一段</p>\n<p>第二段</p>' })
+      expect(chatStore.isLoading).toBe(false)
+    })
+
+    it('應該在段落完成前以跳脫後的純文字顯示', async () => {
+      const contentDuringStream = []
+      api.streamChatWithAgent.mockImplementation(async (apiKey, message, sessionId, earNum, onEvent) => {
+        onEvent('delta', { text: '單段回覆 <b>', html: '' })
+        onEvent('delta', { text: '&\n第二行', html: '' })
+        contentDuringStream.push(chatStore.messages[2].content)
+        return { html: '<p>單段回覆</p>', reply_html: '<p>單段回覆</p>' }
+      })
+
+      await chatStore.sendMessageStream('test-api-key', '你好', '')
+
+      expect(contentDuringStream).toEqual(['<p>單段回覆 &lt;b&gt;&amp;<br />第二行</p>'])
+      expect(chatStore.messages[2]).toEqual({ role: 'model', content: '<p>單段回覆</p>' })
+    })
+
+    it('應該在沒有段落時直接加入完整回覆', async () => {
+      api.streamChatWithAgent.mockResolvedValue({ html: '<p>短回覆</p>', reply_html: '<p>短回覆</p>' })
+
+      await chatStore.sendMessageStream('test-api-key', '你好', '')
+
+      expect(chatStore.messages[2]).toEqual({ role: 'model', content: '<p>短回覆</p>' })
+    })
+
+    it('應該在串流中斷時保留已顯示的內容並附上錯誤', async () => {
+      api.streamChatWithAgent.mockImplementation(async (apiKey, message, sessionId, earNum, onEvent) => {
+        onEvent('delta', { text: '', html: '<p>第一段</p>' })
+        throw { error: '串流意外中斷' }
+      })
+
+      await chatStore.sendMessageStream('test-api-key', '你好', '')
+
+      expect(chatStore.messages).toHaveLength(3)
+      expect(chatStore.messages[2].content).toBe('<p>第一段</p><p style="color:red;">助理回覆錯誤: 串流意外中斷</p>')
+      expect(chatStore.error).toBe('串流意外中斷')
+      expect(chatStore.isLoading).toBe(false)
+    })
+  })
+
   describe('clearChat action', () => {
     beforeEach(async () => {
       // 添加一些測試訊息
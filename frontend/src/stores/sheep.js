@@ -26,8 +26,18 @@ export const useSheepStore = defineStore('sheep', () => {
     }
     isLoading.value = true;
     try {
-      const data = await api.getAllSheep();
-      sheepList.value = data;
+      // 依游標逐頁載入；首次載入時每頁到達即顯示，重新整理時全部載入後才替換列表
+      const items = [];
+      let cursor = null;
+      do {
+        const page = await api.getSheepPage(cursor ? { cursor } : {});
+        items.push(...page.items);
+        cursor = page.next_cursor;
+        if (!hasLoaded.value) {
+          sheepList.value = [...items];
+        }
+      } while (cursor);
+      sheepList.value = items;
       hasLoaded.value = true;
     } catch (error) {
       console.error("獲取羊群列表失敗:", error);
@@ -10,7 +10,7 @@ import { useSheepStore } from '@/stores/sheep'
 // 模擬 API 模組
 vi.mock('@/api', () => ({
   default: {
-    getAllSheep: vi.fn(),
+    getSheepPage: vi.fn(),
   },
 }))
 
@@ -80,14 +80,43 @@ describe('sheep Store', () => {
         ]
 
         // 模擬 API 成功回應
-        api.getAllSheep.mockResolvedValue(mockData)
+        api.getSheepPage.mockResolvedValue({ items: mockData, next_cursor: null, limit: 100 })
 
         await store.fetchSheepList()
 
         expect(store.isLoading).toBe(false)
         expect(store.hasLoaded).toBe(true)
         expect(store.sheepList).toEqual(mockData)
-        expect(api.getAllSheep).toHaveBeenCalledTimes(1)
+        expect(api.getSheepPage).toHaveBeenCalledTimes(1)
+      })
+
+      it('應該依 next_cursor 逐頁載入直到最後一頁', async () => {
+        const store = useSheepStore()
+        api.getSheepPage
+          .mockResolvedValueOnce({ items: [{ EarNum: 'A001' }], next_cursor: 'c1', limit: 1 })
+          .mockResolvedValueOnce({ items: [{ EarNum: 'A002' }], next_cursor: null, limit: 1 })
+
+        await store.fetchSheepList()
+
+        expect(api.getSheepPage).toHaveBeenNthCalledWith(1, {})
+        expect(api.getSheepPage).toHaveBeenNthCalledWith(2, { cursor: 'c1' })
+        expect(store.sheepList).toEqual([{ EarNum: 'A001' }, { EarNum: 'A002' }])
+        expect(store.hasLoaded).toBe(true)
+      })
+
+      it('重新整理時失敗應該保留原本的列表', async () => {
+        const store = useSheepStore()
+        const consoleErrorSpy = vi.spyOn(console, 'error').mockImplementation(() => {})
+        store.sheepList = [{ EarNum: 'A001' }]
+        store.hasLoaded = true
+        api.getSheepPage
+          .mockResolvedValueOnce({ items: [{ EarNum: 'B001' }], next_cursor: 'c1', limit: 1 })
+          .mockRejectedValueOnce(new Error('網路錯誤'))
+
+        await store.fetchSheepList(true)
+
+        expect(store.sheepList).toEqual([{ EarNum: 'A001' }])
+        consoleErrorSpy.mockRestore()
       })
 
       it('在 loading 時不應該重複請求', async () => {
@@ -96,7 +125,7 @@ describe('sheep Store', () => {
 
         await store.fetchSheepList()
 
-        expect(api.getAllSheep).not.toHaveBeenCalled()
+        expect(api.getSheepPage).not.toHaveBeenCalled()
       })
 
       it('已載入時不應該重複請求 (除非 force=true)', async () => {
@@ -105,11 +134,11 @@ describe('sheep Store', () => {
 
         // 不強制刷新
         await store.fetchSheepList()
-        expect(api.getAllSheep).not.toHaveBeenCalled()
+        expect(api.getSheepPage).not.toHaveBeenCalled()
 
         // 強制刷新
         await store.fetchSheepList(true)
-        expect(api.getAllSheep).toHaveBeenCalledTimes(1)
+        expect(api.getSheepPage).toHaveBeenCalledTimes(1)
       })
 
       it('應該處理 API 錯誤', async () => {
@@ -117,7 +146,7 @@ describe('sheep Store', () => {
         const consoleErrorSpy = vi.spyOn(console, 'error').mockImplementation(() => {})
 
         // 模擬 API 錯誤
-        api.getAllSheep.mockRejectedValue(new Error('網路錯誤'))
+        api.getSheepPage.mockRejectedValue(new Error('網路錯誤'))
 
         await store.fetchSheepList()
 
@@ -137,14 +166,14 @@ describe('sheep Store', () => {
         const mockPromise = new Promise((resolve) => {
           resolvePromise = resolve
         })
-        api.getAllSheep.mockReturnValue(mockPromise)
+        api.getSheepPage.mockReturnValue(mockPromise)
 
         // 開始請求
         const fetchPromise = store.fetchSheepList()
         expect(store.isLoading).toBe(true)
 
         // 完成請求
-        resolvePromise([])
+        resolvePromise({ items: [], next_cursor: null, limit: 100 })
         await fetchPromise
         expect(store.isLoading).toBe(false)
       })
@@ -219,11 +248,11 @@ describe('sheep Store', () => {
         store.hasLoaded = true
         
         const mockData = [{ EarNum: 'A001', Breed: '波爾羊' }]
-        api.getAllSheep.mockResolvedValue(mockData)
+        api.getSheepPage.mockResolvedValue({ items: mockData, next_cursor: null, limit: 100 })
 
         await store.refreshSheepList()
 
-        expect(api.getAllSheep).toHaveBeenCalledTimes(1)
+        expect(api.getSheepPage).toHaveBeenCalledTimes(1)
         expect(store.sheepList).toEqual(mockData)
       })
     })
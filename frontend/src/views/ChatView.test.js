@@ -206,7 +206,7 @@ describe('ChatView', () => {
     })
 
     it('應該處理發送訊息', async () => {
-      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessage').mockResolvedValue()
+      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessageStream').mockResolvedValue()
       
       wrapper.vm.userInput = '這是測試訊息'
       await wrapper.vm.handleSendMessage()
@@ -216,7 +216,7 @@ describe('ChatView', () => {
     })
 
     it('應該阻止發送空訊息', async () => {
-      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessage')
+      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessageStream')
       
       wrapper.vm.userInput = '   '
       await wrapper.vm.handleSendMessage()
@@ -242,7 +242,7 @@ describe('ChatView', () => {
     })
 
     it('應該支持使用選定的羊隻發送訊息', async () => {
-      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessage').mockResolvedValue()
+      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessageStream').mockResolvedValue()
       
       wrapper.vm.selectedEarNum = 'SH001'
       wrapper.vm.userInput = '這隻羊的狀況如何？'
@@ -263,7 +263,7 @@ describe('ChatView', () => {
 
   describe('用戶界面交互', () => {
     it('應該支持按 Enter 鍵發送訊息', async () => {
-      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessage').mockResolvedValue()
+      const sendMessageSpy = vi.spyOn(chatStore, 'sendMessageStream').mockResolvedValue()
       
       wrapper.vm.userInput = '測試訊息'
       
@@ -333,7 +333,7 @@ describe('ChatView', () => {
 
     it('應該處理發送訊息時的錯誤', async () => {
       const error = new Error('發送失敗')
-      vi.spyOn(chatStore, 'sendMessage').mockRejectedValue(error)
+      vi.spyOn(chatStore, 'sendMessageStream').mockRejectedValue(error)
       
       wrapper.vm.userInput = '測試訊息'
       